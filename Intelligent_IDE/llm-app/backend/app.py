@@ -1,16 +1,35 @@
 import os
+import bisect
 import json
-import subprocess
-import docker
-from flask import Flask, request, jsonify
+import contextlib
+import contextvars
+import ipaddress
+import math
+import atexit
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import openai
 from dotenv import load_dotenv
 import tempfile
-import pytest
-import pylint.lint
-from contextlib import redirect_stdout
-import io
+# config.py, metrics.py and languages.py are shared with ci_service from ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from config import get_setting
+from sandbox_pool import SandboxPool, PoolExhausted
+from compile_cache import COMPILED_LANGUAGES, CompileCache, CompilationError, compile_locally
+from execution_limits import ExecutionLimits, run_limited
+from worker_fleet import FleetUnavailable, create_fleet
+from llm_cache import MemoryBackend, create_response_cache
+from project_index import create_project_index
+from rate_limiting import RateLimited, RateLimitUnavailable, create_rate_limiter
+from linting import LintError, create_linter
+from streaming import FenceStripper, JSONArrayStreamer, sse_event
+from suite_runner import FRAMEWORK_HINTS, MERGEABLE_FRAMEWORKS, merge_test_files, run_test_suite
+from prompt_compaction import chunk_code, compact_code, estimate_tokens, response_budget
+from metrics import CONTENT_TYPE, Callback, Counter, Histogram, current_route, instrument_flask, render as render_metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,50 +38,341 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# Served at /metrics; asgi.py times its own routes into the same histogram
+request_latency = Histogram(
+    'http_request_duration_seconds', "API response time, up to the first byte of a streamed response",
+    ['route', 'method', 'status']
+)
+instrument_flask(app, request_latency)
+openai_latency = Histogram(
+    'openai_request_duration_seconds', "OpenAI chat completion time, to the last chunk when streamed",
+    ['endpoint', 'model']
+)
+openai_tokens = Counter(
+    'openai_tokens_total', "Prompt and completion tokens per OpenAI call; estimated for streamed completions",
+    ['endpoint', 'model', 'kind']
+)
+execution_wall_time = Histogram('code_execution_wall_seconds', "Wall time of code runs", ['language'])
+execution_cpu_time = Histogram('code_execution_cpu_seconds', "CPU time of code runs", ['language'])
+executions = Counter('code_executions_total', "Code runs by outcome: ok, error, timeout or cpu_limit", ['language', 'outcome'])
 
-try:
-    # Try the standard connection method first
-    docker_client = docker.from_env()
-    print("Successfully connected to Docker daemon using default connection method")
-except docker.errors.DockerException as e:
-    print(f"Default connection failed: {e}")
+# OpenAI is configured on first use; importing it is a large part of startup time
+openai_module = None
+
+def get_openai():
+    global openai_module
+    if openai_module is None:
+        import openai
+
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        openai_module = openai
+    return openai_module
+
+# Identical prompts are answered from cache; concurrent duplicates share one upstream call
+llm_cache = create_response_cache(get_setting('openai', 'cache'), os.getenv('DATABASE_URL'))
+
+# Lint results are cached per function, so re-analysis after an edit only lints what changed
+code_linter = create_linter(
+    MemoryBackend(get_setting('code_quality', 'cache_entries', default=5000)),
+    get_setting('code_quality')
+)
+
+# Docker is connected by a background thread, started once the server is up
+# or on first use, so neither imports nor requests wait on connection timeouts
+docker_client = None
+docker_connector = None
+docker_connected = threading.Event()
+docker_lock = threading.Lock()
+DOCKER_RETRY_INTERVAL = 30  # Seconds before retrying an unreachable daemon
+
+def connect_docker():
+    import docker
+
+    try:
+        # Try the standard connection method first
+        client = docker.from_env()
+        print("Successfully connected to Docker daemon using default connection method")
+        return client
+    except docker.errors.DockerException as e:
+        print(f"Default connection failed: {e}")
     
     # Option 2: Explicit connection to Docker socket
     try:
-        docker_client = docker.DockerClient(base_url='unix://var/run/docker.sock')
+        client = docker.DockerClient(base_url='unix://var/run/docker.sock')
         print("Successfully connected to Docker daemon using unix socket")
+        return client
     except docker.errors.DockerException as e:
         print(f"Unix socket connection failed: {e}")
-        
-        # Option 3: Try with TCP connection if Docker is configured to accept TCP connections
-        try:
-            docker_client = docker.DockerClient(base_url='tcp://localhost:2375')
-            print("Successfully connected to Docker daemon using TCP")
-        except docker.errors.DockerException as e:
-            print(f"TCP connection failed: {e}")
-            print("Could not connect to Docker daemon. Please check Docker is running and properly configured.")
+    
+    # Option 3: Try with TCP connection if Docker is configured to accept TCP connections
+    try:
+        client = docker.DockerClient(base_url='tcp://localhost:2375')
+        print("Successfully connected to Docker daemon using TCP")
+        return client
+    except docker.errors.DockerException as e:
+        print(f"TCP connection failed: {e}")
+        print("Could not connect to Docker daemon. Please check Docker is running and properly configured.")
+    return None
+
+def keep_docker_connected():
+    global docker_client
+    while True:
+        client = connect_docker()
+        if client is not None:
+            docker_client = client
+            docker_connected.set()
+            return
+        time.sleep(DOCKER_RETRY_INTERVAL)
+
+def get_docker_client():
+    """The Docker client, or None while the daemon is unreachable; never blocks."""
+    global docker_connector
+    if docker_client is None:
+        with docker_lock:
+            if docker_connector is None:
+                docker_connector = threading.Thread(target=keep_docker_connected, daemon=True)
+                docker_connector.start()
+    return docker_client
+
+def wait_for_docker(timeout=None):
+    """Block until the background connector reaches Docker; None on timeout."""
+    get_docker_client()
+    docker_connected.wait(timeout)
+    return docker_client
+
+def warm_up():
+    # Connect to Docker and index the project off the request path as soon as the server starts
+    get_docker_client()
+    get_project_index()
+
+compile_cache = CompileCache(
+    get_setting('code_execution', 'compile_cache', 'path',
+                default=os.path.join(tempfile.gettempdir(), 'intelligent-ide-compile-cache')),
+    get_setting('code_execution', 'compile_cache', 'max_size_mb', default=512) * 1024 * 1024
+)
+compile_timeout = get_setting('code_execution', 'compile_cache', 'build_timeout', default=60)
+
+# Time, memory, CPU, process and output caps for every run of user code
+execution_limits = ExecutionLimits.from_settings(get_setting('code_execution'))
+
+# Warm sandbox workers are started on first use so the Flask reloader's
+# parent process never launches containers of its own
+sandbox_pool = None
+sandbox_pool_lock = threading.Lock()
+
+def get_sandbox_pool():
+    global sandbox_pool
+    if not get_setting('code_execution', 'sandbox_pool', 'enabled', default=False):
+        return None
+    client = get_docker_client()
+    if client is None:
+        return None
+    with sandbox_pool_lock:
+        if sandbox_pool is None:
+            sandbox_pool = SandboxPool(
+                client,
+                get_setting('code_execution', 'execution_environments', default={}),
+                get_setting('code_execution', 'sandbox_pool', default={}),
+                compile_cache=compile_cache,
+                compile_timeout=compile_timeout,
+                limits=execution_limits
+            )
+            sandbox_pool.start()
+            atexit.register(sandbox_pool.shutdown)
+    return sandbox_pool
+
+# Remote execution workers (exec_worker.py); without any, code runs in this process
+worker_fleet = None
+worker_fleet_lock = threading.Lock()
+
+def get_worker_fleet():
+    global worker_fleet
+    urls = os.getenv('EXEC_WORKERS')
+    urls = urls.split(',') if urls else get_setting('code_execution', 'fleet', 'workers', default=[])
+    if not urls:
+        return None
+    with worker_fleet_lock:
+        if worker_fleet is None:
+            worker_fleet = create_fleet(urls, get_setting('code_execution', 'fleet'))
+            worker_fleet.start()
+    return worker_fleet
+
+# The workspace tree is scanned once, in the background, then kept current from
+# filesystem events; see project_index.py
+project_index = None
+project_index_lock = threading.Lock()
+
+def get_project_index():
+    global project_index
+    with project_index_lock:
+        if project_index is None:
+            project_index = create_project_index(get_setting('project_index'))
+            threading.Thread(target=project_index.start, daemon=True).start()
+    return project_index
+
+# Per-user token buckets for the expensive endpoints; requests over the limit
+# wait their turn in a fair queue and are refused only after security.rate_limits.max_wait
+rate_limiter = create_rate_limiter(get_setting('security'), os.getenv('DATABASE_URL'))
+
+# Only a proxy listed here may name the user (security.user_header) or the client
+# (X-Forwarded-For); anyone else could rotate either to get a fresh bucket
+trusted_proxies = [ipaddress.ip_network(net, strict=False)
+                   for net in get_setting('security', 'trusted_proxies', default=[])]
+
+def is_trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in net for net in trusted_proxies)
+
+def rate_limit_user(headers, remote_addr):
+    if not is_trusted_proxy(remote_addr):
+        return remote_addr
+    user = headers.get(get_setting('security', 'user_header', default='X-User-Id'))
+    if user:
+        return user
+    # The nearest hop the trusted proxies didn't add themselves is the client
+    hops = [hop.strip() for hop in headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else remote_addr
+
+def rate_limit_cost(path, data):
+    # A batch takes one token per job
+    jobs = (data or {}).get('jobs') if path == '/api/run-code/batch' else None
+    return max(1, len(jobs)) if isinstance(jobs, list) else 1
+
+def rate_limited_response(error):
+    response = jsonify({"error": str(error), "retry_after": round(error.retry_after, 1)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(error.retry_after)))
+    return response
+
+def rate_limit_store_failed(error):
+    """Whether to admit a request the bucket store couldn't rule on
+    (security.rate_limits.on_store_error: open admits it, closed refuses it)."""
+    print(f"{error}; {'admitting' if rate_limiter.fail_open else 'refusing'} the request")
+    return rate_limiter.fail_open
+
+@app.before_request
+def limit_rate():
+    if rate_limiter is None or request.method != 'POST':
+        return None
+    limit = rate_limiter.limit_for(request.path)
+    if limit is None:
+        return None
+    try:
+        rate_limiter.acquire(
+            rate_limit_user(request.headers, request.remote_addr), limit,
+            rate_limit_cost(request.path, request.get_json(silent=True))
+        )
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except RateLimitUnavailable as e:
+        if not rate_limit_store_failed(e):
+            return jsonify({"error": "Rate limiting is unavailable, try again shortly"}), 503, {'Retry-After': '5'}
+    return None
+
+@app.route('/api/rate-limits', methods=['GET'])
+def rate_limits():
+    if rate_limiter is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "endpoints": rate_limiter.state()})
+
+def rate_limit_stats(key):
+    if rate_limiter is None:
+        return {}
+    return {(group,): stats[key] for group, stats in rate_limiter.state().items()}
+
+def rate_limit_outcomes():
+    if rate_limiter is None:
+        return {}
+    return {
+        (group, outcome): stats[outcome]
+        for group, stats in rate_limiter.state().items()
+        for outcome in ('admitted', 'rejected', 'errors')
+    }
+
+# Queue depths and rate limiter counts are read from their owners when scraped
+Callback('rate_limit_requests_total', "Rate-limited requests admitted, refused or failed in the store", ['group', 'outcome'],
+         rate_limit_outcomes, kind='counter')
+Callback('rate_limit_delayed_total', "Requests admitted after waiting for their turn", ['group'],
+         lambda: rate_limit_stats('delayed'), kind='counter')
+Callback('rate_limit_wait_seconds_total', "Time admitted requests spent waiting", ['group'],
+         lambda: rate_limit_stats('wait_seconds'), kind='counter')
+Callback('rate_limit_waiting', "Requests waiting to be admitted", ['group'], lambda: rate_limit_stats('waiting'))
+Callback('sandbox_pool_idle_workers', "Warm sandbox workers ready for a run", ['language'],
+         lambda: {(language,): idle.qsize() for language, idle in sandbox_pool.idle.items()} if sandbox_pool else {})
+Callback('execution_fleet_in_flight', "Runs sent to each execution worker and not yet finished", ['worker'],
+         lambda: worker_fleet.in_flight() if worker_fleet else {})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
 
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({"message": "API is running"})
 
-# Fix: Make sure the route is correctly defined and mapped
 @app.route('/api/project-structure', methods=['GET'])
-def get_project_structure():
-    # Mock project structure for demonstration
-    # In a real app, this would scan actual project files
-    structure = [
-        {"name": "src", "type": "directory"},
-        {"name": "components", "type": "directory"},
-        {"name": "App.js", "type": "file"},
-        {"name": "index.js", "type": "file"},
-        {"name": "styles.css", "type": "file"},
-        {"name": "tests", "type": "directory"},
-        {"name": "package.json", "type": "file"}
-    ]
-    return jsonify(structure)
+@app.route('/api/v2/project-structure', defaults={'paged': True}, methods=['GET'])
+def get_project_structure(paged=False):
+    # One directory at a time; the IDE expands subtrees as the user opens them.
+    # The original path still answers with the bare list of entries older
+    # clients expect, v2 pages through the directory and adds version details
+    index = get_project_index()
+    if not index.ready.wait(timeout=get_setting('project_index', 'build_timeout', default=30)):
+        return jsonify({"error": "Project index is still being built"}), 503
+
+    path = request.args.get('path', '')
+    offset, limit = 0, None
+    if paged:
+        page_size = get_setting('project_index', 'page_size', default=200)
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', page_size))),
+                        get_setting('project_index', 'max_page_size', default=1000))
+        except ValueError:
+            return jsonify({"error": "offset and limit must be integers"}), 400
+    try:
+        node, total, entries = index.list(path, offset, limit)
+    except KeyError:
+        return jsonify({"error": f"No such directory: {path}"}), 404
+
+    if not paged:
+        response = jsonify(entries)
+    else:
+        response = jsonify({
+            "path": path.strip('/'),
+            "version": node.version,
+            "index_version": index.version,
+            "total": total,
+            "offset": offset,
+            "entries": entries,
+        })
+    # Unchanged directories are answered with 304 Not Modified
+    response.set_etag(index.etag(node))
+    return response.make_conditional(request)
+
+@app.route('/api/project-structure/changes', methods=['GET'])
+def get_project_changes():
+    index = get_project_index()
+    if not index.ready.wait(timeout=get_setting('project_index', 'build_timeout', default=30)):
+        return jsonify({"error": "Project index is still being built"}), 503
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"error": "since must be an integer"}), 400
+    # An index from another process or build numbers its versions differently
+    changed = index.changed_since(since) if request.args.get('index') == index.id else None
+    return jsonify({
+        "index": index.id,
+        "version": index.version,
+        "reload": changed is None,
+        "changed": changed or [],
+    })
 
 @app.route('/api/run-code', methods=['POST'])
 def run_code():
@@ -73,21 +383,70 @@ def run_code():
     if not code or not language:
         return jsonify({"error": "Code and language must be provided"}), 400
     
-    # Create temporary file to store code
-    with tempfile.NamedTemporaryFile(delete=False, suffix=get_file_extension(language)) as temp_file:
-        temp_file.write(code.encode())
-        temp_file_path = temp_file.name
-    
     try:
-        # Execute code based on language
-        output = execute_code(temp_file_path, language)
-        return jsonify({"output": output})
+        output, usage = run_snippet(code, language, stdin=data.get('stdin'))
+        return jsonify({"output": output, "usage": usage})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+
+@app.route('/api/run-code/stream', methods=['POST'])
+def run_code_stream():
+    data = request.json
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    # Output events are sent as the program prints; the final output, with the
+    # tail of anything too long to keep whole, comes in the result event
+    events = queue.Queue()
+
+    def run():
+        try:
+            output, usage = run_snippet(
+                code, language, stdin=data.get('stdin'),
+                on_output=lambda stream, text: events.put(sse_event(stream, {"text": text}))
+            )
+            events.put(sse_event('result', {"output": output, "usage": usage}))
+        except Exception as e:
+            events.put(sse_event('error', {"error": str(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    return sse_response(iter(events.get, None))
+
+@app.route('/api/run-code/batch', methods=['POST'])
+def run_code_batch():
+    data = request.json or {}
+    jobs = data.get('jobs')
+    max_jobs = get_setting('code_execution', 'batch', 'max_jobs', default=100)
+
+    if not isinstance(jobs, list) or not jobs:
+        return jsonify({"error": "A non-empty list of jobs must be provided"}), 400
+    if len(jobs) > max_jobs:
+        return jsonify({"error": f"A batch can hold at most {max_jobs} jobs"}), 400
+    for index, job in enumerate(jobs):
+        if not isinstance(job, dict) or not job.get('code') or not job.get('language'):
+            return jsonify({"error": f"Job {index}: code and language must be provided"}), 400
+
+    if not data.get('stream'):
+        results = [None] * len(jobs)
+        run_batch(jobs, results.__setitem__)
+        return jsonify({"results": results})
+
+    # One JSON line per job, in the order the jobs finish
+    finished = queue.Queue()
+    threading.Thread(
+        target=run_batch, args=(jobs, lambda index, result: finished.put(dict(result, index=index))), daemon=True
+    ).start()
+
+    def generate():
+        for _ in jobs:
+            yield json.dumps(finished.get()) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/api/generate-tests', methods=['POST'])
 def generate_tests():
@@ -140,6 +499,44 @@ def generate_code():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def sse_response(events):
+    def generate():
+        try:
+            yield from events
+            yield sse_event('done', {})
+        except Exception as e:
+            yield sse_event('error', {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate-code/stream', methods=['POST'])
+def generate_code_stream():
+    data = request.json
+    prompt = data.get('prompt')
+    language = data.get('language')
+    
+    if not prompt or not language:
+        return jsonify({"error": "Prompt and language must be provided"}), 400
+    
+    # Code arrives as `code` events with the surrounding markdown fence removed
+    return sse_response(stream_generated_code(prompt, language))
+
+@app.route('/api/debug-code/stream', methods=['POST'])
+def debug_code_stream():
+    data = request.json
+    code = data.get('code')
+    language = data.get('language')
+    
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+    
+    # Each suggestion is sent as its own event as soon as its JSON object is complete
+    return sse_response(stream_bug_suggestions(code, language))
+
 @app.route('/api/trigger-ci-build', methods=['POST'])
 def trigger_ci_build():
     data = request.json
@@ -156,6 +553,18 @@ def trigger_ci_build():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/trigger-ci-build/stream', methods=['POST'])
+def trigger_ci_build_stream():
+    data = request.json
+    code = data.get('code')
+    language = data.get('language')
+    
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+    
+    # Each log line is sent as a `log` event while the pipeline runs
+    return sse_response(sse_event('log', {"text": line}) for line in ci_pipeline_log(code, language))
+
 def get_file_extension(language):
     extensions = {
         'javascript': '.js',
@@ -166,69 +575,149 @@ def get_file_extension(language):
     }
     return extensions.get(language, '.txt')
 
-def execute_code(file_path, language):
+def run_snippet(code, language, stdin=None, on_output=None, dispatch=True):
+    # Create temporary file to store code
+    with tempfile.NamedTemporaryFile(delete=False, suffix=get_file_extension(language)) as temp_file:
+        temp_file.write(code.encode())
+        temp_file_path = temp_file.name
+
+    try:
+        return execute_code(temp_file_path, language, on_output=on_output, stdin=stdin, dispatch=dispatch)
+    finally:
+        # Clean up temporary file
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+def batch_concurrency(language):
+    # As many jobs at once as there are warm workers for the language, so a
+    # batch queues for them instead of spilling over into local runs
+    fleet = get_worker_fleet()
+    if fleet and fleet.capacity(language):
+        return fleet.capacity(language)
+    pool = get_sandbox_pool()
+    if pool and pool.supports(language):
+        return max(1, pool.environments[language].get('pool_size', 1))
+    return get_setting('code_execution', 'batch', 'parallel_jobs', default=4)
+
+def run_batch_job(job):
+    try:
+        output, usage = run_snippet(job['code'], job['language'], stdin=job.get('stdin'))
+        return {"output": output, "usage": usage}
+    except Exception as e:
+        return {"error": str(e)}
+
+def run_batch(jobs, on_result):
+    """Run a list of {code, language, stdin} jobs, calling on_result(index, result)
+    as each one finishes.
+
+    Jobs are grouped by language and the groups run side by side, each with
+    its own concurrency; every job keeps the usual execution limits.
+    """
+    groups = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(job['language'], []).append(index)
+
+    def run(index):
+        on_result(index, run_batch_job(jobs[index]))
+
+    executors = [ThreadPoolExecutor(batch_concurrency(language)) for language in groups]
+    try:
+        futures = [
+            executor.submit(run, index)
+            for executor, indexes in zip(executors, groups.values())
+            for index in indexes
+        ]
+        for future in futures:
+            future.result()
+    finally:
+        for executor in executors:
+            executor.shutdown()
+
+def execute_code(file_path, language, on_output=None, stdin=None, dispatch=True):
+    """Run a submission; returns (output, usage), usage being None when nothing ran.
+
+    on_output(stream, text) receives stdout and stderr while the program runs.
+    With dispatch, the run goes to the execution worker fleet when there is one.
+    """
+    fleet = get_worker_fleet() if dispatch else None
+    if fleet:
+        try:
+            with open(file_path) as f:
+                return fleet.execute(f.read(), language, stdin=stdin, on_output=on_output)
+        except FleetUnavailable as e:
+            print(f"{e}, running locally")
+
+    # Prefer a warm sandbox worker; fall back to a local process while the
+    # pool is still warming up or when Docker is unavailable
+    pool = get_sandbox_pool()
+    if pool and pool.supports(language):
+        try:
+            output, result = pool.execute(file_path, language, on_output=on_output, stdin=stdin)
+            return output, execution_usage(result, language)
+        except PoolExhausted as e:
+            print(f"{e}, running locally")
+
+    try:
+        with execution_command(file_path, language) as cmd:
+            if not cmd:
+                return f"Execution not supported for language: {language}", None
+
+            result = run_limited(cmd, execution_limits, on_output=on_output, stdin=stdin, files=[file_path])
+        return execution_output(result, language), execution_usage(result, language)
+    except CompilationError as e:
+        return f"Compilation Error: {e}", None
+    except FileNotFoundError as e:
+        missing_cmd = str(e).split("'")[1]
+        return f"Error: Required program '{missing_cmd}' not found. Please ensure it's installed.", None
+    except Exception as e:
+        return f"Execution error: {str(e)}", None
+
+def execution_output(result, language):
+    if result["timed_out"]:
+        return f"Execution timed out after {execution_limits.timeout} seconds"
+    if result["cpu_limited"]:
+        return f"Execution exceeded the CPU time limit of {execution_limits.max_cpu_time} seconds"
+    if result["returncode"] != 0:
+        return f"{runtime_error_label(language)}: {result['stderr']}"
+    return result["stdout"]
+
+def execution_usage(result, language):
+    if result is None:
+        return None
+    record_execution(result, language)
+    return {key: result[key] for key in ('cpu_time', 'peak_rss_kb', 'wall_time', 'truncated')}
+
+def record_execution(result, language):
+    if result["timed_out"]:
+        outcome = 'timeout'
+    elif result["cpu_limited"]:
+        outcome = 'cpu_limit'
+    else:
+        outcome = 'ok' if result["returncode"] == 0 else 'error'
+    executions.inc(language, outcome)
+    execution_wall_time.observe(result["wall_time"], language)
+    if result["cpu_time"] is not None:
+        execution_cpu_time.observe(result["cpu_time"], language)
+
+@contextlib.contextmanager
+def execution_command(file_path, language):
+    # Compiled languages are built once per distinct source; repeat runs reuse
+    # the cached build, which can't be evicted until the `with` block ends
+    if language in COMPILED_LANGUAGES:
+        with open(file_path) as f:
+            source = f.read()
+        with compile_locally(compile_cache, language, source, timeout=compile_timeout) as cmd:
+            yield cmd
+        return
+    
     execution_commands = {
         'javascript': ['node', file_path],
         'python': ['python', file_path],
-        'java': ['java', file_path],
-        'csharp': ['dotnet', 'run', file_path],
-        # Split compile and run into separate steps for C++
-        'cpp': None  # We'll handle C++ differently
     }
-    
-    if language == 'cpp':
-        try:
-            # First compile the code
-            compile_result = subprocess.run(
-                ['g++', file_path, '-o', 'temp_output'], 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
-            
-            if compile_result.returncode != 0:
-                return f"Compilation Error: {compile_result.stderr}"
-            
-            # Then run the compiled program
-            run_result = subprocess.run(
-                ['./temp_output'], 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
-            
-            # Clean up compiled file
-            try:
-                os.remove('temp_output')
-            except:
-                pass
-                
-            if run_result.returncode != 0:
-                return f"Runtime Error: {run_result.stderr}"
-                
-            return run_result.stdout
-            
-        except subprocess.TimeoutExpired:
-            return "Execution timed out after 10 seconds"
-        except FileNotFoundError as e:
-            missing_cmd = str(e).split("'")[1]
-            return f"Error: Required program '{missing_cmd}' not found. Please ensure it's installed."
-        except Exception as e:
-            return f"Execution error: {str(e)}"
-    else:
-        cmd = execution_commands.get(language)
-        if not cmd:
-            return f"Execution not supported for language: {language}"
-        
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            if result.returncode != 0:
-                return f"Error: {result.stderr}"
-            return result.stdout
-        except subprocess.TimeoutExpired:
-            return "Execution timed out after 10 seconds"
-        except Exception as e:
-            return f"Execution error: {str(e)}"
+    yield execution_commands.get(language)
+
+def runtime_error_label(language):
+    return "Runtime Error" if language in COMPILED_LANGUAGES else "Error"
 
 # def execute_code(file_path, language):
 #     execution_commands = {
@@ -268,8 +757,141 @@ def execute_code(file_path, language):
 #     except Exception as e:
 #         return f"Execution error: {str(e)}"
 
-def generate_tests_for_code(code, language):
-    # Generate tests for the provided code using OpenAI API
+def chat_completion(messages, language, model="gpt-4", max_tokens=2000):
+    key = llm_cache.key(model, messages, language, max_tokens)
+
+    def call():
+        started = time.perf_counter()
+        response = get_openai().ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        record_openai_call(model, time.perf_counter() - started, response.get('usage'))
+        return response.choices[0].message.content
+
+    return llm_cache.get_or_call(key, call)
+
+def record_openai_call(model, seconds, usage, messages=None, completion=None):
+    # Streamed completions report no usage, so their tokens are estimated
+    if usage:
+        prompt_tokens, completion_tokens = usage['prompt_tokens'], usage['completion_tokens']
+    else:
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages or [])
+        completion_tokens = estimate_tokens(completion or '')
+    endpoint = current_route.get()
+    openai_latency.observe(seconds, endpoint, model)
+    openai_tokens.inc(endpoint, model, 'prompt', amount=prompt_tokens)
+    openai_tokens.inc(endpoint, model, 'completion', amount=completion_tokens)
+
+def stream_chat_completion(messages, language, model="gpt-4", max_tokens=2000):
+    # Yield response text as it is generated; a cached answer is replayed in one piece
+    key = llm_cache.key(model, messages, language, max_tokens)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    started = time.perf_counter()
+    response = get_openai().ChatCompletion.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    for chunk in response:
+        text = chunk.choices[0].delta.get('content')
+        if text:
+            parts.append(text)
+            yield text
+    record_openai_call(model, time.perf_counter() - started, None, messages, ''.join(parts))
+    llm_cache.set(key, ''.join(parts))
+
+def stream_generated_code(prompt, language):
+    stripper = FenceStripper()
+    for text in stream_chat_completion(code_generation_messages(prompt, language), language):
+        code = stripper.feed(text)
+        if code:
+            yield sse_event('code', {"text": code})
+    code = stripper.finish()
+    if code:
+        yield sse_event('code', {"text": code})
+
+def stream_bug_suggestions(code, language):
+    # Cached findings go out first; batches are analysed concurrently and each
+    # suggestion is sent as soon as any batch's stream completes it
+    starts, reports, batches = bug_analysis_plan(code, language)
+    found = queue.Queue()
+
+    def analyse(batch):
+        parser = JSONArrayStreamer()
+        suggestions = []
+        try:
+            for text in stream_chat_completion(batch.messages, language, max_tokens=batch.max_tokens):
+                for suggestion in parser.feed(text):
+                    if isinstance(suggestion, dict):
+                        suggestions.append(suggestion)
+                        found.put(batch.locate(suggestion))
+            batch.reports(suggestions, parser.finished)
+        finally:
+            found.put(None)
+
+    with ThreadPoolExecutor(prompt_setting('parallel_requests', default=4)) as executor:
+        futures = [executor.submit(in_request_context(analyse), batch) for batch in batches]
+        seen = set()
+        for start, report in zip(starts, reports):
+            for suggestion in report or []:
+                suggestion = shift_suggestion(suggestion, start)
+                if suggestion_key(suggestion) not in seen:
+                    seen.add(suggestion_key(suggestion))
+                    yield sse_event('suggestion', suggestion)
+        remaining = len(futures)
+        while remaining:
+            suggestion = found.get()
+            if suggestion is None:
+                remaining -= 1
+            elif suggestion_key(suggestion) not in seen:
+                seen.add(suggestion_key(suggestion))
+                yield sse_event('suggestion', suggestion)
+        for future in futures:
+            future.result()
+
+def prompt_setting(*keys, default=None):
+    return get_setting('openai', 'prompts', *keys, default=default)
+
+def compacted_chunks(code, language, split=True, min_tokens=None):
+    # Comments stripped (line numbers are kept), then split into chunks that
+    # fit the prompt budget so large files fan out over several requests
+    code = compact_code(code, language)
+    if not split:
+        return [(1, code)]
+    return chunk_code(code, language, prompt_setting('chunk_tokens', default=2500), min_tokens)
+
+def sized_max_tokens(text, kind):
+    # Answers scale with the code they are about; don't reserve 2000 tokens for ten lines
+    return response_budget(
+        estimate_tokens(text),
+        prompt_setting('response_ratio', kind, default=1.0),
+        floor=prompt_setting('min_response_tokens', default=256),
+        ceiling=get_setting('openai', 'max_tokens', default=2000)
+    )
+
+def map_chunks(func, items):
+    # Map step of the chunked requests, at most `parallel_requests` at a time
+    if len(items) == 1:
+        return [func(items[0])]
+    with ThreadPoolExecutor(prompt_setting('parallel_requests', default=4)) as executor:
+        return list(executor.map(in_request_context(func), items))
+
+def in_request_context(func):
+    # Pool threads start without the request's context variables, such as the
+    # route label of OpenAI metrics; each call runs in a copy of them
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(func, *args)
+
+def test_generation_messages(code, language):
+    framework = get_setting('testing', 'frameworks', language, default=f"a common testing framework for {language}")
     prompt = f"""
     Given the following {language} code:
     
@@ -278,41 +900,54 @@ def generate_tests_for_code(code, language):
     ```
     
     Generate comprehensive test cases for this code. Include unit tests for different scenarios, edge cases, and expected behaviors. 
-    Return only the test code in {language}, formatted for a common testing framework for {language}.
+    Return only the test code in {language}, formatted for {framework}.
+    {FRAMEWORK_HINTS.get(framework, '')}
     """
     
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an expert software developer and tester. Generate comprehensive test cases for the provided code."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=2000
+    return [
+        {"role": "system", "content": "You are an expert software developer and tester. Generate comprehensive test cases for the provided code."},
+        {"role": "user", "content": prompt}
+    ]
+
+def test_generation_requests(code, language):
+    # (messages, max_tokens) per chunk; frameworks whose test files can't be
+    # concatenated get the whole (compacted) file in one request
+    framework = get_setting('testing', 'frameworks', language)
+    return [
+        (test_generation_messages(text, language), sized_max_tokens(text, 'tests'))
+        for _, text in compacted_chunks(code, language, split=framework in MERGEABLE_FRAMEWORKS)
+    ]
+
+def merge_generated_tests(results, language):
+    if len(results) == 1:
+        return results[0]
+    return merge_test_files(get_setting('testing', 'frameworks', language), results)
+
+def generate_tests_for_code(code, language):
+    # Generate tests for the provided code using OpenAI API
+    results = map_chunks(
+        lambda prompt: chat_completion(prompt[0], language, max_tokens=prompt[1]),
+        test_generation_requests(code, language)
     )
-    
-    return response.choices[0].message.content
+    return merge_generated_tests(results, language)
 
 def run_tests(code, tests, language):
-    # For demonstration purposes, we'll return mock test results
-    # In a real implementation, you would actually run the tests
-    # and collect results
-    
-    # Mock test results
-    mock_tests = [
-        {"name": "Test basic functionality", "passed": True},
-        {"name": "Test edge case: empty input", "passed": True},
-        {"name": "Test edge case: large input", "passed": False, "error": "Test timed out after 5 seconds"},
-        {"name": "Test error handling", "passed": True}
-    ]
+    # Run the generated tests with the framework configured for the language,
+    # sharding test cases across worker processes
+    framework = get_setting('testing', 'frameworks', language)
+    if not framework:
+        return {"total": 0, "passed": 0, "tests": [], "error": f"No test framework configured for {language}"}
     
-    return {
-        "total": len(mock_tests),
-        "passed": sum(1 for test in mock_tests if test["passed"]),
-        "tests": mock_tests
-    }
+    return run_test_suite(
+        code,
+        tests,
+        framework,
+        workers=get_setting('testing', 'workers', default=4),
+        timeout=get_setting('testing', 'timeout', default=30),
+        limits=execution_limits
+    )
 
-def analyze_code_for_bugs(code, language):
-    # Use OpenAI API to analyze code for bugs
+def bug_analysis_messages(code, language):
     prompt = f"""
     Analyze the following {language} code for potential bugs, inefficiencies, or best practice violations:
     
@@ -322,7 +957,7 @@ def analyze_code_for_bugs(code, language):
     
     For each issue, provide:
     1. The type of issue (bug, inefficiency, or style)
-    2. The line number where the issue occurs
+    2. The line number where the issue occurs, counting the first line shown as line 1
     3. A description of the issue
     4. The original problematic code snippet
     5. A suggested fix
@@ -339,43 +974,144 @@ def analyze_code_for_bugs(code, language):
     ]
     """
     
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an expert code reviewer. Analyze the provided code for bugs and suggest fixes."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=2000
+    return [
+        {"role": "system", "content": "You are an expert code reviewer. Analyze the provided code for bugs and suggest fixes."},
+        {"role": "user", "content": prompt}
+    ]
+
+def bug_report_key(text, language):
+    # Findings are cached per function-level unit, apart from raw responses
+    return 'bugs:' + llm_cache.key("gpt-4", bug_analysis_messages(text, language), language)
+
+class BugAnalysisBatch:
+    """Function-level units analysed in one request.
+
+    The units are sent one after another, separated by a blank line, and each
+    suggestion is mapped back to the unit holding its line. A complete answer
+    is cached per unit, so an unchanged function is answered from the cache
+    even when the functions it was batched with have changed.
+    """
+
+    def __init__(self, units, language):
+        self.units = units  # (unit index, first line in the file, text, report cache key)
+        self.offsets = []  # first line of each unit within the request
+        line = 1
+        for _, _, text, _ in units:
+            self.offsets.append(line)
+            line += text.count('\n') + 2
+        text = '\n\n'.join(unit[2] for unit in units)
+        self.messages = bug_analysis_messages(text, language)
+        self.max_tokens = sized_max_tokens(text, 'bugs')
+
+    def place(self, suggestion):
+        # (position in the batch, suggestion with its line counted from the unit)
+        line = suggestion.get('line')
+        if not isinstance(line, int):
+            return 0, suggestion
+        position = max(0, bisect.bisect_right(self.offsets, line) - 1)
+        return position, dict(suggestion, line=line - self.offsets[position] + 1)
+
+    def locate(self, suggestion):
+        """The suggestion with its line counted from the start of the file."""
+        position, suggestion = self.place(suggestion)
+        return shift_suggestion(suggestion, self.units[position][1])
+
+    def reports(self, suggestions, complete):
+        """Unit index -> that unit's suggestions; cached per unit unless the
+        answer was cut short."""
+        reports = [[] for _ in self.units]
+        for suggestion in suggestions:
+            position, suggestion = self.place(suggestion)
+            reports[position].append(suggestion)
+        if complete:
+            for (_, _, _, key), report in zip(self.units, reports):
+                llm_cache.set(key, json.dumps(report))
+        return {unit[0]: report for unit, report in zip(self.units, reports)}
+
+    def read(self, answer):
+        # Read with the same incremental parser the stream endpoint uses, so
+        # prose around the array or one malformed object doesn't lose the
+        # rest; no reports when the answer holds no JSON array at all
+        parser = JSONArrayStreamer()
+        suggestions = [s for s in parser.feed(answer) if isinstance(s, dict)]
+        return self.reports(suggestions, parser.finished) if parser.in_array else {}
+
+def bug_analysis_plan(code, language):
+    """Split the compacted code into function-level units and look up their
+    cached findings.
+
+    Returns (first line of each unit, cached report or None per unit, batches
+    of the uncached units). Batches hold consecutive units up to
+    `chunk_tokens`, so the prompt boilerplate isn't repeated per function.
+    """
+    units = compacted_chunks(code, language, min_tokens=prompt_setting('unit_tokens', default=150))
+    budget = prompt_setting('chunk_tokens', default=2500)
+    reports = []
+    batches, pending, pending_tokens = [], [], 0
+    for index, (start, text) in enumerate(units):
+        key = bug_report_key(text, language)
+        cached = llm_cache.get(key)
+        reports.append(None if cached is None else json.loads(cached))
+        if cached is not None:
+            continue
+        tokens = estimate_tokens(text)
+        if pending and pending_tokens + tokens > budget:
+            batches.append(BugAnalysisBatch(pending, language))
+            pending, pending_tokens = [], 0
+        pending.append((index, start, text, key))
+        pending_tokens += tokens
+    if pending:
+        batches.append(BugAnalysisBatch(pending, language))
+    return [start for start, _ in units], reports, batches
+
+def shift_suggestion(suggestion, start):
+    # Chunk line numbers count from the chunk; move them onto the whole file
+    if isinstance(suggestion, dict) and isinstance(suggestion.get('line'), int):
+        return dict(suggestion, line=suggestion['line'] + start - 1)
+    return suggestion
+
+def suggestion_key(suggestion):
+    # Same line, kind and description (ignoring case and spacing) is the same finding
+    return (
+        suggestion.get('line'),
+        suggestion.get('type'),
+        ' '.join(str(suggestion.get('description', '')).lower().split())
     )
-    
-    result = response.choices[0].message.content
-    
-    # Extract the JSON part from the response
-    try:
-        # Find JSON array in the response
-        start_idx = result.find('[')
-        end_idx = result.rfind(']') + 1
-        
-        if start_idx >= 0 and end_idx > start_idx:
-            json_str = result[start_idx:end_idx]
-            return json.loads(json_str)
-        else:
-            # Parse the whole response as JSON if brackets not found
-            return json.loads(result)
-    except json.JSONDecodeError:
-        # Return a fallback response if JSON parsing fails
-        return [
-            {
-                "type": "style",
-                "line": 1,
-                "description": "Could not automatically detect specific issues. Manual code review recommended.",
-                "originalCode": "",
-                "fixCode": ""
-            }
-        ]
 
-def generate_code_from_prompt(prompt, language):
-    # Generate code based on user prompt using OpenAI API
+def merge_bug_reports(starts, reports):
+    # One list sorted by line; units whose answer couldn't be parsed are left
+    # out unless none could be
+    parsed = [(start, report) for start, report in zip(starts, reports) if report is not None]
+    if not parsed:
+        return [MANUAL_REVIEW_SUGGESTION]
+    merged = {}
+    for start, report in parsed:
+        for suggestion in report:
+            suggestion = shift_suggestion(suggestion, start)
+            merged.setdefault(suggestion_key(suggestion), suggestion)
+    return sorted(merged.values(), key=lambda s: s['line'] if isinstance(s.get('line'), int) else 0)
+
+def analyze_code_for_bugs(code, language):
+    # Use OpenAI API to analyze code for bugs, one request per batch of uncached units
+    starts, reports, batches = bug_analysis_plan(code, language)
+    answers = map_chunks(
+        lambda batch: chat_completion(batch.messages, language, max_tokens=batch.max_tokens),
+        batches
+    )
+    for batch, answer in zip(batches, answers):
+        for index, report in batch.read(answer).items():
+            reports[index] = report
+    return merge_bug_reports(starts, reports)
+
+MANUAL_REVIEW_SUGGESTION = {
+    "type": "style",
+    "line": 1,
+    "description": "Could not automatically detect specific issues. Manual code review recommended.",
+    "originalCode": "",
+    "fixCode": ""
+}
+
+def code_generation_messages(prompt, language):
     ai_prompt = f"""
     Write {language} code that accomplishes the following:
     
@@ -384,17 +1120,17 @@ def generate_code_from_prompt(prompt, language):
     Return only the code, well-documented with comments explaining the approach and key parts.
     """
     
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": f"You are an expert {language} programmer. Generate clean, efficient, and well-documented code."},
-            {"role": "user", "content": ai_prompt}
-        ],
-        max_tokens=2000
-    )
-    
-    result = response.choices[0].message.content
-    
+    return [
+        {"role": "system", "content": f"You are an expert {language} programmer. Generate clean, efficient, and well-documented code."},
+        {"role": "user", "content": ai_prompt}
+    ]
+
+def generate_code_from_prompt(prompt, language):
+    # Generate code based on user prompt using OpenAI API
+    result = chat_completion(code_generation_messages(prompt, language), language)
+    return strip_code_fences(result)
+
+def strip_code_fences(result):
     # Strip markdown code blocks if present
     if result.startswith("```") and result.endswith("```"):
         # Remove the first line and the last line
@@ -405,65 +1141,69 @@ def generate_code_from_prompt(prompt, language):
     return result
 
 def run_ci_pipeline(code, language):
+    return ''.join(ci_pipeline_log(code, language))
+
+def ci_pipeline_log(code, language):
     # Mock CI pipeline execution
     # In a real implementation, this would execute a series of steps:
     # 1. Run code analysis and linting
     # 2. Run tests
     # 3. Build the application
     # 4. Deploy if all checks pass
+    # The log is yielded line by line so it can be streamed as it is produced
     
-    log = "=== CI/CD Pipeline Started ===\n\n"
+    yield "=== CI/CD Pipeline Started ===\n\n"
     
     # Stage 1: Code Analysis
-    log += "=== Stage 1: Code Analysis ===\n"
+    yield "=== Stage 1: Code Analysis ===\n"
     code_quality_issues = analyze_code_quality(code, language)
     if code_quality_issues:
-        log += f"Found {len(code_quality_issues)} code quality issues:\n"
+        yield f"Found {len(code_quality_issues)} code quality issues:\n"
         for i, issue in enumerate(code_quality_issues, 1):
-            log += f"{i}. {issue}\n"
+            yield f"{i}. {issue}\n"
     else:
-        log += "No code quality issues found.\n"
+        yield "No code quality issues found.\n"
     
     # Stage 2: Testing
-    log += "\n=== Stage 2: Running Tests ===\n"
+    yield "\n=== Stage 2: Running Tests ===\n"
     test_results = {
         "total": 4,
         "passed": 3,
         "failed": 1
     }
-    log += f"Ran {test_results['total']} tests\n"
-    log += f"Passed: {test_results['passed']}\n"
-    log += f"Failed: {test_results['failed']}\n"
+    yield f"Ran {test_results['total']} tests\n"
+    yield f"Passed: {test_results['passed']}\n"
+    yield f"Failed: {test_results['failed']}\n"
     
     # Stage 3: Build
-    log += "\n=== Stage 3: Building Application ===\n"
-    log += "Building application...\n"
-    log += "Build completed successfully.\n"
+    yield "\n=== Stage 3: Building Application ===\n"
+    yield "Building application...\n"
+    yield "Build completed successfully.\n"
     
     # Stage 4: Deployment
     if test_results['failed'] == 0:
-        log += "\n=== Stage 4: Deployment ===\n"
-        log += "Deploying application to staging environment...\n"
-        log += "Deployment successful.\n"
+        yield "\n=== Stage 4: Deployment ===\n"
+        yield "Deploying application to staging environment...\n"
+        yield "Deployment successful.\n"
     else:
-        log += "\n=== Stage 4: Deployment ===\n"
-        log += "Deployment skipped due to test failures.\n"
-    
-    log += "\n=== CI/CD Pipeline Completed ===\n"
+        yield "\n=== Stage 4: Deployment ===\n"
+        yield "Deployment skipped due to test failures.\n"
     
-    return log
+    yield "\n=== CI/CD Pipeline Completed ===\n"
 
 def analyze_code_quality(code, language):
-    # Mock code quality analysis
-    # In a real implementation, this would use appropriate tools for each language
-    mock_issues = [
-        "Line 15: Variable 'temp' is defined but never used",
-        "Line 23: Consider using a more descriptive variable name than 'x'",
-        "Line 42: This function is too complex (cyclomatic complexity > 10)"
-    ]
-    
-    return mock_issues
+    # Lint with the language's configured linter; functions unchanged since
+    # the last analysis are answered from the lint cache
+    if not code_linter.supports(language):
+        return []
+    try:
+        messages = code_linter.lint(code, language)
+    except LintError as e:
+        print(f"Linting failed: {e}")
+        return []
+    return [f"Line {m['line']}: {m['message']} ({m['code']})" for m in messages]
 
 if __name__ == '__main__':
+    warm_up()
     # Use port 3000 to match your frontend expectations
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
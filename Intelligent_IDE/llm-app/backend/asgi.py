@@ -0,0 +1,402 @@
+"""Async serving mode for the backend API.
+
+LLM calls go through openai's aiohttp client, so slow GPT-4 requests no
+longer tie up a worker thread each. Code runs under the same resource limits
+as the Flask app, on the blocking thread pool, and rate-limited requests
+wait in the same fair queue without holding a thread.
+Routes without an async implementation fall through to the Flask app.
+
+Run with: gunicorn -c gunicorn.conf.py asgi:application
+"""
+import asyncio
+import contextlib
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, Response, g, request, jsonify
+from quart_cors import cors
+
+import app as backend
+from compile_cache import CompilationError
+from execution_limits import run_limited
+from metrics import current_route
+from rate_limiting import RateLimited, RateLimitUnavailable
+from sandbox_pool import PoolExhausted
+from worker_fleet import FleetUnavailable
+from streaming import FenceStripper, JSONArrayStreamer, sse_event
+
+app = cors(Quart(__name__))
+
+# Upper bound on simultaneous connections to the OpenAI API per process
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+# Threads for the blocking pieces: Docker SDK calls, compiles, cache backends
+BLOCKING_THREADS = int(os.getenv('BLOCKING_THREADS', '64'))
+
+@app.before_serving
+async def open_clients():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_THREADS))
+    app.openai_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=OPENAI_MAX_CONNECTIONS)
+    )
+    backend.warm_up()
+
+@app.before_request
+async def start_request_timer():
+    # Registered before the rate limit so refused and queued requests are timed too
+    g.metrics_started = time.perf_counter()
+    current_route.set(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+async def observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        backend.request_latency.observe(
+            time.perf_counter() - started, current_route.get(), request.method, str(response.status_code)
+        )
+    return response
+
+@app.before_request
+async def limit_rate():
+    # Same limits as the Flask app, but a queued request waits without holding a thread
+    limiter = backend.rate_limiter
+    if limiter is None or request.method != 'POST':
+        return None
+    limit = limiter.limit_for(request.path)
+    if limit is None:
+        return None
+    try:
+        await limiter.acquire_async(
+            backend.rate_limit_user(request.headers, request.remote_addr), limit,
+            backend.rate_limit_cost(request.path, await request.get_json(silent=True))
+        )
+    except RateLimited as e:
+        return jsonify({"error": str(e), "retry_after": round(e.retry_after, 1)}), 429, {
+            'Retry-After': str(max(1, math.ceil(e.retry_after)))
+        }
+    except RateLimitUnavailable as e:
+        if not backend.rate_limit_store_failed(e):
+            return jsonify({"error": "Rate limiting is unavailable, try again shortly"}), 503, {'Retry-After': '5'}
+    return None
+
+@app.after_serving
+async def close_clients():
+    await app.openai_session.close()
+
+def openai_client():
+    # openai is imported on the first LLM request; it keeps its aiohttp session
+    # in a context variable, so set it for each request that uses it
+    openai = backend.get_openai()
+    openai.aiosession.set(app.openai_session)
+    return openai
+
+async def chat_completion(messages, language, model="gpt-4", max_tokens=2000):
+    key = backend.llm_cache.key(model, messages, language, max_tokens)
+
+    openai = openai_client()
+
+    async def call():
+        started = time.perf_counter()
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        backend.record_openai_call(model, time.perf_counter() - started, response.get('usage'))
+        return response.choices[0].message.content
+
+    return await backend.llm_cache.aget_or_call(key, call)
+
+async def stream_chat_completion(messages, language, model="gpt-4", max_tokens=2000):
+    key = backend.llm_cache.key(model, messages, language, max_tokens)
+    cached = await asyncio.to_thread(backend.llm_cache.get, key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    started = time.perf_counter()
+    response = await openai_client().ChatCompletion.acreate(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    async for chunk in response:
+        text = chunk.choices[0].delta.get('content')
+        if text:
+            parts.append(text)
+            yield text
+    backend.record_openai_call(model, time.perf_counter() - started, None, messages, ''.join(parts))
+    await asyncio.to_thread(backend.llm_cache.set, key, ''.join(parts))
+
+async def map_chunks(func, items):
+    # Async counterpart of backend.map_chunks: gather with a bound on requests in flight
+    limit = asyncio.Semaphore(backend.prompt_setting('parallel_requests', default=4))
+
+    async def bounded(item):
+        async with limit:
+            return await func(item)
+
+    return await asyncio.gather(*(bounded(item) for item in items))
+
+async def execute_code(file_path, language, on_output=None, stdin=None):
+    fleet = backend.get_worker_fleet()
+    if fleet:
+        try:
+            with open(file_path) as f:
+                code = f.read()
+            return await asyncio.to_thread(fleet.execute, code, language, stdin=stdin, on_output=on_output)
+        except FleetUnavailable as e:
+            print(f"{e}, running locally")
+
+    pool = backend.get_sandbox_pool()
+    if pool and pool.supports(language):
+        try:
+            output, result = await asyncio.to_thread(
+                pool.execute, file_path, language, on_output=on_output, stdin=stdin
+            )
+            return output, backend.execution_usage(result, language)
+        except PoolExhausted as e:
+            print(f"{e}, running locally")
+
+    try:
+        with contextlib.ExitStack() as stack:
+            # Compiling happens on entry, so enter the command in a thread too
+            cmd = await asyncio.to_thread(stack.enter_context, backend.execution_command(file_path, language))
+            if not cmd:
+                return f"Execution not supported for language: {language}", None
+
+            # Not an asyncio subprocess: its child watcher reaps the process
+            # before wait4 could collect the CPU time and peak RSS
+            result = await asyncio.to_thread(
+                run_limited, cmd, backend.execution_limits, on_output=on_output, stdin=stdin, files=[file_path]
+            )
+        return backend.execution_output(result, language), backend.execution_usage(result, language)
+    except CompilationError as e:
+        return f"Compilation Error: {e}", None
+    except FileNotFoundError as e:
+        missing_cmd = str(e).split("'")[1]
+        return f"Error: Required program '{missing_cmd}' not found. Please ensure it's installed.", None
+    except Exception as e:
+        return f"Execution error: {str(e)}", None
+
+def sse_response(events):
+    async def generate():
+        try:
+            async for event in events:
+                yield event
+            yield sse_event('done', {})
+        except Exception as e:
+            yield sse_event('error', {"error": str(e)})
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/run-code', methods=['POST'])
+async def run_code():
+    data = await request.get_json()
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=backend.get_file_extension(language)) as temp_file:
+        temp_file.write(code.encode())
+        temp_file_path = temp_file.name
+
+    try:
+        output, usage = await execute_code(temp_file_path, language, stdin=data.get('stdin'))
+        return jsonify({"output": output, "usage": usage})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+@app.route('/api/run-code/stream', methods=['POST'])
+async def run_code_stream():
+    data = await request.get_json()
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=backend.get_file_extension(language)) as temp_file:
+        temp_file.write(code.encode())
+        temp_file_path = temp_file.name
+
+    async def events():
+        # Output is read on a worker thread and handed to the event loop
+        loop = asyncio.get_running_loop()
+        output_events = asyncio.Queue()
+
+        def on_output(stream, text):
+            loop.call_soon_threadsafe(output_events.put_nowait, sse_event(stream, {"text": text}))
+
+        async def run():
+            try:
+                return await execute_code(temp_file_path, language, on_output, data.get('stdin'))
+            finally:
+                await output_events.put(None)
+
+        execution = asyncio.ensure_future(run())
+        try:
+            while (event := await output_events.get()) is not None:
+                yield event
+            output, usage = await execution
+            yield sse_event('result', {"output": output, "usage": usage})
+        finally:
+            execution.cancel()
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    return sse_response(events())
+
+@app.route('/api/generate-tests', methods=['POST'])
+async def generate_tests():
+    data = await request.get_json()
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    try:
+        results = await map_chunks(
+            lambda prompt: chat_completion(prompt[0], language, max_tokens=prompt[1]),
+            backend.test_generation_requests(code, language)
+        )
+        tests = backend.merge_generated_tests(results, language)
+        test_results = await asyncio.to_thread(backend.run_tests, code, tests, language)
+        return jsonify(test_results)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/debug-code', methods=['POST'])
+async def debug_code():
+    data = await request.get_json()
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    try:
+        starts, reports, batches = await asyncio.to_thread(backend.bug_analysis_plan, code, language)
+        answers = await map_chunks(
+            lambda batch: chat_completion(batch.messages, language, max_tokens=batch.max_tokens),
+            batches
+        )
+        for batch, answer in zip(batches, answers):
+            for index, report in (await asyncio.to_thread(batch.read, answer)).items():
+                reports[index] = report
+        return jsonify({"suggestions": backend.merge_bug_reports(starts, reports)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/generate-code', methods=['POST'])
+async def generate_code():
+    data = await request.get_json()
+    prompt = data.get('prompt')
+    language = data.get('language')
+
+    if not prompt or not language:
+        return jsonify({"error": "Prompt and language must be provided"}), 400
+
+    try:
+        result = await chat_completion(backend.code_generation_messages(prompt, language), language)
+        return jsonify({"generatedCode": backend.strip_code_fences(result)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/generate-code/stream', methods=['POST'])
+async def generate_code_stream():
+    data = await request.get_json()
+    prompt = data.get('prompt')
+    language = data.get('language')
+
+    if not prompt or not language:
+        return jsonify({"error": "Prompt and language must be provided"}), 400
+
+    async def events():
+        stripper = FenceStripper()
+        async for text in stream_chat_completion(backend.code_generation_messages(prompt, language), language):
+            code = stripper.feed(text)
+            if code:
+                yield sse_event('code', {"text": code})
+        code = stripper.finish()
+        if code:
+            yield sse_event('code', {"text": code})
+
+    return sse_response(events())
+
+@app.route('/api/debug-code/stream', methods=['POST'])
+async def debug_code_stream():
+    data = await request.get_json()
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    async def events():
+        # Cached findings go out first; batches stream concurrently and
+        # suggestions are sent in the order they complete
+        found = asyncio.Queue()
+
+        async def analyse(batch):
+            parser = JSONArrayStreamer()
+            suggestions = []
+            try:
+                async for text in stream_chat_completion(batch.messages, language, max_tokens=batch.max_tokens):
+                    for suggestion in parser.feed(text):
+                        if isinstance(suggestion, dict):
+                            suggestions.append(suggestion)
+                            await found.put(batch.locate(suggestion))
+                await asyncio.to_thread(batch.reports, suggestions, parser.finished)
+            finally:
+                await found.put(None)
+
+        starts, reports, batches = await asyncio.to_thread(backend.bug_analysis_plan, code, language)
+        analysis = asyncio.ensure_future(map_chunks(analyse, batches))
+        try:
+            seen = set()
+            for start, report in zip(starts, reports):
+                for suggestion in report or []:
+                    suggestion = backend.shift_suggestion(suggestion, start)
+                    if backend.suggestion_key(suggestion) not in seen:
+                        seen.add(backend.suggestion_key(suggestion))
+                        yield sse_event('suggestion', suggestion)
+            remaining = len(batches)
+            while remaining:
+                suggestion = await found.get()
+                if suggestion is None:
+                    remaining -= 1
+                elif backend.suggestion_key(suggestion) not in seen:
+                    seen.add(backend.suggestion_key(suggestion))
+                    yield sse_event('suggestion', suggestion)
+            await analysis
+        finally:
+            analysis.cancel()
+
+    return sse_response(events())
+
+ASYNC_PATHS = {rule.rule for rule in app.url_map.iter_rules()}
+flask_app = WsgiToAsgi(backend.app)
+
+async def application(scope, receive, send):
+    # Lifespan events and async routes go to Quart, everything else to Flask
+    if scope['type'] != 'http' or scope['path'] in ASYNC_PATHS:
+        await app(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
@@ -0,0 +1,327 @@
+import contextlib
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from languages import csharp_project, find_java_main_class
+
+COMPILED_LANGUAGES = ('cpp', 'java', 'csharp')
+
+# Seconds after which a leftover .build-/.evict- directory is assumed to belong
+# to a process that died; younger ones may still be in use by a live process
+STALE_TEMP_AGE = 3600
+
+class CompilationError(Exception):
+    pass
+
+def build_spec(language, source):
+    """Describe how to compile `source` and run the result.
+
+    Run commands use `{entry}` for the directory holding the build artifacts.
+    """
+    if language == 'cpp':
+        return {
+            'files': {'main.cpp': source},
+            'build': ['g++', '-O2', 'main.cpp', '-o', 'main'],
+            'run': ['{entry}/main'],
+            'artifacts': ['main'],
+        }
+    if language == 'java':
+        main_class = find_java_main_class(source)
+        return {
+            'files': {f'{main_class}.java': source},
+            'build': ['javac', '-d', 'classes', f'{main_class}.java'],
+            'run': ['java', '-cp', '{entry}/classes', main_class],
+            'artifacts': ['classes'],
+        }
+    if language == 'csharp':
+        return {
+            'files': {'Program.cs': source, 'app.csproj': csharp_project()},
+            'build': ['dotnet', 'build', '-c', 'Release', '-o', 'out', '--nologo'],
+            'run': ['dotnet', '{entry}/out/app.dll'],
+            'artifacts': ['out'],
+        }
+    return None
+
+def run_command(spec, entry_dir):
+    return [part.replace('{entry}', entry_dir) for part in spec['run']]
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class CompileCache:
+    """Content-addressed store of compile outputs with LRU eviction under a disk budget.
+
+    Each entry is a directory named after sha256(source, compiler, flags), so
+    concurrent requests never share an output path. Entries checked out with
+    checkout() are pinned and never evicted while they are in use.
+
+    Several processes may share the root: an entry published by another
+    process is picked up from disk on a miss, and pins are shared flocks on the
+    entry directory, which eviction in any process respects.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.key_locks = {}  # key -> [lock, threads using it]
+        self.entries = {}  # key -> [size, last_used]
+        self.pins = {}  # key -> [runs using the entry, fd holding the shared flock]
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if key.startswith('.'):
+                # An unfinished build or eviction, removed once it is too old
+                # to belong to a process still using the root
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_TEMP_AGE:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+                continue
+            if not os.path.isdir(path):
+                continue
+            self.entries[key] = [_dir_size(path), os.path.getmtime(path)]
+
+    def key(self, files, compiler_id, build_cmd):
+        payload = json.dumps([sorted(files.items()), compiler_id, build_cmd])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, key, pin=False):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry[1] = time.time()
+        path = os.path.join(self.root, key)
+        try:
+            os.utime(path)
+        except OSError:
+            path = None
+        if path and pin:
+            with self.lock:
+                if not self._pin(key, path):
+                    path = None
+        if path is None:
+            # Removed behind the cache's back, e.g. evicted by another process
+            with self.lock:
+                self.entries.pop(key, None)
+        return path
+
+    def _adopt(self, key, pin=False):
+        # An entry another process sharing the root has published
+        path = os.path.join(self.root, key)
+        if not os.path.isdir(path):
+            return None
+        size = _dir_size(path)
+        with self.lock:
+            self.entries[key] = [size, time.time()]
+        return self.lookup(key, pin)
+
+    def _pin(self, key, path, fd=None):
+        """Pin `key` for one more run; the caller holds self.lock.
+
+        The first pin takes a shared flock on the entry directory (or on `fd`,
+        already open on it), so no process evicts it. Returns False when the
+        directory was evicted before the lock was taken.
+        """
+        if key in self.pins:
+            self.pins[key][0] += 1
+            if fd is not None:
+                os.close(fd)
+            return True
+        try:
+            if fd is None:
+                fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+            # Waits at most for an eviction in progress to rename the directory aside
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(path)
+        except OSError:
+            if fd is not None:
+                os.close(fd)
+            return False
+        self.pins[key] = [1, fd]
+        return True
+
+    def get_or_build(self, key, builder, pin=False):
+        """Return the entry directory for `key`, calling builder(work_dir) on a miss.
+
+        The builder must leave the artifacts in work_dir or raise CompilationError.
+        Without `pin` the entry may be evicted once a later build needs the room;
+        use checkout() to hold it while it is used.
+        """
+        path = self.lookup(key, pin)
+        if path:
+            return path
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            # Identical submissions racing each other compile only once: the
+            # entry is published before the lock is released, so a waiter finds it
+            with key_lock[0]:
+                path = self.lookup(key, pin) or self._adopt(key, pin)
+                if path:
+                    return path
+
+                work_dir = tempfile.mkdtemp(prefix='.build-', dir=self.root)
+                fd = None
+                try:
+                    builder(work_dir)
+                    # mkdtemp makes the directory private; programs running as a
+                    # sandbox uid need to read the entry (but not change it)
+                    os.chmod(work_dir, 0o755)
+                    if pin:
+                        # Opened before the rename, so the pin holds from the moment
+                        # the entry is published
+                        fd = os.open(work_dir, os.O_RDONLY | os.O_DIRECTORY)
+                    path = os.path.join(self.root, key)
+                    try:
+                        os.rename(work_dir, path)
+                    except OSError as e:
+                        if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                            raise
+                        # Another process published the same build first
+                        if fd is not None:
+                            os.close(fd)
+                            fd = None
+                        shutil.rmtree(work_dir, ignore_errors=True)
+                        path = self._adopt(key, pin)
+                        if path is None:
+                            raise
+                        return path
+                except Exception:
+                    if fd is not None:
+                        os.close(fd)
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                    raise
+                size = _dir_size(path)
+                with self.lock:
+                    self.entries[key] = [size, time.time()]
+                    if pin:
+                        self._pin(key, path, fd)
+        finally:
+            with self.lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self.key_locks[key]
+
+        self._evict(keep=key)
+        return path
+
+    @contextlib.contextmanager
+    def checkout(self, key, builder):
+        """get_or_build() for the duration of a `with` block, with the entry pinned."""
+        path = self.get_or_build(key, builder, pin=True)
+        try:
+            yield path
+        finally:
+            self._unpin(key)
+
+    def _unpin(self, key):
+        with self.lock:
+            self.pins[key][0] -= 1
+            if not self.pins[key][0]:
+                os.close(self.pins.pop(key)[1])
+
+    def _evict(self, keep=None):
+        with self.lock:
+            total = sum(size for size, _ in self.entries.values())
+            trash = []
+            for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes:
+                    break
+                if key == keep or key in self.pins:
+                    continue
+                path = os.path.join(self.root, key)
+                try:
+                    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+                except OSError:
+                    # Already evicted by another process
+                    del self.entries[key]
+                    total -= size
+                    continue
+                try:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # pinned by another process
+                    del self.entries[key]
+                    total -= size
+                    # Moved aside before the lock is released, so a rebuild of the
+                    # same key never finds the old directory in its way
+                    doomed = os.path.join(self.root, f'.evict-{key}-{os.getpid()}-{time.monotonic_ns()}')
+                    try:
+                        os.rename(path, doomed)
+                        trash.append(doomed)
+                    except OSError:
+                        pass
+                finally:
+                    os.close(fd)
+        for path in trash:
+            shutil.rmtree(path, ignore_errors=True)
+
+_compiler_ids = {}
+
+def compiler_id(command):
+    # Identify the local toolchain by its version banner so upgrades miss the cache
+    if command not in _compiler_ids:
+        try:
+            result = subprocess.run([command, '--version'], capture_output=True, text=True, timeout=10)
+            banner = (result.stdout or result.stderr).strip().split('\n')[0]
+        except (OSError, subprocess.TimeoutExpired):
+            banner = ''
+        _compiler_ids[command] = f"{command} {banner}"
+    return _compiler_ids[command]
+
+def write_sources(spec, work_dir):
+    for name, content in spec['files'].items():
+        with open(os.path.join(work_dir, name), 'w') as f:
+            f.write(content)
+
+@contextlib.contextmanager
+def compile_locally(cache, language, source, timeout=60):
+    """Compile `source` with the local toolchain, reusing a cached build when
+    possible, and yield the command that runs it.
+
+    The build stays pinned in the cache until the `with` block ends.
+    """
+    spec = build_spec(language, source)
+    key = cache.key(spec['files'], compiler_id(spec['build'][0]), spec['build'])
+
+    def builder(work_dir):
+        write_sources(spec, work_dir)
+        result = subprocess.run(spec['build'], cwd=work_dir, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise CompilationError(result.stderr or result.stdout)
+        # Keep only the build outputs in the cache entry
+        for name in os.listdir(work_dir):
+            if name not in spec['artifacts']:
+                path = os.path.join(work_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+    with cache.checkout(key, builder) as entry_dir:
+        yield run_command(spec, entry_dir)
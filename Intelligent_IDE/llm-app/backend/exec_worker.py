@@ -0,0 +1,107 @@
+"""Remote execution worker for the backend's WorkerFleet (see worker_fleet.py).
+
+Runs submissions exactly as the backend does when it runs them itself, warm
+sandbox pool and execution limits included, and reports its load on /health
+so the dispatcher can place runs. Start as many as needed, as processes or
+containers, and list their URLs under code_execution.fleet.workers.
+
+    python exec_worker.py --port 5100 --slots 8
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+import app as backend
+from config import get_setting
+from metrics import CONTENT_TYPE, Callback, instrument_flask, render as render_metrics
+
+worker = Flask(__name__)
+
+slots = int(os.getenv('EXEC_WORKER_SLOTS', '8'))
+active = {}  # language -> runs in progress
+active_lock = threading.Lock()
+
+# Runs executed here are recorded in this process's code_execution_* metrics
+instrument_flask(worker, backend.request_latency)
+
+def active_runs():
+    with active_lock:
+        return {(language,): count for language, count in active.items()}
+
+Callback('exec_worker_active_runs', "Runs in progress on this worker", ['language'], active_runs)
+
+@worker.route('/health', methods=['GET'])
+def health():
+    # Only a pool that already exists; connecting to Docker here could outlast the check
+    pool = backend.sandbox_pool
+    warm = {language: idle.qsize() for language, idle in pool.idle.items()} if pool else {}
+    with active_lock:
+        running = sum(active.values())
+    return jsonify({
+        "status": "ok",
+        "slots": slots,
+        "active": running,
+        "languages": get_setting('code_execution', 'supported_languages', default=[]),
+        "warm": warm,
+    })
+
+@worker.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@worker.route('/run', methods=['POST'])
+def run():
+    data = request.json
+    code = data.get('code')
+    language = data.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Code and language must be provided"}), 400
+
+    with active_lock:
+        if sum(active.values()) >= slots:
+            # The dispatcher tries another worker
+            return jsonify({"error": "Worker is at capacity"}), 503
+        active[language] = active.get(language, 0) + 1
+
+    lines = queue.Queue()
+
+    def execute():
+        on_output = None
+        if data.get('stream'):
+            on_output = lambda stream, text: lines.put({"stream": stream, "text": text})
+        try:
+            output, usage = backend.run_snippet(code, language, stdin=data.get('stdin'),
+                                                on_output=on_output, dispatch=False)
+        except Exception as e:
+            output, usage = f"Execution error: {str(e)}", None
+        finally:
+            with active_lock:
+                active[language] -= 1
+        lines.put({"result": {"output": output, "usage": usage}})
+        lines.put(None)
+
+    threading.Thread(target=execute, daemon=True).start()
+    return Response(
+        stream_with_context(json.dumps(line) + '\n' for line in iter(lines.get, None)),
+        mimetype='application/x-ndjson'
+    )
+
+def warm_sandboxes():
+    # Start the warm sandbox workers as soon as Docker is reachable, before the first run arrives
+    if backend.wait_for_docker():
+        backend.get_sandbox_pool()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--slots', type=int, default=slots, help="runs accepted at once")
+    args = parser.parse_args()
+    slots = args.slots
+    threading.Thread(target=warm_sandboxes, daemon=True).start()
+    worker.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,336 @@
+import codecs
+import contextlib
+import errno
+import fcntl
+import json
+import math
+import os
+import re
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+READ_SIZE = 65536
+
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'limited_exec.py')
+# Seconds past the timeout before a launcher that has not exited is killed
+LAUNCHER_GRACE = 5
+# Lock files marking which sandbox uids are in use, shared by every backend process
+UID_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'sandbox-uids')
+
+class ExecutionLimits:
+    """Resource caps for a single run of user code, read from code_execution in config.yaml.
+
+    Local runs get them as rlimits, set by limited_exec.py; sandbox workers
+    get the same caps as container (cgroup) limits. A backend running as root
+    runs each program as its own uid from `sandbox_uids` (first uid, count),
+    since RLIMIT_NPROC, the process cap, does not apply to root.
+    """
+
+    def __init__(self, timeout=10, max_memory=512, max_cpu_time=None, max_processes=64,
+                 max_cpus=1, max_output_kb=1024, max_file_size=64, sandbox_uids=(60000, 64)):
+        self.timeout = timeout
+        self.max_memory = max_memory  # MB
+        self.max_cpu_time = max_cpu_time or timeout  # seconds
+        self.max_processes = max_processes
+        self.max_cpus = max_cpus
+        self.max_output = max_output_kb * 1024  # bytes kept per stream, head and tail
+        self.max_file_size = max_file_size  # MB
+        self.sandbox_uids = range(sandbox_uids[0], sandbox_uids[0] + sandbox_uids[1])
+
+    @classmethod
+    def from_settings(cls, settings):
+        settings = settings or {}
+        limits = settings.get('limits') or {}
+        return cls(
+            timeout=settings.get('timeout', 10),
+            max_memory=settings.get('max_memory', 512),
+            max_cpu_time=limits.get('max_cpu_time'),
+            max_processes=limits.get('max_processes', 64),
+            max_cpus=limits.get('max_cpus', 1),
+            max_output_kb=limits.get('max_output_kb', 1024),
+            max_file_size=limits.get('max_file_size', 64),
+            sandbox_uids=(limits.get('sandbox_uid', 60000), limits.get('sandbox_uid_count', 64)),
+        )
+
+    def rlimits(self, uid=None):
+        cpu = math.ceil(self.max_cpu_time)
+        wanted = [
+            # RLIMIT_DATA rather than RLIMIT_AS: V8 and the JVM reserve far more
+            # address space than they ever touch and refuse to start under AS
+            (resource.RLIMIT_DATA, self.max_memory << 20, self.max_memory << 20),
+            # SIGXCPU at the soft limit, SIGKILL a second later
+            (resource.RLIMIT_CPU, cpu, cpu + 1),
+            (resource.RLIMIT_FSIZE, self.max_file_size << 20, self.max_file_size << 20),
+            (resource.RLIMIT_CORE, 0, 0),
+        ]
+        if uid is not None:
+            # The uid is the run's alone; the launcher and its shell run as it too
+            wanted.append((resource.RLIMIT_NPROC, self.max_processes + 2, self.max_processes + 2))
+        elif os.geteuid() != 0:
+            # RLIMIT_NPROC counts every task of the user, the backend's own
+            # threads included, so the cap is relative to what is running now
+            tasks = _task_count() + self.max_processes
+            wanted.append((resource.RLIMIT_NPROC, tasks, tasks))
+
+        limits = []
+        for kind, soft, hard in wanted:
+            # An unprivileged process can only lower its hard limits
+            _, current = resource.getrlimit(kind)
+            if current != resource.RLIM_INFINITY:
+                soft, hard = min(soft, current), min(hard, current)
+            limits.append((kind, soft, hard))
+        return limits
+
+    def container_options(self):
+        return {
+            'mem_limit': f'{self.max_memory}m',
+            'memswap_limit': f'{self.max_memory}m',  # no swap on top of the memory cap
+            'pids_limit': self.max_processes,
+            'nano_cpus': int(self.max_cpus * 1e9),
+        }
+
+def _task_count():
+    # Fourth field of /proc/loadavg is running/total scheduling entities
+    try:
+        with open('/proc/loadavg') as f:
+            return int(f.read().split()[3].split('/')[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+
+@contextlib.contextmanager
+def sandbox_uid(limits):
+    """Hold an unused uid from limits.sandbox_uids for one run, or None when
+    the backend isn't root and programs run as its own user."""
+    if os.geteuid() != 0 or not limits.sandbox_uids:
+        yield None
+        return
+    os.makedirs(UID_LOCK_DIR, mode=0o700, exist_ok=True)
+    while True:
+        for uid in limits.sandbox_uids:
+            fd = os.open(os.path.join(UID_LOCK_DIR, str(uid)), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield uid
+            finally:
+                os.close(fd)
+            return
+        # Every uid is running something; more runs than uids wait their turn
+        time.sleep(0.05)
+
+def sandbox_env(home, extra=None):
+    # Programs get a minimal environment, never the backend's API keys or database URL
+    env = {'PATH': os.environ.get('PATH', os.defpath), 'HOME': home, 'LANG': 'C.UTF-8'}
+    env.update(extra or {})
+    return env
+
+def _give(paths, uid):
+    # Hand the run's files to its uid; toolchains and cache entries only need to be readable
+    for path in paths:
+        os.chown(path, uid, uid)
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                os.chown(os.path.join(root, name), uid, uid, follow_symlinks=False)
+
+def _complete_prefix(data):
+    # Length of `data` without a trailing, incomplete UTF-8 character
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 != 0x80:
+            size = 1 if byte < 0x80 else 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) - back if size > back else len(data)
+    return len(data)
+
+def _continuation_prefix(data):
+    # Number of leading bytes that belong to a character cut off before `data`
+    count = 0
+    while count < min(3, len(data)) and data[count] & 0xC0 == 0x80:
+        count += 1
+    return count
+
+class OutputBuffer:
+    """Bounded capture of one output stream.
+
+    The first half of `limit` bytes is kept as it arrives, and passed on to
+    `on_text` for streaming; past that only the most recent half is kept, in
+    a ring buffer. The marker left between the two counts exactly how many
+    bytes were dropped, so a program printing in a loop costs `limit` bytes
+    of memory however long it runs.
+    """
+
+    def __init__(self, limit, on_text=None):
+        self.head = bytearray()
+        self.head_limit = limit - limit // 2
+        self.ring = bytearray(limit // 2)
+        self.ring_end = 0  # where the next byte goes
+        self.ring_used = 0
+        self.total = 0
+        self.on_text = on_text
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            if self.on_text:
+                text = self.decoder.decode(data[:room])
+                if text:
+                    self.on_text(text)
+            data = data[room:]
+        if data and self.ring:
+            self._ring_write(data)
+
+    def _ring_write(self, data):
+        size = len(self.ring)
+        if len(data) >= size:
+            self.ring[:] = data[-size:]
+            self.ring_end, self.ring_used = 0, size
+            return
+        end = self.ring_end + len(data)
+        if end <= size:
+            self.ring[self.ring_end:end] = data
+        else:
+            split = size - self.ring_end
+            self.ring[self.ring_end:] = data[:split]
+            self.ring[:end - size] = data[split:]
+        self.ring_end = end % size
+        self.ring_used = min(size, self.ring_used + len(data))
+
+    def tail(self):
+        if self.ring_used < len(self.ring):
+            return bytes(self.ring[:self.ring_used])
+        return bytes(self.ring[self.ring_end:] + self.ring[:self.ring_end])
+
+    @property
+    def truncated(self):
+        return self.total > len(self.head) + self.ring_used
+
+    def text(self):
+        head, tail = bytes(self.head), self.tail()
+        if not self.truncated:
+            return (head + tail).decode(errors='replace')
+        # Both sides are cut on character boundaries; the marker counts the
+        # bytes of any character split by the cut as omitted too
+        head = head[:_complete_prefix(head)]
+        tail = tail[_continuation_prefix(tail):]
+        omitted = self.total - len(head) - len(tail)
+        return (f"{head.decode(errors='replace')}\n[... {omitted} bytes omitted ...]\n"
+                f"{tail.decode(errors='replace')}")
+
+def _drain(stream, output):
+    with stream:
+        for chunk in iter(lambda: stream.read1(READ_SIZE), b''):
+            output.write(chunk)
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def stream_writer(on_output, name):
+    if on_output is None:
+        return None
+    return lambda text: on_output(name, text)
+
+def _feed(stream, data):
+    # A program that exits without reading all of its input closes the pipe early
+    try:
+        with stream:
+            stream.write(data)
+    except BrokenPipeError:
+        pass
+
+def run_limited(cmd, limits, cwd=None, on_output=None, stdin=None, env=None, files=()):
+    """Run `cmd` under `limits` and report what it used.
+
+    `stdin` (text or bytes) is fed to the program's standard input. The
+    program sees only the variables of sandbox_env() plus `env`. When it runs
+    as a sandbox uid, `cwd` and `files` are handed to that uid first.
+
+    on_output(stream, text) is called from reader threads with output as it
+    arrives, up to the part of each stream that is kept in full.
+
+    Returns a dict with returncode, stdout, stderr, timed_out, cpu_limited,
+    truncated, wall_time, cpu_time (user + system seconds) and peak_rss_kb.
+    """
+    if shutil.which(cmd[0]) is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), cmd[0])
+
+    with sandbox_uid(limits) as uid:
+        if uid is not None:
+            _give(([cwd] if cwd else []) + list(files), uid)
+        return _run_limited(cmd, limits, cwd, on_output, stdin, sandbox_env(cwd or tempfile.gettempdir(), env), uid)
+
+def _run_limited(cmd, limits, cwd, on_output, stdin, env, uid):
+    stdout = OutputBuffer(limits.max_output, stream_writer(on_output, 'stdout'))
+    stderr = OutputBuffer(limits.max_output, stream_writer(on_output, 'stderr'))
+    report_read, report_write = os.pipe()
+    started = time.monotonic()
+    try:
+        process = subprocess.Popen(
+            [sys.executable, '-I', '-S', LAUNCHER, str(report_write), str(limits.timeout),
+             json.dumps(limits.rlimits(uid)), str(uid if uid is not None else -1), '--'] + list(cmd),
+            cwd=cwd, env=env, stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(report_write,), start_new_session=True
+        )
+    finally:
+        os.close(report_write)
+
+    pipes = [
+        threading.Thread(target=_drain, args=(process.stdout, stdout), daemon=True),
+        threading.Thread(target=_drain, args=(process.stderr, stderr), daemon=True),
+    ]
+    if stdin is not None:
+        data = stdin.encode() if isinstance(stdin, str) else stdin
+        pipes.append(threading.Thread(target=_feed, args=(process.stdin, data), daemon=True))
+    for pipe in pipes:
+        pipe.start()
+    try:
+        # The launcher enforces the timeout; this only catches a launcher that hangs
+        process.wait(timeout=limits.timeout + LAUNCHER_GRACE)
+    except subprocess.TimeoutExpired:
+        _kill_group(process.pid)
+        process.wait()
+    for pipe in pipes:
+        pipe.join()
+
+    with os.fdopen(report_read) as f:
+        report = json.loads(f.read() or 'null')
+    if report is None:
+        raise RuntimeError(f"Execution launcher failed: {stderr.text().strip() or process.returncode}")
+
+    return {
+        "returncode": report["returncode"],
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "timed_out": report["timed_out"],
+        "cpu_limited": report["returncode"] == -signal.SIGXCPU
+                       or (report["returncode"] == -signal.SIGKILL and report["cpu_time"] >= limits.max_cpu_time),
+        "truncated": stdout.truncated or stderr.truncated,
+        "wall_time": round(time.monotonic() - started, 3),
+        "cpu_time": round(report["cpu_time"], 3),
+        "peak_rss_kb": report["peak_rss_kb"],
+    }
+
+_TIMES_PATTERN = re.compile(r'(\d+)m([\d.]+)s')
+
+def parse_times(output):
+    """CPU seconds used by a shell's children, from the output of `times`."""
+    lines = output.strip().split('\n')
+    if len(lines) < 2:
+        return None
+    values = _TIMES_PATTERN.findall(lines[-1])
+    if len(values) != 2:
+        return None
+    return round(sum(int(minutes) * 60 + float(seconds) for minutes, seconds in values), 3)
@@ -0,0 +1,32 @@
+# Gunicorn settings for the async serving mode (asgi:application)
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = "uvicorn_worker.TunedUvicornWorker"
+
+# Concurrency comes from async I/O, not processes. One worker by default: the
+# warm sandbox pool and the rate limiter's fair queues live in each process,
+# so every extra worker starts its own sandbox containers and queues requests
+# on its own. Raise WEB_CONCURRENCY when that trade is worth it.
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Each worker writes its metrics to METRICS_DIR and /metrics sums them, so a
+# scrape covers every worker whichever one answers it (see common/metrics.py).
+# Without a directory configured, each server run gets a fresh one.
+if not os.getenv('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='intelligent-ide-metrics-')
+
+    def on_exit(server):
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+# GPT-4 responses can take close to a minute, so don't kill workers that are waiting on one
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+
+# Recycle workers periodically to bound memory growth
+max_requests = 10000
+max_requests_jitter = 1000
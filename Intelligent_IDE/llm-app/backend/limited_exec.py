@@ -0,0 +1,90 @@
+"""Runs one program under resource limits and reports what it used.
+
+    python -I -S limited_exec.py REPORT_FD TIMEOUT RLIMITS_JSON UID -- cmd...
+
+Started by execution_limits.run_limited. The program is forked from a shell
+rather than from the backend or this interpreter, because Linux counts the
+RSS a process had before exec in its ru_maxrss; this process adopts it as a
+child subreaper so wait4 still sees its usage. With a UID other than -1
+the launcher drops to that uid before starting the program. The program gets
+this process's environment, the minimal one run_limited started it with. The
+report is one JSON object written to REPORT_FD.
+"""
+import ctypes
+import json
+import os
+import resource
+import signal
+import sys
+
+PR_SET_CHILD_SUBREAPER = 36
+
+def kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def main():
+    report_fd, timeout, limits = int(sys.argv[1]), float(sys.argv[2]), json.loads(sys.argv[3])
+    uid = int(sys.argv[4])
+    argv = sys.argv[sys.argv.index('--') + 1:]
+    os.set_inheritable(report_fd, False)
+
+    for kind, soft, hard in limits:
+        resource.setrlimit(kind, (soft, hard))
+    if uid != -1:
+        # Group first: after setuid there is no privilege left to change it
+        os.setgroups([])
+        os.setgid(uid)
+        os.setuid(uid)
+    ctypes.CDLL(None).prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0)
+
+    pid_read, pid_write = os.pipe()
+    os.set_inheritable(pid_write, True)
+    # Background jobs get /dev/null as stdin unless it is redirected explicitly
+    script = f'exec 3<&0; "$@" <&3 3<&- & echo $! >&{pid_write}'
+    shell = os.posix_spawn('/bin/sh', ['sh', '-c', script, 'sh'] + argv, os.environ, setpgroup=0)
+    os.close(pid_write)
+    os.waitpid(shell, 0)
+    program = int(os.read(pid_read, 32))
+
+    timed_out = []
+
+    def expire(signum, frame):
+        timed_out.append(True)
+        kill_group(shell)
+
+    signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    _, status, usage = os.wait4(program, 0)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    # Anything the program left running in the background goes with it
+    kill_group(shell)
+
+    report = {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": bool(timed_out),
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": usage.ru_maxrss,
+    }
+    os.write(report_fd, json.dumps(report).encode())
+
+    if uid != -1:
+        # Including processes that left the group with setsid: everything else
+        # running as the uid is the program's, and the uid is about to be reused.
+        # The killed processes end up as this subreaper's children; until they
+        # are reaped they still count against the next run's RLIMIT_NPROC
+        try:
+            os.kill(-1, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        try:
+            while True:
+                os.waitpid(-1, 0)
+        except ChildProcessError:
+            pass
+
+if __name__ == '__main__':
+    main()
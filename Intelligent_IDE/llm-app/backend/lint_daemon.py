@@ -0,0 +1,51 @@
+"""Persistent pylint worker used by linting.PylintDaemon.
+
+Reads one JSON request per line on stdin, {"paths": [...], "disable": [...]},
+and answers each with one JSON line of messages grouped by path. Importing
+pylint and astroid dominates a one-off pylint run, so it is paid once here.
+"""
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+import astroid
+from pylint.lint import Run
+from pylint.reporters import CollectingReporter
+
+def lint(paths, disable):
+    reporter = CollectingReporter()
+    args = ['--score=n', '--persistent=n']
+    if disable:
+        args.append(f"--disable={','.join(disable)}")
+    # stdout carries the protocol; anything pylint prints goes to stderr
+    with redirect_stdout(sys.stderr):
+        Run(args + paths, reporter=reporter, exit=False)
+
+    # Request files are temporary; don't let astroid keep their ASTs around
+    for path in paths:
+        astroid.MANAGER.astroid_cache.pop(os.path.splitext(os.path.basename(path))[0], None)
+
+    results = {path: [] for path in paths}
+    for message in reporter.messages:
+        results.setdefault(os.path.abspath(message.abspath), []).append({
+            "line": message.line,
+            "column": message.column,
+            "code": message.symbol,
+            "message": message.msg,
+            "severity": message.category,
+        })
+    return results
+
+def main():
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            response = {"results": lint(request["paths"], request.get("disable", []))}
+        except Exception as e:
+            response = {"error": str(e)}
+        sys.stdout.write(json.dumps(response) + '\n')
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+class LintError(Exception):
+    pass
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lint_daemon.py')
+
+# Messages that depend on the whole module; regions are linted without their
+# siblings, so these are re-checked against the full file before reporting
+UNUSED_IMPORT_CODES = {'unused-import', 'F401'}
+UNDEFINED_NAME_CODES = {'undefined-variable', 'F821'}
+# Messages about the module as a whole, which every unit would repeat at its first line
+MODULE_SCOPE_CODES = {'missing-module-docstring', 'D100'}
+
+ESLINT_CONFIG = {
+    "root": True,
+    "extends": "eslint:recommended",
+    "env": {"es2021": True, "node": True, "browser": True},
+    "parserOptions": {"ecmaVersion": "latest", "sourceType": "module"},
+}
+
+class PylintDaemon:
+    """Keeps one pylint process alive across requests (see lint_daemon.py)."""
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self.process is None or self.process.poll() is not None:
+            # The daemon exits on its own once the backend closes its stdin
+            self.process = subprocess.Popen(
+                [sys.executable, DAEMON_SCRIPT],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, bufsize=1
+            )
+
+    def __call__(self, paths, work_dir):
+        with self.lock:
+            self._ensure_started()
+            self.process.stdin.write(json.dumps({"paths": paths}) + '\n')
+            self.process.stdin.flush()
+            readable, _, _ = select.select([self.process.stdout], [], [], self.timeout)
+            if not readable:
+                # A hung daemon would block every later request; start over next time
+                self.close()
+                raise LintError(f"pylint did not answer within {self.timeout} seconds")
+            line = self.process.stdout.readline()
+        if not line:
+            raise LintError("pylint daemon exited")
+        response = json.loads(line)
+        if "error" in response:
+            raise LintError(response["error"])
+        return response["results"]
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+def _run_tool(cmd, work_dir, timeout):
+    try:
+        return subprocess.run(cmd, cwd=work_dir, capture_output=True, text=True, timeout=timeout)
+    except FileNotFoundError:
+        raise LintError(f"{cmd[0]} is not installed")
+    except subprocess.TimeoutExpired:
+        raise LintError(f"{cmd[0]} did not finish within {timeout} seconds")
+
+def run_ruff(paths, work_dir, timeout=30):
+    result = _run_tool(['ruff', 'check', '--isolated', '--output-format', 'json', '--no-cache', '--exit-zero'] + paths, work_dir, timeout)
+    if result.returncode != 0:
+        raise LintError(result.stderr.strip())
+    results = {path: [] for path in paths}
+    for item in json.loads(result.stdout or '[]'):
+        results.setdefault(os.path.abspath(item['filename']), []).append({
+            "line": item['location']['row'],
+            "column": item['location']['column'],
+            "code": item['code'] or 'syntax-error',
+            "message": item['message'],
+            "severity": 'error' if not item['code'] or item['code'].startswith(('E9', 'F8')) else 'warning',
+        })
+    return results
+
+def run_eslint(paths, work_dir, timeout=30):
+    config = os.path.join(work_dir, '.eslintrc.json')
+    with open(config, 'w') as f:
+        json.dump(ESLINT_CONFIG, f)
+    # eslint_d keeps eslint resident between runs, like PylintDaemon does for pylint
+    eslint = ['eslint_d'] if shutil.which('eslint_d') else ['npx', '--no-install', 'eslint']
+    result = _run_tool(eslint + ['--no-eslintrc', '-c', config, '--format', 'json'] + paths, work_dir, timeout)
+    if result.returncode not in (0, 1):
+        raise LintError(result.stderr.strip() or result.stdout.strip())
+    results = {path: [] for path in paths}
+    for item in json.loads(result.stdout or '[]'):
+        results[os.path.abspath(item['filePath'])] = [
+            {
+                "line": message.get('line', 1),
+                "column": message.get('column', 0),
+                "code": message.get('ruleId') or 'syntax-error',
+                "message": message['message'],
+                "severity": 'error' if message.get('severity') == 2 else 'warning',
+            }
+            for message in item['messages']
+        ]
+    return results
+
+def run_gcc(paths, work_dir, timeout=30):
+    results = {}
+    for path in paths:
+        result = _run_tool(
+            ['g++', '-std=c++17', '-fsyntax-only', '-Wall', '-Wextra', '-fdiagnostics-format=json', path],
+            work_dir, timeout
+        )
+        results[path] = [
+            {
+                "line": diagnostic['locations'][0]['caret']['line'],
+                "column": diagnostic['locations'][0]['caret']['column'],
+                "code": diagnostic.get('option') or diagnostic['kind'],
+                "message": diagnostic['message'],
+                "severity": 'error' if diagnostic['kind'] == 'error' else 'warning',
+            }
+            for diagnostic in json.loads(result.stderr or '[]')
+            if diagnostic.get('locations')
+        ]
+    return results
+
+FILE_EXTENSIONS = {'python': '.py', 'javascript': '.js', 'cpp': '.cpp'}
+
+def _names(tree):
+    # Names bound at module level, every name referenced anywhere, and the
+    # lines of module-level imports
+    defined, used, import_lines = set(), set(), set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            defined.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+            import_lines.update(range(node.lineno, node.end_lineno + 1))
+        else:
+            defined.update(n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            used.add(node.id)
+    return defined, used, import_lines
+
+def split_python(code):
+    """Split a module into its top-level statements (the header) and one
+    region per top-level function or class.
+
+    Returns (header, header_lines, regions, tree) where header_lines maps
+    header line numbers back to the original and each region is
+    (first_line, source). Returns None when the code doesn't parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    lines = code.split('\n')
+    header, header_lines, regions = [], [], []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            regions.append((start, '\n'.join(lines[start - 1:node.end_lineno])))
+        else:
+            header.extend(lines[node.lineno - 1:node.end_lineno])
+            header_lines.extend(range(node.lineno, node.end_lineno + 1))
+    return '\n'.join(header), header_lines, regions, tree
+
+def _digest(*parts):
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+class CodeLinter:
+    """Runs the configured linter for a language, caching results by content.
+
+    Python is linted a top-level function or class at a time, each together
+    with the module's top-level statements, and cached by a hash of both; an
+    edit only re-lints the regions it touched. Other languages are cached per
+    file.
+    """
+
+    def __init__(self, cache, linters, ttl=86400):
+        self.cache = cache
+        self.linters = linters  # language -> (linter name, callable(paths, work_dir))
+        self.ttl = ttl
+
+    def supports(self, language):
+        return language in self.linters
+
+    def lint(self, code, language):
+        if language not in self.linters:
+            raise LintError(f"Linting is not supported for {language}")
+        name, run = self.linters[language]
+        file_key = _digest('file', name, language, code)
+        cached = self.cache.get(file_key)
+        if cached is not None:
+            return cached
+
+        split = split_python(code) if language == 'python' else None
+        if split is None:
+            # Whole-file unit: other languages, or Python that doesn't parse
+            messages = self._lint_units(name, run, language, {file_key: code})[file_key]
+        else:
+            messages = self._lint_regions(name, run, split)
+
+        messages.sort(key=lambda m: (m["line"], m["column"]))
+        self.cache.set(file_key, messages, self.ttl)
+        return messages
+
+    def _lint_units(self, name, run, language, units):
+        # Lint several sources in one linter invocation; returns key -> messages
+        with tempfile.TemporaryDirectory(prefix='lint-') as work_dir:
+            paths = {}
+            for i, (key, source) in enumerate(units.items()):
+                path = os.path.join(work_dir, f'unit_{i}{FILE_EXTENSIONS[language]}')
+                with open(path, 'w') as f:
+                    f.write(source + '\n')
+                paths[key] = path
+            results = run(list(paths.values()), work_dir)
+        return {key: results.get(path, []) for key, path in paths.items()}
+
+    def _lint_regions(self, name, run, split):
+        header, header_lines, regions, tree = split
+        header_key = _digest('header', name, header)
+        # Region messages are stored relative to the region, so moving a
+        # function without changing it still hits the cache
+        region_keys = [_digest('region', name, header, source) for _, source in regions]
+
+        cached = {key: self.cache.get(key) for key in [header_key] + region_keys}
+        if not header:
+            cached[header_key] = []
+        units = {}
+        if cached[header_key] is None:
+            units[header_key] = header
+        for key, (_, source) in zip(region_keys, regions):
+            if cached[key] is None:
+                units[key] = header + '\n' + source if header else source
+        if units:
+            offset = header.count('\n') + 1 if header else 0
+            for key, unit_messages in self._lint_units(name, run, 'python', units).items():
+                if key != header_key:
+                    # Messages about the header copy belong to the header unit
+                    unit_messages = [dict(m, line=m["line"] - offset) for m in unit_messages if m["line"] > offset]
+                cached[key] = unit_messages
+                self.cache.set(key, unit_messages, self.ttl)
+
+        messages = [dict(m, line=header_lines[m["line"] - 1]) for m in cached[header_key]
+                    if 0 < m["line"] <= len(header_lines)]
+        for index, ((start, _), key) in enumerate(zip(regions, region_keys)):
+            # Module-wide messages come from the header unit, or from the first
+            # region when there is no header; other regions would only repeat them
+            module_scope = not header and index == 0
+            messages.extend(
+                dict(m, line=start + m["line"] - 1) for m in cached[key]
+                if module_scope or m["code"] not in MODULE_SCOPE_CODES
+            )
+        return self._drop_cross_region(messages, tree)
+
+    def _drop_cross_region(self, messages, tree):
+        defined, used, import_lines = _names(tree)
+        kept = []
+        for message in messages:
+            words = set(re.findall(r'[A-Za-z_][\w.]*', message["message"]))
+            names = {word.split('.')[0] for word in words}
+            # Only module-level imports can be used by another region; an unused
+            # import inside a function is reported whatever other regions use
+            if message["code"] in UNUSED_IMPORT_CODES and message["line"] in import_lines and names & used:
+                continue
+            if message["code"] in UNDEFINED_NAME_CODES and names & defined:
+                continue
+            kept.append(message)
+        return kept
+
+def create_linter(cache, settings):
+    settings = settings or {}
+    timeout = settings.get('timeout', 30)
+    python = settings.get('python', 'pylint')
+    if python == 'ruff':
+        python_linter = ('ruff', lambda paths, work_dir: run_ruff(paths, work_dir, timeout))
+    else:
+        python_linter = ('pylint', PylintDaemon(timeout))
+    linters = {
+        'python': python_linter,
+        'javascript': ('eslint', lambda paths, work_dir: run_eslint(paths, work_dir, timeout)),
+        'cpp': ('g++', lambda paths, work_dir: run_gcc(paths, work_dir, timeout)),
+    }
+    return CodeLinter(cache, linters, settings.get('cache_ttl', 86400))
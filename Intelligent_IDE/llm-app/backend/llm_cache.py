@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryBackend:
+    """Process-local LRU store of cached responses."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class PostgresBackend:
+    """Cache shared by every backend process, stored in the compose `db` service."""
+
+    def __init__(self, dsn, max_entries=10000):
+        self.dsn = dsn
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+        self.writes = 0
+        with self.lock, self.conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at DOUBLE PRECISION NOT NULL,
+                    last_used DOUBLE PRECISION NOT NULL
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS llm_response_cache_last_used ON llm_response_cache (last_used)")
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def _cursor(self):
+        # Called with self.lock held
+        if self.conn.closed:
+            # The connection was lost with an earlier error; start a new one
+            self.conn = self._connect()
+        return self.conn.cursor()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self._cursor() as cur:
+            cur.execute(
+                "UPDATE llm_response_cache SET last_used = %s WHERE key = %s AND expires_at >= %s RETURNING value",
+                (now, key, now)
+            )
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock, self._cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO llm_response_cache (key, value, expires_at, last_used) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value,
+                    expires_at = EXCLUDED.expires_at, last_used = EXCLUDED.last_used
+                """,
+                (key, value, now + ttl, now)
+            )
+            self.writes += 1
+            # Trim expired and least recently used rows every so often rather than on every write
+            if self.writes % 100 == 0:
+                cur.execute("DELETE FROM llm_response_cache WHERE expires_at < %s", (now,))
+                cur.execute(
+                    """
+                    DELETE FROM llm_response_cache WHERE key IN (
+                        SELECT key FROM llm_response_cache ORDER BY last_used DESC OFFSET %s
+                    )
+                    """,
+                    (self.max_entries,)
+                )
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResponseCache:
+    """TTL cache for LLM responses that also coalesces identical in-flight requests.
+
+    A failing backend is treated as a miss, so a database outage costs cache
+    hits rather than failing the request.
+    """
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.in_flight = {}
+        self.async_in_flight = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model, messages, language, max_tokens=None):
+        # An answer cut short by a small max_tokens mustn't be served for a larger one
+        payload = json.dumps(
+            {"model": model, "messages": messages, "language": language, "max_tokens": max_tokens},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"Response cache lookup failed: {e}")
+            return None
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+
+    def get_or_call(self, key, call):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            pending = self.in_flight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self.in_flight[key] = _InFlight()
+
+        if not leader:
+            # Someone else is already asking upstream; share their answer
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = call()
+            self.set(key, pending.value)
+            return pending.value
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            pending.done.set()
+
+    async def aget_or_call(self, key, call):
+        # Event-loop flavour of get_or_call; `call` is a coroutine function and
+        # backend I/O runs off the loop so a Postgres round trip never blocks it
+        value = await asyncio.to_thread(self.get, key)
+        if value is not None:
+            return value
+
+        pending = self.async_in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        pending = self.async_in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await call()
+            await asyncio.to_thread(self.set, key, value)
+            pending.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            pending.exception()
+            raise
+        finally:
+            del self.async_in_flight[key]
+
+def create_response_cache(settings, database_url=None):
+    settings = settings or {}
+    max_entries = settings.get('max_entries', 1000)
+    if settings.get('backend') == 'postgres' and database_url:
+        try:
+            backend = PostgresBackend(database_url, max_entries)
+        except Exception as e:
+            print(f"Postgres response cache unavailable ({e}), using in-memory cache")
+            backend = MemoryBackend(max_entries)
+    else:
+        backend = MemoryBackend(max_entries)
+    return ResponseCache(backend, settings.get('ttl', 3600))
@@ -0,0 +1,92 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Point the backend at it with OPENAI_API_BASE=http://localhost:8080/v1 to
+exercise caching and request coalescing without network access or API spend.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify
+
+app = Flask(__name__)
+
+LATENCY = float(os.getenv('OPENAI_STUB_LATENCY', '0.5'))
+# Optional size-dependent delay per prompt token, and per answer token with
+# answers assumed to use half of max_tokens; models prefill and decode time
+TOKEN_LATENCY = float(os.getenv('OPENAI_STUB_TOKEN_LATENCY', '0'))
+
+calls = {"total": 0}
+calls_lock = threading.Lock()
+
+BUG_REPORT = [
+    {
+        "type": "bug",
+        "line": 1,
+        "description": "Stubbed issue",
+        "originalCode": "",
+        "fixCode": ""
+    }
+]
+
+def completion_for(messages):
+    # Shape the canned answer after what each backend prompt asks for
+    system = messages[0]["content"] if messages else ""
+    if "code reviewer" in system:
+        return json.dumps(BUG_REPORT, indent=2)
+    if "tester" in system:
+        return "def test_stub():\n    assert True\n"
+    return "```\nprint('generated by stub')\n```"
+
+def stream_completion(content, model):
+    # Spread the configured latency over a handful of small chunks
+    pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+    for piece in pieces:
+        time.sleep(LATENCY / max(len(pieces), 1))
+        chunk = {
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    data = request.json
+    with calls_lock:
+        calls["total"] += 1
+
+    content = completion_for(data.get("messages", []))
+    if data.get("stream"):
+        return Response(stream_completion(content, data.get("model", "gpt-4")), mimetype='text/event-stream')
+
+    prompt_tokens = sum(len(m["content"]) for m in data.get("messages", [])) // 4
+    time.sleep(LATENCY + TOKEN_LATENCY * (prompt_tokens + data.get("max_tokens", 0) / 2))
+    completion_tokens = len(content) // 4
+    return jsonify({
+        "id": f"chatcmpl-stub-{calls['total']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": data.get("model", "gpt-4"),
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    })
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(calls)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
@@ -0,0 +1,253 @@
+import collections
+import fnmatch
+import os
+import threading
+import time
+import uuid
+
+DIRECTORY = 'directory'
+FILE = 'file'
+
+class DirectoryNode:
+    __slots__ = ('entries', 'mtime_ns', 'version', 'listing')
+
+    def __init__(self, entries, mtime_ns, version):
+        self.entries = entries  # name -> DIRECTORY or FILE
+        self.mtime_ns = mtime_ns
+        self.version = version  # index version at which the entries last changed
+        self.listing = None  # sorted entries, built when first listed
+
+    def sorted_entries(self):
+        if self.listing is None:
+            self.listing = sorted(self.entries.items(), key=lambda item: (item[1] != DIRECTORY, item[0].lower(), item[0]))
+        return self.listing
+
+class ProjectIndex:
+    """In-memory tree of a project directory, kept current as files change.
+
+    The tree is scanned once; afterwards only directories reported as changed
+    are rescanned, by watchdog (inotify on Linux) when it is installed and by
+    polling directory mtimes otherwise. Every change bumps the index version
+    and stamps the changed directory with it (and its parent, whose listing
+    counts the directory's entries), so a directory's listing can be
+    served with an ETag and a client can ask which directories changed since
+    the version it last saw.
+    """
+
+    def __init__(self, root, ignore=(), poll_interval=2, change_log=1000):
+        self.root = os.path.abspath(root)
+        self.ignore = tuple(ignore)
+        self.poll_interval = poll_interval
+        # Distinguishes this build's versions from those of an earlier process
+        self.id = uuid.uuid4().hex[:8]
+        self.dirs = {}  # relative path ('' for the root) -> DirectoryNode
+        self.version = 0
+        self.changes = collections.deque(maxlen=change_log)  # (version, relative path)
+        self.log_start = 0  # the change log is complete for versions after this one
+        self.lock = threading.RLock()
+        self.ready = threading.Event()
+        self.watching = None
+
+    def start(self):
+        self.build()
+        self.watch()
+
+    def build(self):
+        started = time.monotonic()
+        with self.lock:
+            self.version += 1
+            self.dirs = {}
+            self._scan_tree('')
+            self.log_start = self.version
+        self.ready.set()
+        files = sum(list(node.entries.values()).count(FILE) for node in self.dirs.values())
+        print(f"Indexed {len(self.dirs)} directories and {files} files under {self.root} "
+              f"in {time.monotonic() - started:.2f}s")
+
+    def watch(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            Observer = None
+        if Observer is not None:
+            index = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    index.on_event(event)
+
+            observer = Observer()
+            observer.daemon = True
+            try:
+                observer.schedule(Handler(), self.root, recursive=True)
+                observer.start()
+                self.watching = 'watchdog'
+                return
+            except OSError as e:
+                # e.g. the inotify watch limit is too low for the tree
+                print(f"Watching {self.root} failed ({e}), polling for changes instead")
+        self.watching = 'polling'
+        threading.Thread(target=self._poll_forever, daemon=True).start()
+
+    def on_event(self, event):
+        if event.event_type == 'modified' and not event.is_directory:
+            return  # the tree only holds names and types
+        if event.event_type == 'modified':
+            self.refresh(self._relative(event.src_path))
+            return
+        for path in (event.src_path, getattr(event, 'dest_path', None)):
+            if path:
+                self.refresh(self._relative(os.path.dirname(path)))
+
+    def _poll_forever(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.poll()
+
+    def poll(self):
+        # Adding, removing or renaming an entry changes its directory's mtime
+        with self.lock:
+            nodes = list(self.dirs.items())
+        for rel, node in nodes:
+            try:
+                mtime_ns = os.stat(self._absolute(rel)).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != node.mtime_ns:
+                self.refresh(rel)
+
+    def refresh(self, rel):
+        """Rescan one directory and update the tree where its entries changed."""
+        if rel is None:
+            return
+        with self.lock:
+            node = self.dirs.get(rel)
+            if node is None:
+                # Not indexed (yet): let the closest indexed ancestor pick it up
+                if rel:
+                    self.refresh(rel.rpartition('/')[0])
+                return
+            try:
+                entries, mtime_ns = self._scan(rel)
+            except (FileNotFoundError, NotADirectoryError):
+                if rel:
+                    self.refresh(rel.rpartition('/')[0])
+                return
+            node.mtime_ns = mtime_ns
+            if entries == node.entries:
+                return
+            self.version += 1
+            for name, kind in node.entries.items():
+                if kind == DIRECTORY and entries.get(name) != DIRECTORY:
+                    self._drop(self._join(rel, name))
+            for name, kind in entries.items():
+                if kind == DIRECTORY and node.entries.get(name) != DIRECTORY:
+                    self._scan_tree(self._join(rel, name))
+            resized = len(entries) != len(node.entries)
+            node.entries = entries
+            node.listing = None
+            node.version = self.version
+            self._record(rel)
+            parent = rel.rpartition('/')[0]
+            if rel and resized and parent in self.dirs:
+                # The parent's listing embeds this directory's entry count
+                self.dirs[parent].version = self.version
+                self._record(parent)
+
+    def _scan_tree(self, rel):
+        pending = [rel]
+        while pending:
+            rel = pending.pop()
+            try:
+                entries, mtime_ns = self._scan(rel)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            self.dirs[rel] = DirectoryNode(entries, mtime_ns, self.version)
+            pending.extend(self._join(rel, name) for name, kind in entries.items() if kind == DIRECTORY)
+
+    def _scan(self, rel):
+        path = self._absolute(rel)
+        entries = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                if self._ignored(entry.name):
+                    continue
+                try:
+                    # Symlinked directories are listed as files so links can't loop the tree
+                    entries[entry.name] = DIRECTORY if entry.is_dir(follow_symlinks=False) else FILE
+                except OSError:
+                    continue
+        return entries, os.stat(path).st_mtime_ns
+
+    def _drop(self, rel):
+        node = self.dirs.pop(rel, None)
+        if node is None:
+            return
+        for name, kind in node.entries.items():
+            if kind == DIRECTORY:
+                self._drop(self._join(rel, name))
+
+    def _record(self, rel):
+        if len(self.changes) == self.changes.maxlen:
+            self.log_start = self.changes[0][0]
+        self.changes.append((self.version, rel))
+
+    def _ignored(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    def _relative(self, path):
+        rel = os.path.relpath(path, self.root)
+        if rel == '.':
+            return ''
+        if rel.startswith('..') or any(self._ignored(part) for part in rel.split(os.sep)):
+            return None
+        return rel.replace(os.sep, '/')
+
+    def _absolute(self, rel):
+        return os.path.join(self.root, *rel.split('/')) if rel else self.root
+
+    @staticmethod
+    def _join(rel, name):
+        return f'{rel}/{name}' if rel else name
+
+    def etag(self, node):
+        return f'{self.id}-{node.version}'
+
+    def list(self, rel, offset=0, limit=200):
+        """One page of a directory's entries, directories first; a limit of
+        None lists every entry from `offset` on.
+
+        Returns (node, total entries, page) and raises KeyError for a path
+        that isn't an indexed directory.
+        """
+        rel = rel.strip('/')
+        with self.lock:
+            node = self.dirs[rel]
+            listing = node.sorted_entries()
+            page = []
+            for name, kind in listing[offset:None if limit is None else offset + limit]:
+                path = self._join(rel, name)
+                entry = {"name": name, "path": path, "type": kind}
+                if kind == DIRECTORY:
+                    child = self.dirs.get(path)
+                    entry["children"] = len(child.entries) if child else 0
+                page.append(entry)
+            return node, len(listing), page
+
+    def changed_since(self, version):
+        """Directories whose entries changed after `version`, or None when the
+        change log no longer reaches back that far and the client must reload."""
+        with self.lock:
+            if version < self.log_start:
+                return None
+            return sorted({rel for changed, rel in self.changes if changed > version})
+
+def create_project_index(settings):
+    settings = settings or {}
+    return ProjectIndex(
+        settings.get('root') or os.getcwd(),
+        ignore=settings.get('ignore', []),
+        poll_interval=settings.get('poll_interval', 2),
+        change_log=settings.get('change_log', 1000),
+    )
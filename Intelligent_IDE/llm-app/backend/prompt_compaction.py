@@ -0,0 +1,176 @@
+import ast
+import io
+import re
+import tokenize
+
+# Rough BPE approximation when tiktoken isn't installed: identifiers split
+# into ~4 character pieces, every symbol is its own token
+_TOKEN_PATTERN = re.compile(r'\w{1,4}|[^\w\s]|\n')
+
+_encoder = None
+
+def estimate_tokens(text):
+    """Approximate GPT-4 token count; exact when tiktoken is installed."""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.encoding_for_model('gpt-4')
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return len(_TOKEN_PATTERN.findall(text))
+
+def response_budget(input_tokens, ratio, floor=256, ceiling=2000):
+    """max_tokens for a request whose answer scales with the input size."""
+    return int(min(ceiling, max(floor, input_tokens * ratio)))
+
+def _strip_python_comments(code):
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+        tree = ast.parse(code)
+    except (tokenize.TokenError, SyntaxError):
+        return code
+    lines = code.split('\n')
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            row, col = token.start
+            lines[row - 1] = lines[row - 1][:col]
+
+    # Docstrings become `...` followed by blank lines: still valid Python, same line count
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.body:
+            first = node.body[0]
+            if (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+                    and isinstance(first.value.value, str)):
+                indent = lines[first.lineno - 1][:first.col_offset]
+                lines[first.lineno - 1] = indent + '...'
+                for row in range(first.lineno, first.end_lineno):
+                    lines[row] = ''
+    return '\n'.join(lines)
+
+def _strip_c_comments(code):
+    # // and /* */ comments, skipping string, char and template literals;
+    # newlines inside block comments are kept so line numbers don't move
+    out = []
+    i, n = 0, len(code)
+    quote = None
+    while i < n:
+        ch = code[i]
+        if quote:
+            out.append(ch)
+            if ch == '\\' and i + 1 < n:
+                out.append(code[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+        elif ch in '"\'`':
+            quote = ch
+            out.append(ch)
+        elif code.startswith('//', i):
+            end = code.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        elif code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            out.append('\n' * code.count('\n', i, end))
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return ''.join(out)
+
+def compact_code(code, language):
+    """Drop comments, docstrings and trailing whitespace while keeping every line in place,
+    so line numbers reported against the compacted code still match."""
+    if language == 'python':
+        code = _strip_python_comments(code)
+    elif language in ('javascript', 'typescript', 'java', 'csharp', 'cpp'):
+        code = _strip_c_comments(code)
+    return '\n'.join(line.rstrip() for line in code.split('\n')).rstrip('\n')
+
+def _python_units(code):
+    # Top-level statements as (first_line, last_line), decorators included
+    tree = ast.parse(code)
+    units = []
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+        units.append((start, node.end_lineno))
+    return units
+
+def _brace_units(code):
+    # Top-level blocks of brace languages: a unit ends where brace depth
+    # returns to zero, or at a blank line or ';' outside any block
+    units = []
+    depth = 0
+    start = None
+    for number, line in enumerate(code.split('\n'), 1):
+        stripped = re.sub(r'"(\\.|[^"\\])*"|\'(\\.|[^\'\\])*\'', '""', line)
+        if start is None:
+            if not stripped.strip():
+                continue
+            start = number
+        depth = max(0, depth + stripped.count('{') + stripped.count('(') - stripped.count('}') - stripped.count(')'))
+        if depth == 0 and (not stripped.strip() or stripped.rstrip().endswith(('}', ';', ')'))):
+            units.append((start, number))
+            start = None
+    if start is not None:
+        units.append((start, len(code.split('\n'))))
+    return units
+
+def split_units(code, language):
+    """Split code into top-level units (functions, classes, statements) as
+    (first_line, last_line) pairs covering the non-blank parts of the file."""
+    if language == 'python':
+        try:
+            return _python_units(code)
+        except SyntaxError:
+            pass
+    return _brace_units(code)
+
+def chunk_code(code, language, max_tokens, min_tokens=None):
+    """Group consecutive units into chunks of at most `max_tokens`.
+
+    With `min_tokens`, a chunk is closed as soon as it reaches that size, so
+    functions get chunks of their own and only small neighbours are grouped.
+    Returns (first_line, text) pairs. A unit larger than the budget is split
+    at line boundaries.
+    """
+    lines = code.split('\n')
+    chunks = []
+    current_start, current_end, current_tokens = None, None, 0
+
+    def flush():
+        if current_start is not None:
+            chunks.append((current_start, '\n'.join(lines[current_start - 1:current_end])))
+
+    for start, end in split_units(code, language):
+        tokens = estimate_tokens('\n'.join(lines[start - 1:end]))
+        if current_start is not None and current_tokens + tokens > max_tokens:
+            flush()
+            current_start, current_tokens = None, 0
+        if tokens > max_tokens:
+            # Oversized unit: cut it into budget-sized runs of lines
+            piece_start, piece_tokens = start, 0
+            for number in range(start, end + 1):
+                line_tokens = estimate_tokens(lines[number - 1]) + 1
+                if piece_tokens and piece_tokens + line_tokens > max_tokens:
+                    chunks.append((piece_start, '\n'.join(lines[piece_start - 1:number - 1])))
+                    piece_start, piece_tokens = number, 0
+                piece_tokens += line_tokens
+            chunks.append((piece_start, '\n'.join(lines[piece_start - 1:end])))
+            continue
+        if current_start is None:
+            current_start = start
+        current_end = end
+        current_tokens += tokens
+        if min_tokens is not None and current_tokens >= min_tokens:
+            flush()
+            current_start, current_tokens = None, 0
+    flush()
+    return chunks or [(1, code)]
@@ -0,0 +1,277 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+# How often a queued request that isn't first in line checks again
+QUEUE_POLL_INTERVAL = 0.05
+
+class RateLimited(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimitUnavailable(Exception):
+    """The bucket store failed, so the request could be neither admitted nor refused."""
+
+class MemoryBucketStore:
+    """Token buckets for a single backend process."""
+
+    def __init__(self):
+        self.buckets = {}  # key -> (tokens, updated_at)
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, capacity, cost=1):
+        """Refill `key` at `rate` tokens per second up to `capacity` and take
+        `cost` tokens if it holds that many. Returns (taken, tokens left)."""
+        now = time.time()
+        with self.lock:
+            tokens, updated_at = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            taken = tokens >= cost
+            if taken:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+        return taken, tokens
+
+class PostgresBucketStore:
+    """Token buckets shared by every backend process, stored in the compose `db` service."""
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+        with self.lock, self.conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens DOUBLE PRECISION NOT NULL,
+                    updated_at DOUBLE PRECISION NOT NULL,
+                    taken BOOLEAN NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def take(self, key, rate, capacity, cost=1):
+        # Refill and take in one statement, so concurrent processes can't both
+        # spend the same token; SET expressions all see the row as it was
+        with self.lock:
+            if self.conn.closed:
+                # The connection was lost with an earlier error; start a new one
+                self.conn = self._connect()
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at, taken)
+                    VALUES (%(key)s, %(capacity)s - %(cost)s, %(now)s, TRUE)
+                    ON CONFLICT (key) DO UPDATE SET
+                        taken = LEAST(%(capacity)s, b.tokens + (%(now)s - b.updated_at) * %(rate)s) >= %(cost)s,
+                        tokens = LEAST(%(capacity)s, b.tokens + (%(now)s - b.updated_at) * %(rate)s)
+                            - CASE WHEN LEAST(%(capacity)s, b.tokens + (%(now)s - b.updated_at) * %(rate)s) >= %(cost)s
+                                   THEN %(cost)s ELSE 0 END,
+                        updated_at = %(now)s
+                    RETURNING taken, tokens
+                    """,
+                    {"key": key, "rate": rate, "capacity": capacity, "cost": cost, "now": time.time()}
+                )
+                taken, tokens = cur.fetchone()
+        return taken, tokens
+
+class Limit:
+    def __init__(self, name, paths, per_user, burst, total=None, total_burst=None):
+        self.name = name
+        self.paths = tuple(paths)
+        self.rate = per_user / 60
+        self.burst = burst
+        # Capacity shared by every user of the endpoint, e.g. the OpenAI quota
+        self.total_rate = total / 60 if total else None
+        self.total_burst = total_burst or burst
+
+class Ticket:
+    def __init__(self, user, limit, cost, weight):
+        self.user = user
+        self.limit = limit
+        # A request costing more than a bucket holds could never be admitted
+        self.cost = min(cost, limit.burst, limit.total_burst)
+        self.weight = weight
+        self.shared = False  # past the user's own bucket, queued for the shared one
+        self.finish = None
+        self.queued_at = time.monotonic()
+
+class RateLimiter:
+    """Per-user token buckets for each configured endpoint, with weighted fair
+    queuing for the capacity the endpoint's users share.
+
+    A request over its user's limit waits for the user's bucket to refill. It
+    then queues for the shared bucket, where requests are admitted in order of
+    virtual finish time: a user's requests are spaced by cost / weight, so a
+    user flooding the endpoint only delays their own work. Requests that can't
+    be admitted within `max_wait` seconds are refused.
+
+    If the bucket store fails, the request leaves the queue and acquire()
+    raises RateLimitUnavailable; `fail_open` tells the caller whether to let
+    such requests through or refuse them.
+    """
+
+    def __init__(self, store, limits, weights=None, default_weight=1, max_wait=30, fail_open=True):
+        self.store = store
+        self.limits = limits
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.max_wait = max_wait
+        self.fail_open = fail_open
+        self.lock = threading.Lock()
+        self.order = itertools.count()
+        self.queues = {limit.name: [] for limit in limits}  # heap of (finish, order, ticket)
+        self.virtual_time = {limit.name: 0.0 for limit in limits}
+        self.last_finish = {}  # (limit, user) -> finish tag of the user's last request
+        self.stats = {
+            limit.name: {"admitted": 0, "delayed": 0, "rejected": 0, "errors": 0, "waiting": 0, "wait_seconds": 0.0}
+            for limit in limits
+        }
+
+    def limit_for(self, path):
+        for limit in self.limits:
+            if path.startswith(limit.paths):
+                return limit
+        return None
+
+    def enter(self, user, limit, cost=1):
+        with self.lock:
+            self.stats[limit.name]["waiting"] += 1
+        return Ticket(user, limit, cost, self.weights.get(user, self.default_weight))
+
+    def poll(self, ticket):
+        """Try to admit the ticket; returns None once admitted, otherwise the
+        seconds to wait before polling again."""
+        limit = ticket.limit
+        if not ticket.shared:
+            taken, tokens = self.store.take(f'user:{limit.name}:{ticket.user}', limit.rate, limit.burst, ticket.cost)
+            if not taken:
+                return (ticket.cost - tokens) / limit.rate
+            if limit.total_rate is None:
+                self._finish(ticket, 'admitted')
+                return None
+            with self.lock:
+                ticket.shared = True
+                key = (limit.name, ticket.user)
+                ticket.finish = (max(self.virtual_time[limit.name], self.last_finish.get(key, 0.0))
+                                 + ticket.cost / ticket.weight)
+                self.last_finish[key] = ticket.finish
+                heapq.heappush(self.queues[limit.name], (ticket.finish, next(self.order), ticket))
+
+        with self.lock:
+            queue = self.queues[limit.name]
+            if queue[0][2] is not ticket:
+                return QUEUE_POLL_INTERVAL
+            taken, tokens = self.store.take(f'total:{limit.name}', limit.total_rate, limit.total_burst, ticket.cost)
+            if not taken:
+                return max(QUEUE_POLL_INTERVAL, (ticket.cost - tokens) / limit.total_rate)
+            heapq.heappop(queue)
+            self.virtual_time[limit.name] = ticket.finish
+        self._finish(ticket, 'admitted')
+        return None
+
+    def leave(self, ticket, outcome='rejected'):
+        # Give up on a ticket that was never admitted
+        with self.lock:
+            queue = self.queues[ticket.limit.name]
+            remaining = [entry for entry in queue if entry[2] is not ticket]
+            if len(remaining) != len(queue):
+                heapq.heapify(remaining)
+                self.queues[ticket.limit.name] = remaining
+        self._finish(ticket, outcome)
+
+    def _finish(self, ticket, outcome):
+        waited = time.monotonic() - ticket.queued_at
+        with self.lock:
+            stats = self.stats[ticket.limit.name]
+            stats["waiting"] -= 1
+            stats[outcome] += 1
+            if outcome == 'admitted' and waited >= QUEUE_POLL_INTERVAL:
+                stats["delayed"] += 1
+                stats["wait_seconds"] += waited
+
+    def _next_wait(self, ticket, wait, deadline):
+        # Over the user's own limit the wait is known exactly, so refuse at once
+        # if it runs past the deadline; in the shared queue, wait it out
+        now = time.monotonic()
+        if now >= deadline or (not ticket.shared and now + wait > deadline):
+            raise RateLimited(f"Rate limit exceeded for {ticket.limit.name} requests", retry_after=wait)
+        return min(wait, deadline - now)
+
+    def acquire(self, user, limit, cost=1):
+        """Block until the request is admitted; raises RateLimited when it can't be in time."""
+        ticket = self.enter(user, limit, cost)
+        deadline = ticket.queued_at + self.max_wait
+        with self._queued(ticket):
+            while (wait := self.poll(ticket)) is not None:
+                time.sleep(self._next_wait(ticket, wait, deadline))
+
+    async def acquire_async(self, user, limit, cost=1):
+        ticket = self.enter(user, limit, cost)
+        deadline = ticket.queued_at + self.max_wait
+        with self._queued(ticket):
+            while (wait := await asyncio.to_thread(self.poll, ticket)) is not None:
+                await asyncio.sleep(self._next_wait(ticket, wait, deadline))
+
+    @contextlib.contextmanager
+    def _queued(self, ticket):
+        # However the wait ends short of admission, take the ticket out of the
+        # shared queue, or it would hold the head of the line for good
+        try:
+            yield
+        except RateLimited:
+            self.leave(ticket)
+            raise
+        except Exception as e:
+            self.leave(ticket, 'errors')
+            raise RateLimitUnavailable(f"Rate limit store failed: {e}") from e
+        except BaseException:
+            self.leave(ticket)
+            raise
+
+    def state(self):
+        with self.lock:
+            return {
+                name: dict(stats, queued=len(self.queues[name]))
+                for name, stats in self.stats.items()
+            }
+
+def create_rate_limiter(settings, database_url=None):
+    settings = settings or {}
+    if not settings.get('rate_limiting'):
+        return None
+    options = settings.get('rate_limits') or {}
+    per_user = settings.get('max_requests_per_minute', 60)
+    limits = [
+        Limit(
+            name, endpoint.get('paths', []),
+            per_user=endpoint.get('per_user', per_user),
+            burst=endpoint.get('burst', 10),
+            total=endpoint.get('total'),
+            total_burst=endpoint.get('total_burst'),
+        )
+        for name, endpoint in (options.get('endpoints') or {}).items()
+    ]
+    store = None
+    if options.get('backend') == 'postgres' and database_url:
+        try:
+            store = PostgresBucketStore(database_url)
+        except Exception as e:
+            print(f"Postgres rate limit store unavailable ({e}), limiting per process")
+    return RateLimiter(
+        store or MemoryBucketStore(), limits,
+        weights=options.get('weights'),
+        default_weight=options.get('default_weight', 1),
+        max_wait=options.get('max_wait', 30),
+        fail_open=options.get('on_store_error', 'open') == 'open',
+    )
@@ -0,0 +1,289 @@
+import io
+import os
+import queue
+import tarfile
+import threading
+import time
+
+from compile_cache import COMPILED_LANGUAGES, CompilationError, build_spec, run_command
+from execution_limits import ExecutionLimits, OutputBuffer, parse_times, stream_writer
+
+SANDBOX_DIR = '/sandbox'
+# Standard input for a run is uploaded with the program and redirected from here
+STDIN_FILE = '.stdin'
+
+# Source file name and run command used inside the worker for interpreted
+# languages; compiled languages are described by compile_cache.build_spec
+RUN_SPECS = {
+    'javascript': ('main.js', ['node', 'main.js']),
+    'python': ('main.py', ['python', 'main.py']),
+}
+
+SUPPORTED_LANGUAGES = tuple(RUN_SPECS) + COMPILED_LANGUAGES
+
+# Separates the program's stderr from the CPU times the wrapper shell appends.
+# It starts with a control character so streaming can stop at its first byte
+TIMES_MARKER = '\x1e__sandbox_times__\n'
+
+class PoolExhausted(Exception):
+    pass
+
+class SandboxTimeout(Exception):
+    pass
+
+def _tar_files(files):
+    # Pack {name: text} into an in-memory tar archive for put_archive
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, content in files.items():
+            data = content.encode()
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+class _UntilMarker:
+    """Passes streamed stderr on until the wrapper's TIMES_MARKER starts."""
+
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.done = False
+
+    def __call__(self, text):
+        if not self.done:
+            text, marker, _ = text.partition(TIMES_MARKER[0])
+            self.done = bool(marker)
+            if text:
+                self.on_text(text)
+
+class SandboxWorker:
+    """A pre-started, network-isolated container that runs submissions via exec."""
+
+    def __init__(self, client, language, image, limits):
+        self.language = language
+        self.limits = limits
+        self.runs = 0
+        self.started_at = time.time()
+        # Memory, CPU and PID caps are the container's cgroup limits
+        self.container = client.containers.run(
+            image,
+            ['tail', '-f', '/dev/null'],
+            detach=True,
+            network_disabled=True,
+            working_dir=SANDBOX_DIR,
+            labels={'intelligent-ide.sandbox': language},
+            **limits.container_options(),
+        )
+
+    def exec(self, argv, timeout, on_output=None, stdin=None):
+        """Run argv in the worker; returns the same fields as execution_limits.run_limited.
+
+        Peak RSS is not reported: the container's memory cgroup spans every run
+        the worker has served.
+        """
+        api = self.container.client.api
+        stdin_path = '/dev/null'
+        if stdin is not None:
+            self.container.put_archive(SANDBOX_DIR, _tar_files({STDIN_FILE: stdin}))
+            stdin_path = f'{SANDBOX_DIR}/{STDIN_FILE}'
+        # The wrapper shell reports its children's CPU time once the command exits
+        script = f'timeout -s KILL {timeout} "$@" < {stdin_path}; status=$?; printf "\\036{TIMES_MARKER[1:-1]}\\n" >&2; times >&2; exit $status'
+        exec_id = api.exec_create(self.container.id, ['sh', '-c', script, 'sh'] + argv, workdir=SANDBOX_DIR)['Id']
+
+        # Streamed, so output past the cap is dropped as it arrives instead of buffered
+        on_stderr = stream_writer(on_output, 'stderr')
+        stdout = OutputBuffer(self.limits.max_output, stream_writer(on_output, 'stdout'))
+        stderr = OutputBuffer(self.limits.max_output, on_stderr and _UntilMarker(on_stderr))
+        started = time.monotonic()
+        for out, err in api.exec_start(exec_id, stream=True, demux=True):
+            if out:
+                stdout.write(out)
+            if err:
+                stderr.write(err)
+        exit_code = api.exec_inspect(exec_id)['ExitCode']
+        # 124/137 come from `timeout`; anything left behind goes with the worker.
+        # A 137 well before the deadline is the memory cgroup's OOM kill instead
+        if exit_code == 124 or (exit_code == 137 and time.monotonic() - started >= timeout):
+            raise SandboxTimeout()
+
+        errors, marker, times = stderr.text().rpartition(TIMES_MARKER)
+        if not marker:
+            # Not written when the exec was cut short
+            errors, times = stderr.text(), ''
+        if exit_code == 137:
+            errors += f"\nKilled: memory limit of {self.limits.max_memory} MB exceeded"
+        return {
+            "returncode": exit_code,
+            "stdout": stdout.text(),
+            "stderr": errors,
+            "timed_out": False,
+            "cpu_limited": False,
+            "truncated": stdout.truncated or stderr.truncated,
+            "wall_time": round(time.monotonic() - started, 3),
+            "cpu_time": parse_times(times),
+            "peak_rss_kb": None,
+        }
+
+    def prepare(self, files):
+        # Start every run from an empty working directory
+        self.container.exec_run(['sh', '-c', f'rm -rf {SANDBOX_DIR}/* {SANDBOX_DIR}/.[!.]*'])
+        if files:
+            self.container.put_archive(SANDBOX_DIR, _tar_files(files))
+
+    def fetch(self, names, dest_dir):
+        # Copy build artifacts out of the worker into a compile cache entry
+        for name in names:
+            stream, _ = self.container.get_archive(f'{SANDBOX_DIR}/{name}')
+            with tarfile.open(fileobj=io.BytesIO(b''.join(stream))) as tar:
+                tar.extractall(dest_dir)
+
+    def push(self, entry_dir):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            for name in os.listdir(entry_dir):
+                tar.add(os.path.join(entry_dir, name), arcname=name)
+        self.container.put_archive(SANDBOX_DIR, buffer.getvalue())
+
+    def is_stale(self, max_runs, max_age):
+        return self.runs >= max_runs or time.time() - self.started_at >= max_age
+
+    def destroy(self):
+        from docker.errors import APIError
+
+        try:
+            self.container.remove(force=True)
+        except APIError:
+            pass
+
+class SandboxPool:
+    """Per-language pools of warm sandbox workers built from config.yaml images."""
+
+    def __init__(self, client, environments, settings=None, compile_cache=None, compile_timeout=60, limits=None):
+        settings = settings or {}
+        self.client = client
+        self.limits = limits or ExecutionLimits()
+        self.compile_cache = compile_cache
+        self.compile_timeout = compile_timeout
+        self.environments = environments
+        self.max_runs = settings.get('max_runs_per_worker', 50)
+        self.max_age = settings.get('max_worker_age', 600)
+        self.acquire_timeout = settings.get('acquire_timeout', 5)
+        self.idle = {}
+        for language, env in environments.items():
+            if language in SUPPORTED_LANGUAGES and env.get('pool_size', 0) > 0:
+                self.idle[language] = queue.Queue()
+
+    def supports(self, language):
+        return language in self.idle
+
+    def start(self):
+        # Warm every pool in the background so app startup is not blocked
+        for language in self.idle:
+            for _ in range(self.environments[language]['pool_size']):
+                self._spawn_async(language)
+
+    def _spawn(self, language):
+        from docker.errors import DockerException
+
+        try:
+            worker = SandboxWorker(self.client, language, self.environments[language]['image'], self.limits)
+            self.idle[language].put(worker)
+        except DockerException as e:
+            print(f"Failed to start {language} sandbox worker: {e}")
+
+    def _spawn_async(self, language):
+        threading.Thread(target=self._spawn, args=(language,), daemon=True).start()
+
+    def _acquire(self, language):
+        try:
+            return self.idle[language].get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"No idle {language} sandbox worker available")
+
+    def _release(self, worker, recycle=False):
+        if recycle or worker.is_stale(self.max_runs, self.max_age):
+            worker.destroy()
+            self._spawn_async(worker.language)
+        else:
+            self.idle[worker.language].put(worker)
+
+    def execute(self, file_path, language, timeout=None, on_output=None, stdin=None):
+        """Run a submission in a warm worker; returns (output, result) where
+        result is the worker's exec result, or None when it never ran."""
+        # docker is only imported once a pool exists, not when the backend starts
+        from docker.errors import DockerException
+
+        timeout = timeout or self.limits.timeout
+
+        with open(file_path) as f:
+            code = f.read()
+
+        worker = self._acquire(language)
+        # Idle workers may have aged out while they were queued
+        while worker.is_stale(self.max_runs, self.max_age):
+            self._release(worker, recycle=True)
+            worker = self._acquire(language)
+
+        try:
+            argv = self._prepare(worker, language, code)
+            result = worker.exec(argv, timeout, on_output, stdin)
+            worker.runs += 1
+        except SandboxTimeout:
+            self._release(worker, recycle=True)
+            # Reported like a local run that hit the timeout
+            return f"Execution timed out after {timeout} seconds", {
+                "returncode": None, "stdout": "", "stderr": "", "timed_out": True, "cpu_limited": False,
+                "truncated": False, "wall_time": timeout, "cpu_time": None, "peak_rss_kb": None,
+            }
+        except CompilationError as e:
+            self._release(worker)
+            return f"Compilation Error: {e}", None
+        except DockerException as e:
+            self._release(worker, recycle=True)
+            return f"Execution error: {str(e)}", None
+        except BaseException:
+            # e.g. a read timeout from the Docker API or a compile cache error;
+            # the worker's state is unknown, so replace it rather than lose it
+            self._release(worker, recycle=True)
+            raise
+
+        self._release(worker)
+        if result["returncode"] != 0:
+            return f"Error: {result['stderr']}", result
+        return result["stdout"], result
+
+    def _prepare(self, worker, language, code):
+        # Load the worker with a runnable program and return its run command
+        spec = build_spec(language, code)
+        if spec is None:
+            filename, argv = RUN_SPECS[language]
+            worker.prepare({filename: code})
+            return argv
+
+        built_here = []
+
+        def builder(work_dir):
+            worker.prepare(spec['files'])
+            build = worker.exec(spec['build'], self.compile_timeout)
+            if build["returncode"] != 0:
+                raise CompilationError(build["stderr"] or build["stdout"])
+            if work_dir:
+                worker.fetch(spec['artifacts'], work_dir)
+            built_here.append(True)
+
+        if self.compile_cache is None:
+            builder(None)
+        else:
+            # The worker image pins the toolchain, so it stands in for the compiler version
+            key = self.compile_cache.key(spec['files'], self.environments[language]['image'], spec['build'])
+            with self.compile_cache.checkout(key, builder) as entry_dir:
+                if not built_here:
+                    worker.prepare({})
+                    worker.push(entry_dir)
+        return run_command(spec, SANDBOX_DIR)
+
+    def shutdown(self):
+        for language, idle in self.idle.items():
+            while not idle.empty():
+                idle.get_nowait().destroy()
@@ -0,0 +1,103 @@
+import json
+
+def sse_event(event, data):
+    # Format one Server-Sent Events message with a JSON payload
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class FenceStripper:
+    """Incrementally removes a surrounding ```lang ... ``` markdown fence.
+
+    Text is released a line at a time so the closing fence can be held back
+    until the stream ends.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.started = False
+        self.fenced = False
+
+    def feed(self, text):
+        self.buffer += text
+        if not self.started:
+            newline = self.buffer.find('\n')
+            # Need the whole first line before deciding whether it is a fence
+            if newline < 0 and (len(self.buffer) < 3 or self.buffer.startswith('```')):
+                return ''
+            self.started = True
+            if self.buffer.startswith('```'):
+                self.fenced = True
+                self.buffer = self.buffer[newline + 1:]
+
+        if not self.fenced:
+            out, self.buffer = self.buffer, ''
+            return out
+
+        # Keep the last (possibly closing) line, the newline before it and any
+        # trailing blank lines
+        last_newline = self.buffer.rstrip().rfind('\n')
+        if last_newline <= 0:
+            return ''
+        out, self.buffer = self.buffer[:last_newline], self.buffer[last_newline:]
+        return out
+
+    def finish(self):
+        out, self.buffer = self.buffer, ''
+        if self.fenced and out.strip() == '```':
+            return ''
+        return out
+
+class JSONArrayStreamer:
+    """Yields each complete object of the first top-level JSON array as it arrives.
+
+    Prose before the array, braces inside strings and escaped quotes are all
+    handled; objects that fail to parse are skipped rather than aborting the
+    rest of the array.
+    """
+
+    def __init__(self):
+        self.in_array = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.current = []
+
+    def feed(self, text):
+        objects = []
+        for ch in text:
+            if self.finished:
+                break
+            if not self.in_array:
+                if ch == '[':
+                    self.in_array = True
+                continue
+
+            if self.depth > 0:
+                self.current.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                if self.depth == 0:
+                    self.current = [ch]
+                self.depth += 1
+            elif ch == '}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        objects.append(json.loads(''.join(self.current)))
+                    except json.JSONDecodeError:
+                        pass
+                    self.current = []
+            elif ch == ']' and self.depth == 0:
+                self.finished = True
+        return objects
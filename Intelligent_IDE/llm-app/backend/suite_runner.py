@@ -0,0 +1,269 @@
+import contextlib
+import copy
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from languages import find_java_main_class
+from execution_limits import ExecutionLimits, run_limited, sandbox_env
+
+class TestRunError(Exception):
+    pass
+
+# Where the code under test lives, told to the model so generated tests can import it
+FRAMEWORK_HINTS = {
+    'pytest': "The code under test is saved as solution.py; import what you need from the `solution` module.",
+    'jest': "The code under test is saved as solution.js; load it with require('./solution').",
+    'googletest': 'The code under test is saved as solution.cpp; #include "solution.cpp" and do not define main().',
+    'junit': "Use JUnit 5 (org.junit.jupiter.api). The code under test is compiled alongside the tests.",
+}
+
+def extract_code_block(text):
+    # Models often wrap the tests in prose and a fenced block; keep only the code
+    match = re.search(r'```[\w+#-]*\n(.*?)```', text, re.DOTALL)
+    return match.group(1) if match else text
+
+# Frameworks whose test files can be generated in parts and concatenated
+MERGEABLE_FRAMEWORKS = ('pytest', 'jest')
+
+def merge_test_files(framework, sources):
+    # Combine tests generated chunk by chunk into one file for the runner
+    blocks = [extract_code_block(source).strip('\n') for source in sources]
+    if framework == 'jest':
+        # Block scope keeps each part's `const ... = require(...)` apart
+        blocks = ['{\n' + block + '\n}' for block in blocks]
+    return '\n\n\n'.join(blocks) + '\n'
+
+def _write(work_dir, name, content):
+    with open(os.path.join(work_dir, name), 'w') as f:
+        f.write(content)
+
+def _build(cmd, work_dir, timeout):
+    # Compilers are trusted, but they still see none of the backend's secrets
+    return subprocess.run(cmd, cwd=work_dir, capture_output=True, text=True, timeout=timeout, env=sandbox_env(work_dir))
+
+def _run(cmd, run_dir, limits, env=None):
+    # Generated tests and the code under test run as a limited program, like run-code
+    result = run_limited(cmd, limits, cwd=run_dir, env=env)
+    if result["timed_out"]:
+        raise subprocess.TimeoutExpired(cmd, limits.timeout)
+    return result
+
+@contextlib.contextmanager
+def _run_dir(work_dir, names):
+    """A private copy of `names` from work_dir for one run, which may be
+    handed to the run's own sandbox uid."""
+    run_dir = tempfile.mkdtemp(prefix='test-run-')
+    try:
+        for name in names:
+            source = os.path.join(work_dir, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(run_dir, name))
+            else:
+                shutil.copy2(source, run_dir)
+        yield run_dir
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def suite_limits(limits, workers, timeout):
+    # A test run may use `workers` processes or threads, each within the usual caps
+    limits = copy.copy(limits)
+    limits.timeout = timeout
+    limits.max_cpu_time = timeout * workers
+    limits.max_processes = limits.max_processes * (workers + 1)
+    return limits
+
+def _tail(text, lines=30):
+    return '\n'.join(text.strip().split('\n')[-lines:])
+
+def _timed_out(names, timeout):
+    return [
+        {"name": name, "passed": False, "error": f"Timed out after {timeout} seconds", "duration": timeout}
+        for name in names
+    ]
+
+def _crashed(names, result):
+    # The process died before writing its report; its tests count as failed
+    error = f"The test process exited with code {result['returncode']} before reporting"
+    if result["stderr"].strip():
+        error += f":\n{_tail(result['stderr'])}"
+    return [{"name": name, "passed": False, "error": error, "duration": result["wall_time"]} for name in names]
+
+def parse_junit_xml(path):
+    # pytest, googletest and the JUnit console launcher all write this format
+    cases = []
+    for case in ET.parse(path).iter('testcase'):
+        if case.find('skipped') is not None:
+            continue
+        classname = case.get('classname')
+        name = f"{classname}::{case.get('name')}" if classname else case.get('name')
+        failure = case.find('failure')
+        if failure is None:
+            failure = case.find('error')
+        result = {"name": name, "passed": failure is None, "duration": round(float(case.get('time') or 0), 4)}
+        if failure is not None:
+            result["error"] = failure.get('message') or (failure.text or '').strip()
+        cases.append(result)
+    return cases
+
+def run_pytest(work_dir, code, tests, workers, limits):
+    sources = ['solution.py', 'test_solution.py']
+    _write(work_dir, 'solution.py', code)
+    _write(work_dir, 'test_solution.py', tests)
+    pytest = [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider']
+
+    with _run_dir(work_dir, sources) as run_dir:
+        collected = _run(pytest + ['--collect-only', 'test_solution.py'], run_dir, limits)
+    node_ids = [line for line in collected["stdout"].split('\n') if '::' in line]
+    if not node_ids:
+        raise TestRunError(f"No tests collected:\n{_tail(collected['stdout'] + collected['stderr'])}")
+
+    # Deal test cases round-robin into shards and run each shard in its own process
+    shard_count = min(workers, len(node_ids))
+    shards = [node_ids[i::shard_count] for i in range(shard_count)]
+
+    def run_shard(index):
+        with _run_dir(work_dir, sources) as run_dir:
+            report = os.path.join(run_dir, 'report.xml')
+            try:
+                result = _run(pytest + [f'--junitxml={report}'] + shards[index], run_dir, limits)
+            except subprocess.TimeoutExpired:
+                return _timed_out(shards[index], limits.timeout)
+            if not os.path.exists(report):
+                return _crashed(shards[index], result)
+            return parse_junit_xml(report)
+
+    with ThreadPoolExecutor(shard_count) as executor:
+        return [case for cases in executor.map(run_shard, range(shard_count)) for case in cases]
+
+def run_jest(work_dir, code, tests, workers, limits):
+    _write(work_dir, 'solution.js', code)
+    _write(work_dir, 'solution.test.js', tests)
+
+    with _run_dir(work_dir, ['solution.js', 'solution.test.js']) as run_dir:
+        report = os.path.join(run_dir, 'report.json')
+        try:
+            result = _run(
+                ['npx', '--no-install', 'jest', '--json', f'--outputFile={report}',
+                 f'--maxWorkers={workers}', '--rootDir', run_dir],
+                run_dir, limits
+            )
+        except subprocess.TimeoutExpired:
+            return _timed_out(['solution.test.js'], limits.timeout)
+        if not os.path.exists(report):
+            raise TestRunError(f"Jest did not run:\n{_tail(result['stderr'])}")
+
+        with open(report) as f:
+            data = json.load(f)
+    cases = []
+    for suite in data.get('testResults', []):
+        for assertion in suite.get('assertionResults', []):
+            result = {
+                "name": ' '.join(assertion.get('ancestorTitles', []) + [assertion['title']]),
+                "passed": assertion['status'] == 'passed',
+                "duration": round((assertion.get('duration') or 0) / 1000, 4),
+            }
+            if not result["passed"]:
+                result["error"] = '\n'.join(assertion.get('failureMessages', []))
+            cases.append(result)
+    return cases
+
+def run_googletest(work_dir, code, tests, workers, limits):
+    _write(work_dir, 'solution.cpp', code)
+    _write(work_dir, 'test_solution.cpp', tests)
+
+    # gtest_main supplies main(); rename any main() in the solution or the tests
+    build = _build(
+        ['g++', '-std=c++17', '-Dmain=solution_main', 'test_solution.cpp', '-o', 'tests',
+         '-lgtest', '-lgtest_main', '-pthread'],
+        work_dir, limits.timeout
+    )
+    if build.returncode != 0:
+        raise TestRunError(f"Test compilation failed:\n{_tail(build.stderr)}")
+
+    # googletest shards natively through GTEST_TOTAL_SHARDS/GTEST_SHARD_INDEX
+    def run_shard(index):
+        with _run_dir(work_dir, ['tests']) as run_dir:
+            report = os.path.join(run_dir, 'report.xml')
+            env = {'GTEST_TOTAL_SHARDS': str(workers), 'GTEST_SHARD_INDEX': str(index),
+                   'GTEST_OUTPUT': f'xml:{report}'}
+            try:
+                result = _run([os.path.join(run_dir, 'tests')], run_dir, limits, env=env)
+            except subprocess.TimeoutExpired:
+                return _timed_out([f'shard {index}'], limits.timeout)
+            if not os.path.exists(report):
+                return _crashed([f'shard {index}'], result)
+            return parse_junit_xml(report)
+
+    with ThreadPoolExecutor(workers) as executor:
+        return [case for cases in executor.map(run_shard, range(workers)) for case in cases]
+
+def run_junit(work_dir, code, tests, workers, limits):
+    jar = os.getenv('JUNIT_JAR')
+    if not jar or not os.path.exists(jar):
+        raise TestRunError("JUnit is not installed; set JUNIT_JAR to junit-platform-console-standalone.jar")
+
+    _write(work_dir, f'{find_java_main_class(code)}.java', code)
+    _write(work_dir, f'{find_java_main_class(tests)}.java', tests)
+    sources = [name for name in os.listdir(work_dir) if name.endswith('.java')]
+    build = _build(['javac', '-d', 'classes', '-cp', jar] + sources, work_dir, limits.timeout)
+    if build.returncode != 0:
+        raise TestRunError(f"Test compilation failed:\n{_tail(build.stderr)}")
+
+    # JUnit 5 runs test methods concurrently inside one JVM
+    with _run_dir(work_dir, ['classes']) as run_dir:
+        try:
+            result = _run(
+                ['java', '-jar', jar, '--class-path', 'classes', '--scan-class-path',
+                 '--reports-dir', 'reports', '--disable-banner',
+                 '--config', 'junit.jupiter.execution.parallel.enabled=true',
+                 '--config', 'junit.jupiter.execution.parallel.mode.default=concurrent',
+                 '--config', 'junit.jupiter.execution.parallel.config.strategy=fixed',
+                 '--config', f'junit.jupiter.execution.parallel.config.fixed.parallelism={workers}'],
+                run_dir, limits
+            )
+        except subprocess.TimeoutExpired:
+            return _timed_out(['junit'], limits.timeout)
+        report = os.path.join(run_dir, 'reports', 'TEST-junit-jupiter.xml')
+        if not os.path.exists(report):
+            raise TestRunError(f"JUnit did not produce a report:\n{_tail(result['stdout'] + result['stderr'])}")
+        return parse_junit_xml(report)
+
+RUNNERS = {
+    'pytest': run_pytest,
+    'jest': run_jest,
+    'googletest': run_googletest,
+    'junit': run_junit,
+}
+
+def run_test_suite(code, tests, framework, workers=4, timeout=30, limits=None):
+    """Run generated tests against `code` and report per-test results and durations.
+
+    Every test process runs under `limits` (the run-code limits), with
+    `timeout` seconds per shard.
+    """
+    runner = RUNNERS.get(framework)
+    if runner is None:
+        return {"total": 0, "passed": 0, "tests": [], "error": f"Running {framework} tests is not supported"}
+
+    limits = suite_limits(limits or ExecutionLimits(), workers, timeout)
+    with tempfile.TemporaryDirectory(prefix='tests-') as work_dir:
+        try:
+            cases = runner(work_dir, code, extract_code_block(tests), workers, limits)
+        except (TestRunError, subprocess.TimeoutExpired, FileNotFoundError) as e:
+            return {"total": 0, "passed": 0, "tests": [], "error": str(e)}
+
+    return {
+        "total": len(cases),
+        "passed": sum(1 for case in cases if case["passed"]),
+        "duration": round(sum(case["duration"] for case in cases), 4),
+        "tests": cases,
+        # Slowest first, so long-running tests are easy to spot
+        "slowest": [case["name"] for case in sorted(cases, key=lambda c: c["duration"], reverse=True)[:5]],
+    }
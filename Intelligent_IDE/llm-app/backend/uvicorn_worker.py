@@ -0,0 +1,12 @@
+from uvicorn.workers import UvicornWorker
+
+class TunedUvicornWorker(UvicornWorker):
+    # uvloop/httptools when available; each process keeps up to
+    # limit_concurrency requests open before answering 503
+    CONFIG_KWARGS = {
+        "loop": "auto",
+        "http": "auto",
+        "lifespan": "on",
+        "limit_concurrency": 1000,
+        "timeout_keep_alive": 5,
+    }
@@ -0,0 +1,177 @@
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+class FleetUnavailable(Exception):
+    pass
+
+class WorkerBusy(Exception):
+    pass
+
+def _error_message(error):
+    # exec_worker.py answers errors as {"error": message}
+    try:
+        return json.loads(error.read())['error']
+    except (OSError, ValueError, KeyError, TypeError):
+        return str(error)
+
+class RemoteWorker:
+    """The dispatcher's view of one exec_worker.py process, refreshed from its /health."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.healthy = False
+        self.slots = 1
+        self.active = 0  # runs in progress as last reported, from every dispatcher
+        self.warm = {}  # language -> idle warm sandbox workers as last reported
+        self.languages = set()
+        self.in_flight = {}  # language -> runs this dispatcher has sent and not seen finish
+
+    def load(self):
+        sent = sum(self.in_flight.values())
+        return max(sent, self.active) / self.slots
+
+    def has_warm(self, language):
+        return self.warm.get(language, 0) > self.in_flight.get(language, 0)
+
+class WorkerFleet:
+    """Dispatches runs to remote execution workers.
+
+    A run goes to a healthy worker for its language, preferring ones with a
+    warm sandbox worker free for it, then the shortest queue. A worker that
+    can't be reached, times out or drops the connection is taken out of
+    rotation until its health check passes again; an error reply only fails
+    that attempt. Either way the run is retried on another worker.
+    """
+
+    def __init__(self, urls, health_interval=5, retries=2, request_timeout=120):
+        self.workers = [RemoteWorker(url) for url in urls]
+        self.health_interval = health_interval
+        self.retries = retries
+        self.request_timeout = request_timeout
+        self.lock = threading.Lock()
+
+    def start(self):
+        for worker in self.workers:
+            self.check(worker)
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.health_interval)
+            for worker in self.workers:
+                self.check(worker)
+
+    def check(self, worker):
+        try:
+            with urllib.request.urlopen(worker.url + '/health', timeout=2) as response:
+                health = json.load(response)
+        except (OSError, ValueError, http.client.HTTPException):
+            with self.lock:
+                worker.healthy = False
+            return
+        with self.lock:
+            worker.healthy = health.get('status') == 'ok'
+            worker.slots = max(1, health.get('slots', 1))
+            worker.active = health.get('active', 0)
+            worker.warm = health.get('warm', {})
+            worker.languages = set(health.get('languages', []))
+
+    def capacity(self, language):
+        # Runs the healthy workers for a language accept at once
+        with self.lock:
+            return sum(w.slots for w in self.workers if w.healthy and language in w.languages)
+
+    def in_flight(self):
+        with self.lock:
+            return {(worker.url,): sum(worker.in_flight.values()) for worker in self.workers}
+
+    def _acquire(self, language, tried):
+        with self.lock:
+            candidates = [
+                worker for worker in self.workers
+                if worker.healthy and language in worker.languages and worker not in tried
+            ]
+            if not candidates:
+                return None
+            worker = min(candidates, key=lambda w: (not w.has_warm(language), w.load(), random.random()))
+            worker.in_flight[language] = worker.in_flight.get(language, 0) + 1
+            return worker
+
+    def _release(self, worker, language, lost=False):
+        with self.lock:
+            worker.in_flight[language] -= 1
+            if lost:
+                worker.healthy = False
+
+    def execute(self, code, language, stdin=None, on_output=None):
+        """Run code on a worker; returns (output, usage) like the backend's execute_code.
+
+        Raises FleetUnavailable when no worker could take the run.
+        """
+        payload = {"code": code, "language": language, "stdin": stdin, "stream": on_output is not None}
+        tried = []
+        for _ in range(self.retries + 1):
+            worker = self._acquire(language, tried)
+            if worker is None:
+                break
+            tried.append(worker)
+            streamed = []
+            lost = False
+            try:
+                return self._run(worker, payload, on_output, streamed)
+            except WorkerBusy:
+                continue
+            except urllib.error.HTTPError as e:
+                # The worker answered, so it is still up
+                print(f"Execution worker {worker.url} refused the run: {e}")
+                if e.code < 500:
+                    # Every worker would refuse it the same way
+                    return f"Execution error: {_error_message(e)}", None
+            except ValueError as e:
+                print(f"Execution worker {worker.url} sent a malformed reply: {e}")
+                if streamed:
+                    return f"Execution error: malformed reply from the worker ({e})", None
+            except (OSError, http.client.HTTPException) as e:
+                lost = True
+                print(f"Execution worker {worker.url} failed: {e}")
+                if streamed:
+                    # Output already went to the client; a rerun would repeat it
+                    return f"Execution error: worker lost during the run ({e})", None
+            finally:
+                self._release(worker, language, lost)
+        raise FleetUnavailable(f"No execution worker available for {language}")
+
+    def _run(self, worker, payload, on_output, streamed):
+        request = urllib.request.Request(
+            worker.url + '/run', data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=self.request_timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 503:
+                raise WorkerBusy()
+            raise
+        # One JSON object per line: output as the program prints, then the result
+        with response:
+            for line in response:
+                message = json.loads(line)
+                if 'result' in message:
+                    return message['result']['output'], message['result']['usage']
+                streamed.append(True)
+                on_output(message['stream'], message['text'])
+        raise ConnectionError("worker closed the connection before the run finished")
+
+def create_fleet(urls, settings):
+    settings = settings or {}
+    return WorkerFleet(
+        urls,
+        health_interval=settings.get('health_interval', 5),
+        retries=settings.get('retries', 2),
+        request_timeout=settings.get('request_timeout', 120),
+    )
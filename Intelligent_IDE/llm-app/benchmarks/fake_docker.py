@@ -0,0 +1,166 @@
+"""Just enough of the Docker Engine API for the CI image builds.
+
+Answers version negotiation, image lookups, listing and removal, and
+builds: a build reads the context, waits the configured latency and records
+the tag, so the next lookup of the same tag finds it the way a real layer
+cache would. Anything else gets a 404. Point a service at it with DOCKER_HOST=tcp://127.0.0.1:PORT.
+
+    python benchmarks/fake_docker.py --port 2375 --build-latency 0.5
+"""
+import argparse
+import hashlib
+import json
+import datetime
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+API_VERSION = '1.43'
+_VERSIONED = re.compile(r'^/v[\d.]+(/.*)$')
+_IMAGE = re.compile(r'^/images/(.+)/json$')
+_IMAGE_DELETE = re.compile(r'^/images/(.+)$')
+
+class FakeDocker(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, build_latency=0.5):
+        super().__init__(address, Handler)
+        self.build_latency = build_latency
+        self.images = {}  # tag -> image id
+        self.created = {}  # image id -> build time
+        self.builds = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        match = _VERSIONED.match(path)
+        return (match.group(1) if match else path), parse_qs(url.query)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+                if size == 0:
+                    return bytes(body)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        path, query = self.route()
+        if path == '/_ping':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(b'OK')
+        elif path == '/version':
+            self.send_json(200, {"Version": "fake", "ApiVersion": API_VERSION, "MinAPIVersion": "1.12"})
+        elif path == '/images/json':
+            # The SDK filters by repository as {"reference": ["name"]}
+            references = json.loads(query.get('filters', ['{}'])[0]).get('reference', [])
+            with self.server.lock:
+                listed = {}
+                for tag, image_id in self.server.images.items():
+                    if not references or tag.rpartition(':')[0] in references:
+                        listed.setdefault(image_id, []).append(tag)
+                self.send_json(200, [
+                    {"Id": image_id, "RepoTags": tags, "Created": int(self.server.created[image_id]), "Size": 0}
+                    for image_id, tags in listed.items()
+                ])
+        elif (match := _IMAGE.match(path)):
+            name = match.group(1)
+            with self.server.lock:
+                # By tag or by id
+                image_id = self.server.images.get(name) or (name if name in self.server.created else None)
+                tags = [tag for tag, tagged in self.server.images.items() if tagged == image_id]
+                created = self.server.created.get(image_id)
+            if image_id is None:
+                self.send_json(404, {"message": f"No such image: {name}"})
+            else:
+                self.send_json(200, {
+                    "Id": image_id, "RepoTags": tags, "Size": 0,
+                    "Created": datetime.datetime.fromtimestamp(created, datetime.timezone.utc).isoformat().replace('+00:00', 'Z'),
+                })
+        else:
+            self.send_json(404, {"message": "page not found"})
+
+    def do_POST(self):
+        path, query = self.route()
+        body = self.read_body()
+        if path != '/build':
+            self.send_json(404, {"message": "page not found"})
+            return
+
+        tag = query.get('t', [''])[0]
+        image_id = 'sha256:' + hashlib.sha256(body + tag.encode()).hexdigest()
+        time.sleep(self.server.build_latency)
+        with self.server.lock:
+            self.server.images[tag] = image_id
+            self.server.created.setdefault(image_id, time.time())
+            self.server.builds += 1
+
+        lines = [
+            {"stream": "Step 1/1 : fake build\n"},
+            {"aux": {"ID": image_id}},
+            {"stream": f"Successfully built {image_id[7:19]}\n"},
+            {"stream": f"Successfully tagged {tag}\n"},
+        ]
+        # The SDK only decodes a build's progress line by line from a chunked response
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for line in lines:
+            data = (json.dumps(line) + '\r\n').encode()
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_DELETE(self):
+        path, _ = self.route()
+        match = _IMAGE_DELETE.match(path)
+        name = match.group(1) if match else None
+        with self.server.lock:
+            image_id = self.server.images.pop(name, None) if name else None
+            if image_id and image_id not in self.server.images.values():
+                del self.server.created[image_id]
+        if image_id is None:
+            self.send_json(404, {"message": f"No such image: {name}"})
+        else:
+            self.send_json(200, [{"Untagged": name}])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=2375)
+    parser.add_argument('--build-latency', type=float, default=0.5, help="seconds per image build")
+    args = parser.parse_args()
+    FakeDocker(('127.0.0.1', args.port), args.build_latency).serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""Load and latency benchmark for the backend and ci_service endpoints.
+
+Runs offline: the backend talks to backend/openai_stub.py with the given
+latency, ci_service builds images on benchmarks/fake_docker.py, and code
+runs as local processes under the usual execution limits. Both services
+start with a copy of config.yaml that turns off the warm sandbox pool, the
+execution fleet and rate limiting, and keeps ci_service's database and
+logs in a temporary directory.
+
+Each endpoint gets --requests requests at each --concurrency level. Every
+payload is distinct, so the LLM response cache never answers for the
+stub. A request counts as an error unless its reply carries what the
+endpoint promises (a generated test suite that ran, bug suggestions, a
+build id, ...); a 200 with an error inside is an error. For every endpoint
+the report gives throughput and p50/p95/p99 latency of the successful
+requests.
+
+The results are compared with benchmarks/load_baseline.json, and the
+script exits non-zero on new errors, or when p95 latency rises or
+throughput falls by more than the tolerance. The baseline comes from one
+machine, so it is first scaled by how much slower this machine runs a
+fixed calibration workload than the one that recorded it. /start-build
+only queues a build; the "start-build (finished)" row times builds from
+creation to completion.
+
+    python benchmarks/load_test.py                      # check against the baseline
+    python benchmarks/load_test.py --concurrency 1 16   # other concurrency levels
+    python benchmarks/load_test.py --update             # record a new baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from fake_docker import FakeDocker
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+CI_DIR = os.path.join(ROOT, 'ci_service')
+BASELINE_PATH = os.path.join(HERE, 'load_baseline.json')
+
+# The services are started from their own directories with these, instead of
+# their __main__ blocks, which run Flask's debug reloader on fixed ports
+BACKEND_SERVERS = {
+    'flask': [sys.executable, '-c', "import app; app.warm_up(); app.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+}
+CI_SERVER = [sys.executable, '-c', "import ci_service as ci; ci.scheduler.start(); ci.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+
+def sample_code(i):
+    # A distinct name per request; comments would be stripped before the prompt
+    return (
+        f"def total_{i}(values):\n"
+        f"    result = 0\n"
+        f"    for value in values:\n"
+        f"        result += value\n"
+        f"    return result\n\n"
+        f"print(total_{i}(range({i})))\n"
+    )
+
+def check_run(reply):
+    if str(reply.get("output", "")).startswith("Execution error"):
+        return reply["output"]
+    return None if "output" in reply else "no output"
+
+def check_tests(reply):
+    # A suite that failed to build or collect is still answered with 200
+    if reply.get("error"):
+        return reply["error"]
+    return None if reply.get("total") else "no tests ran"
+
+def check_field(field):
+    def check(reply):
+        return None if reply.get(field) else f"no {field} in the reply"
+    return check
+
+# Endpoint -> (service, path, payload for request i, problem with a reply or None)
+ENDPOINTS = {
+    '/api/run-code': ('backend', '/api/run-code', lambda i: {"code": sample_code(i), "language": "python"}, check_run),
+    '/api/generate-tests': ('backend', '/api/generate-tests', lambda i: {"code": sample_code(i), "language": "python"}, check_tests),
+    '/api/debug-code': ('backend', '/api/debug-code', lambda i: {"code": sample_code(i), "language": "python"},
+                        check_field('suggestions')),
+    '/api/generate-code': ('backend', '/api/generate-code', lambda i: {
+        "prompt": f"Write a function that returns the {i}th prime number", "language": "python"
+    }, check_field('generatedCode')),
+    '/api/trigger-ci-build': ('backend', '/api/trigger-ci-build', lambda i: {"code": sample_code(i), "language": "python"},
+                              check_field('buildLog')),
+    '/start-build': ('ci', '/start-build', lambda i: {"code": sample_code(i), "language": "python"}, check_field('build_id')),
+}
+
+def calibrate(runs=5):
+    """Median seconds for a fixed CPU-bound workload, to tell how fast this machine is."""
+    def workload():
+        started = time.perf_counter()
+        json.loads(json.dumps([{"line": i, "text": str(i) * 8} for i in range(200000)]))
+        return time.perf_counter() - started
+    return statistics.median(workload() for _ in range(runs))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, process, name, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"{name} exited during startup")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    sys.exit(f"{name} did not start")
+
+def start(command, port, cwd, env, name, log_dir):
+    log = open(os.path.join(log_dir, f'{name}.log'), 'w')
+    process = subprocess.Popen(
+        [part.format(port=port) for part in command],
+        cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    wait_for_port(port, process, name)
+    return process
+
+def write_config(path, work_dir):
+    with open(os.path.join(ROOT, 'config.yaml')) as f:
+        config = yaml.safe_load(f)
+    execution = config.setdefault('code_execution', {})
+    execution.setdefault('sandbox_pool', {})['enabled'] = False
+    execution.setdefault('fleet', {})['workers'] = []
+    config.setdefault('security', {})['rate_limiting'] = False
+    pipeline = config.setdefault('ci_pipeline', {})
+    pipeline.setdefault('scheduler', {})['database'] = os.path.join(work_dir, 'ci_builds.db')
+    pipeline.setdefault('logs', {})['path'] = os.path.join(work_dir, 'ci_build_logs')
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+def post(url, payload, user):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json', 'X-User-Id': user}
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body, status = e.read(), e.code
+    except OSError:
+        body, status = b'', None
+    return time.perf_counter() - started, status, body
+
+def percentile(samples, fraction):
+    # Nearest-rank percentile
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def summarize(latencies, errors, elapsed):
+    if not latencies:
+        return {"requests": 0, "errors": errors, "throughput": 0.0, "p50": None, "p95": None, "p99": None}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50": round(percentile(latencies, 0.50), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+        "p99": round(percentile(latencies, 0.99), 4),
+    }
+
+def problem(status, body, check):
+    # Why a request failed, or None if it got the reply its endpoint promises
+    if status is None:
+        return "no response"
+    try:
+        reply = json.loads(body)
+    except ValueError:
+        return f"HTTP {status}, not JSON"
+    if not isinstance(reply, dict):
+        return f"HTTP {status}, unexpected reply"
+    if status >= 400:
+        return f"HTTP {status}: {reply.get('error')}"
+    return check(reply)
+
+def drive(url, payload, check, requests, concurrency, users, offset):
+    """Send `requests` requests with `concurrency` in flight; returns
+    (latencies of successful requests, their replies, elapsed seconds, problems of the rest)."""
+    def one(i):
+        return post(url, payload(offset + i), f'bench-user-{i % users}')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies, replies, problems = [], [], []
+    for latency, status, body in results:
+        reason = problem(status, body, check)
+        if reason:
+            problems.append(reason)
+        else:
+            latencies.append(latency)
+            replies.append(json.loads(body))
+    return latencies, replies, elapsed, problems
+
+def wait_for_builds(ci_url, build_ids, timeout):
+    """Wait for the queued builds to finish; returns (their registry rows, builds still unfinished)."""
+    pending = set(build_ids)
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        for build_id in list(pending):
+            with urllib.request.urlopen(f'{ci_url}/build-status/{build_id}', timeout=30) as response:
+                if json.load(response).get("status") in ('completed', 'failed'):
+                    pending.discard(build_id)
+        time.sleep(0.2)
+    # The build list carries the creation and finish times
+    with urllib.request.urlopen(f'{ci_url}/builds?limit=500', timeout=30) as response:
+        builds = json.load(response)["builds"]
+    finished = [b for b in builds if b["build_id"] in build_ids and b["build_id"] not in pending and b.get("finished_at")]
+    return finished, len(pending)
+
+def compare(results, baselines, tolerance, scale=1.0):
+    """Regressions against the baseline, whose latencies are multiplied and
+    throughputs divided by `scale` first."""
+    failures = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        if baseline["p95"] and result["p95"] is not None and result["p95"] > baseline["p95"] * scale * (1 + tolerance):
+            failures.append(f"{key}: p95 {result['p95'] * 1000:.0f} ms > baseline {baseline['p95'] * scale * 1000:.0f} ms")
+        if baseline["throughput"] and result["throughput"] < baseline["throughput"] / scale * (1 - tolerance):
+            failures.append(f"{key}: {result['throughput']:.1f} req/s < baseline {baseline['throughput'] / scale:.1f} req/s")
+        if result["errors"] > baseline.get("errors", 0):
+            failures.append(f"{key}: {result['errors']} errors, baseline {baseline.get('errors', 0)}")
+    return failures
+
+def print_report(results, baselines, scale=1.0):
+    header = f"{'endpoint':<36} {'req':>5} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'p95 vs base':>12}"
+    print(header)
+    print('-' * len(header))
+    ms = lambda value: f"{value * 1000:.0f}" if value is not None else '-'
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        change = '-'
+        if baseline and baseline.get("p95") and result["p95"] is not None:
+            change = f"{result['p95'] / (baseline['p95'] * scale) - 1:+.0%}"
+        print(
+            f"{key:<36} {result['requests']:>5} {result['errors']:>4} {result['throughput']:>8.2f} "
+            f"{ms(result['p50']):>8} {ms(result['p95']):>8} {ms(result['p99']):>8} {change:>12}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8])
+    parser.add_argument('--requests', type=int, default=40, help="requests per endpoint and concurrency level")
+    parser.add_argument('--warmup', type=int, default=2, help="unmeasured requests per endpoint first")
+    parser.add_argument('--users', type=int, default=20, help="distinct X-User-Id values to spread requests over")
+    parser.add_argument('--server', choices=list(BACKEND_SERVERS), default='flask', help="how the backend is served")
+    parser.add_argument('--latency', type=float, default=0.2, help="OpenAI stub seconds per request")
+    parser.add_argument('--build-latency', type=float, default=0.2, help="fake Docker seconds per image build")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed p95 rise or throughput drop, after scaling the baseline to this machine")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--update', action='store_true', help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='load-test-')
+    config_path = os.path.join(work_dir, 'config.yaml')
+    write_config(config_path, work_dir)
+    docker = FakeDocker(('127.0.0.1', 0), args.build_latency).start()
+
+    stub_port, backend_port, ci_port = free_port(), free_port(), free_port()
+    env = {k: v for k, v in os.environ.items() if k not in ('DATABASE_URL', 'EXEC_WORKERS', 'BUILD_LOG_DIR')}
+    env.update(
+        CONFIG_PATH=config_path,
+        OPENAI_API_BASE=f'http://127.0.0.1:{stub_port}/v1',
+        OPENAI_API_KEY='benchmark',
+        OPENAI_STUB_LATENCY=str(args.latency),
+        DOCKER_HOST=f'tcp://127.0.0.1:{docker.server_port}',
+        PROJECT_ROOT=work_dir,
+    )
+    urls = {'backend': f'http://127.0.0.1:{backend_port}', 'ci': f'http://127.0.0.1:{ci_port}'}
+    services = {endpoint[0] for name, endpoint in ENDPOINTS.items() if name in args.endpoints}
+    # Before the services start, so their load doesn't skew it
+    calibration = calibrate()
+
+    processes = [start([sys.executable, 'openai_stub.py', '--port', '{port}'], stub_port, BACKEND_DIR, env, 'openai_stub', work_dir)]
+    results = {}
+    try:
+        if 'backend' in services:
+            processes.append(start(BACKEND_SERVERS[args.server], backend_port, BACKEND_DIR, env, 'backend', work_dir))
+        if 'ci' in services:
+            processes.append(start(CI_SERVER, ci_port, CI_DIR, env, 'ci_service', work_dir))
+
+        offset = 0
+        for name in args.endpoints:
+            service, path, payload, check = ENDPOINTS[name]
+            url = urls[service] + path
+            drive(url, payload, check, args.warmup, 1, args.users, offset)
+            offset += args.warmup
+            for concurrency in args.concurrency:
+                latencies, replies, elapsed, problems = drive(url, payload, check, args.requests, concurrency, args.users, offset)
+                offset += args.requests
+                results[f"{name} @{concurrency}"] = summarize(latencies, len(problems), elapsed)
+                print(f"{name} @{concurrency}: {len(latencies)} ok, {len(problems)} errors in {elapsed:.1f}s", file=sys.stderr)
+                for reason in sorted(set(problems)):
+                    print(f"  error: {reason[:200]}", file=sys.stderr)
+                if name == '/start-build':
+                    build_ids = [reply["build_id"] for reply in replies]
+                    builds, unfinished = wait_for_builds(urls['ci'], set(build_ids), timeout=300)
+                    span = max(b["finished_at"] for b in builds) - min(b["created_at"] for b in builds) if builds else 1
+                    results[f"start-build (finished) @{concurrency}"] = summarize(
+                        [b["finished_at"] - b["created_at"] for b in builds], unfinished, span
+                    )
+    finally:
+        for process in processes:
+            process.kill()
+        docker.shutdown()
+
+    print(f"\nServer logs are in {work_dir}\n")
+    recorded = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            recorded = json.load(f)
+    # Each way of serving the backend has its own baseline
+    baselines = recorded.setdefault(args.server, {})
+    # Only ever loosened: on a faster machine the stub's fixed latency doesn't shrink
+    scale = max(1.0, calibration / recorded['calibration']) if recorded.get('calibration') else 1.0
+    print(f"Calibration: {calibration * 1000:.0f} ms, baseline scaled by {scale:.2f}\n")
+    print_report(results, baselines, scale)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if args.update:
+        # One calibration for the whole file: all of it must come from the same machine
+        recorded['calibration'] = round(calibration, 4)
+        baselines.update(results)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline for {args.server} updated with {len(results)} results")
+        return
+
+    failures = compare(results, baselines, args.tolerance, scale)
+    if failures:
+        sys.exit("\nLatency regression:\n  " + "\n  ".join(failures))
+    print("\nOK")
+
+if __name__ == '__main__':
+    main()
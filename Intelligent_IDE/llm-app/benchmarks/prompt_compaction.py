@@ -0,0 +1,126 @@
+"""Tokens and latency saved by prompt compaction and chunked fan-out.
+
+Runs bug analysis and test generation over sample files twice: the way the
+backend used to (whole file in one prompt, max_tokens=2000) and through the
+current prompt pipeline (comments stripped, chunked, max_tokens sized from
+the input, chunks sent concurrently). Requests go to backend/openai_stub.py,
+whose delay grows with prompt size and max_tokens, so the latency figures
+are a model of API time rather than a measurement of GPT-4.
+
+    python benchmarks/prompt_compaction.py [files...]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, '..', 'backend')
+DEFAULT_SAMPLES = [
+    os.path.join(BACKEND_DIR, 'app.py'),
+    os.path.join(BACKEND_DIR, 'suite_runner.py'),
+    os.path.join(HERE, '..', 'ci_service', 'ci_service.py'),
+    os.path.join(HERE, '..', 'ui', 'ui.py'),
+]
+LANGUAGES = {'.py': 'python', '.js': 'javascript', '.ts': 'javascript', '.java': 'java', '.cpp': 'cpp', '.cs': 'csharp'}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_stub(port, latency, token_latency):
+    env = dict(os.environ, OPENAI_STUB_LATENCY=str(latency), OPENAI_STUB_TOKEN_LATENCY=str(token_latency))
+    stub = subprocess.Popen(
+        [sys.executable, 'openai_stub.py', '--port', str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return stub
+        except OSError:
+            time.sleep(0.1)
+    stub.kill()
+    sys.exit("OpenAI stub did not start")
+
+def prompt_tokens(messages):
+    from prompt_compaction import estimate_tokens
+
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', default=DEFAULT_SAMPLES)
+    parser.add_argument('--latency', type=float, default=0.2, help="stub seconds per request")
+    parser.add_argument('--token-latency', type=float, default=0.0005, help="stub seconds per token")
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ['OPENAI_API_BASE'] = f'http://127.0.0.1:{port}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    os.environ.pop('DATABASE_URL', None)
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+    from llm_cache import MemoryBackend
+
+    # Every request must reach the stub for the timings to mean anything
+    backend.llm_cache.backend = MemoryBackend(max_entries=0)
+
+    stub = start_stub(port, args.latency, args.token_latency)
+    rows = []
+    try:
+        for path in args.files:
+            language = LANGUAGES.get(os.path.splitext(path)[1])
+            if language is None:
+                continue
+            with open(path) as f:
+                code = f.read()
+
+            old_bugs = backend.bug_analysis_messages(code, language)
+            old_tests = backend.test_generation_messages(code, language)
+            _, _, bug_batches = backend.bug_analysis_plan(code, language)
+            test_prompts = backend.test_generation_requests(code, language)
+
+            rows.append({
+                "file": os.path.relpath(path, os.path.join(HERE, '..')),
+                "lines": code.count('\n') + 1,
+                "chunks": len(bug_batches),
+                "old_prompt": prompt_tokens(old_bugs) + prompt_tokens(old_tests),
+                "new_prompt": sum(prompt_tokens(batch.messages) for batch in bug_batches)
+                              + sum(prompt_tokens(m) for m, _ in test_prompts),
+                "old_max": 2 * 2000,
+                "new_max": sum(batch.max_tokens for batch in bug_batches) + sum(t for _, t in test_prompts),
+                "old_time": timed(lambda: backend.chat_completion(old_bugs, language))
+                            + timed(lambda: backend.chat_completion(old_tests, language)),
+                "new_time": timed(lambda: backend.analyze_code_for_bugs(code, language))
+                            + timed(lambda: backend.generate_tests_for_code(code, language)),
+            })
+    finally:
+        stub.kill()
+
+    header = f"{'file':<28} {'lines':>5} {'chunks':>6} {'prompt tokens':>17} {'saved':>6} {'max_tokens':>13} {'latency (s)':>13} {'saved':>6}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f"{row['file']:<28} {row['lines']:>5} {row['chunks']:>6} "
+            f"{row['old_prompt']:>8}->{row['new_prompt']:<8} {1 - row['new_prompt'] / row['old_prompt']:>6.0%} "
+            f"{row['old_max']:>6}->{row['new_max']:<6} "
+            f"{row['old_time']:>6.2f}->{row['new_time']:<6.2f} {1 - row['new_time'] / row['old_time']:>6.0%}"
+        )
+    totals = {key: sum(row[key] for row in rows) for key in ('old_prompt', 'new_prompt', 'old_time', 'new_time')}
+    print(f"\nTotal prompt tokens saved: {totals['old_prompt'] - totals['new_prompt']} "
+          f"({1 - totals['new_prompt'] / totals['old_prompt']:.0%}); "
+          f"latency saved: {totals['old_time'] - totals['new_time']:.2f}s "
+          f"({1 - totals['new_time'] / totals['old_time']:.0%})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Cold-start benchmark for the backend.
+
+Imports backend/app.py in fresh interpreters and exits non-zero when the
+median import time regresses past the recorded baseline, or when a module
+that should only load on first use is imported at startup.
+
+Import times are compared as a multiple of importing flask, timed in the
+same run, so the baseline holds on faster or slower machines.
+
+    python benchmarks/startup_time.py            # check against the baseline
+    python benchmarks/startup_time.py --update   # record a new baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, '..', 'backend')
+BASELINE_PATH = os.path.join(HERE, 'startup_baseline.json')
+
+# Timed alongside the backend module to factor out the machine's speed
+REFERENCE_MODULE = 'flask'
+
+# Heavy modules that must not be imported until a request needs them
+LAZY_MODULES = ['docker', 'openai', 'pytest', 'pylint', 'astroid', 'psycopg2', 'watchdog']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+def probe(module, env):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr}")
+    # The app prints while it starts; the measurement is the last line
+    return json.loads(result.stdout.strip().split('\n')[-1])
+
+def measure(module, runs):
+    """(median import seconds, median reference seconds, lazy modules loaded)."""
+    # Without DATABASE_URL the caches stay in memory, so no connection is timed
+    env = {k: v for k, v in os.environ.items() if k != 'DATABASE_URL'}
+    env.setdefault('OPENAI_API_KEY', 'benchmark')
+    samples, references, loaded = [], [], set()
+    for _ in range(runs):
+        # Interleaved, so a busy spell on the machine slows both alike
+        references.append(probe(REFERENCE_MODULE, env)["seconds"])
+        sample = probe(module, env)
+        samples.append(sample["seconds"])
+        loaded.update(sample["loaded"])
+    return statistics.median(samples), statistics.median(references), sorted(loaded)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help="backend module to import (app or asgi)")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown over the baseline")
+    parser.add_argument('--update', action='store_true', help="record the measurement as the new baseline")
+    args = parser.parse_args()
+
+    median, reference, loaded = measure(args.module, args.runs)
+    relative = median / reference
+    print(f"import {args.module}: median {median * 1000:.1f} ms over {args.runs} runs, "
+          f"{relative:.2f}x import {REFERENCE_MODULE} ({reference * 1000:.1f} ms)")
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+
+    if args.update:
+        baselines[args.module] = round(relative, 3)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline for {args.module} set to {relative:.2f}x import {REFERENCE_MODULE}")
+        return
+
+    failures = []
+    if loaded:
+        failures.append(f"modules imported at startup: {', '.join(loaded)}")
+    baseline = baselines.get(args.module)
+    if baseline is None:
+        print(f"No baseline for {args.module}; run with --update to record one")
+    else:
+        limit = baseline * (1 + args.tolerance)
+        print(f"baseline {baseline:.2f}x, limit {limit:.2f}x")
+        if relative > limit:
+            failures.append(f"import time {relative:.2f}x import {REFERENCE_MODULE} exceeds {limit:.2f}x")
+
+    if failures:
+        sys.exit("Startup regression: " + "; ".join(failures))
+    print("OK")
+
+if __name__ == '__main__':
+    main()
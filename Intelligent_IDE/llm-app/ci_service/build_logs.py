@@ -0,0 +1,98 @@
+import os
+import re
+import threading
+
+BUILD_ID_PATTERN = re.compile(r'^[0-9a-f]+$')
+
+def _utf8_boundary(data):
+    # Length of the longest prefix of `data` that doesn't end mid-character,
+    # so a reader never receives half of a multi-byte sequence
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            return len(data)
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) if back >= needed else len(data) - back
+    return len(data)
+
+class BuildLogStore:
+    """Append-only build logs, one file per build, addressed by byte offset.
+
+    Readers ask for everything after the offset they already have, so a
+    growing log is never sent twice; `wait` lets them block until new output
+    arrives instead of polling.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.condition = threading.Condition()
+
+    def _path(self, build_id):
+        if not BUILD_ID_PATTERN.match(build_id):
+            raise ValueError(f"Invalid build id: {build_id}")
+        return os.path.join(self.root, f"{build_id}.log")
+
+    def reset(self, build_id):
+        # A retried build starts its log over
+        open(self._path(build_id), 'wb').close()
+        with self.condition:
+            self.condition.notify_all()
+
+    def append(self, build_id, text):
+        with open(self._path(build_id), 'ab') as f:
+            f.write(text.encode())
+        with self.condition:
+            self.condition.notify_all()
+
+    def size(self, build_id):
+        try:
+            return os.path.getsize(self._path(build_id))
+        except FileNotFoundError:
+            return 0
+
+    def read(self, build_id, since=0, limit=1 << 20):
+        """Return (text, next_offset) for the log after byte offset `since`.
+
+        An offset inside a multi-byte character (only a client can make one
+        up) is moved back to the start of that character.
+        """
+        try:
+            with open(self._path(build_id), 'rb') as f:
+                start = max(0, since - 3)
+                f.seek(start)
+                data = f.read(limit + since - start)
+        except FileNotFoundError:
+            return '', since
+        # Step back over UTF-8 continuation bytes (0b10xxxxxx)
+        skip = since - start
+        while 0 < skip < len(data) and 0x80 <= data[skip] < 0xC0:
+            skip -= 1
+        data = data[skip:]
+        data = data[:_utf8_boundary(data)]
+        # A log reset while it was being read may still leave a stray byte
+        return data.decode(errors='replace'), start + skip + len(data)
+
+    def wait(self, build_id, since, timeout):
+        """Block until any log changes or `timeout` passes; True if this one grew past `since`.
+
+        Wakeups are shared between builds, so callers loop until their own deadline.
+        """
+        with self.condition:
+            if self.size(build_id) <= since:
+                self.condition.wait(timeout)
+        return self.size(build_id) > since
+
+    def notify(self):
+        # Wake followers, e.g. so they notice a build has finished
+        with self.condition:
+            self.condition.notify_all()
+
+    def purge(self, older_than):
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.log') and entry.stat().st_mtime < older_than:
+                os.remove(entry.path)
+                removed += 1
+        return removed
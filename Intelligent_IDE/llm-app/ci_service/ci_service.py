@@ -101,20 +101,49 @@
 import os
 import time
 import json
+import math
+import socket
+import sys
 import threading
 import docker
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
+# config.py, metrics.py and languages.py are shared with the backend from ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from config import get_setting
+from db import Database
+from scheduler import BuildQueue, BuildScheduler, QueueFull
+from registry import FINISHED_STATUSES, BuildRegistry, new_build_id
+from pipeline import Pipeline, parse_stages
+from image_builder import BuildCancelled, ImageBuilder, validate_dependencies
+from build_logs import BuildLogStore
+from metrics import CONTENT_TYPE, Callback, Histogram, instrument_flask, render as render_metrics
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+
+# Served at /metrics
+request_latency = Histogram(
+    "http_request_duration_seconds", "API response time, up to the first byte of a streamed response",
+    ["route", "method", "status"]
+)
+instrument_flask(app, request_latency)
+stage_duration = Histogram(
+    "ci_stage_duration_seconds", "Time each pipeline stage ran, by final status", ["stage", "status"]
+)
+build_duration = Histogram(
+    "ci_build_duration_seconds", "Pipeline wall time per build, by final status", ["status"]
+)
+
 docker_client = docker.from_env()
+image_builder = ImageBuilder(
+    docker_client, get_setting("code_execution", "execution_environments", default={}),
+    keep_images=get_setting("ci_pipeline", "keep_images", default=50)
+)
 
-# Track build status
-builds = {}
 
 def run_code_linting(code, language):
     """Placeholder function for static analysis (linting)."""
@@ -124,125 +153,248 @@ def generate_and_run_tests(code, language):
     """Placeholder function for unit testing."""
     return {"pass": True}  # Mock response
 
-def build_container(code, language, build_id):
-    """Placeholder function for building the container."""
-    return {"pass": True, "image_id": f"{build_id}-image"}  # Mock response
+def build_container(code, language, build_id, dependencies=None, log=print, cancelled=None):
+    """Build the submission image, reusing cached dependency and code layers."""
+    try:
+        image = image_builder.build(code, language, dependencies, log, cancelled)
+    except docker.errors.BuildError as e:
+        log = ''.join(chunk.get("stream", "") for chunk in e.build_log)
+        return {"pass": False, "error": str(e), "log": log[-4000:]}
+    except (BuildCancelled, ValueError, KeyError, docker.errors.APIError) as e:
+        return {"pass": False, "error": str(e)}
+    return dict(image, **{"pass": True})
 
 def deploy_container(build_id, image_id):
     """Placeholder function for deploying the container."""
     return {"pass": True}  # Mock response
 
-def run_build_pipeline(build_id, code, language):
-    """Execute the CI/CD pipeline in a separate thread."""
+# Stage name in config.yaml -> (display name, function taking the build context)
+STAGE_FUNCTIONS = {
+    "static_analysis": ("Static Analysis", lambda ctx: run_code_linting(ctx["code"], ctx["language"])),
+    "unit_testing": ("Unit Testing", lambda ctx: generate_and_run_tests(ctx["code"], ctx["language"])),
+    "build": ("Build", lambda ctx: build_container(ctx["code"], ctx["language"], ctx["build_id"], ctx["dependencies"], ctx["log"], ctx["cancelled"])),
+    "deployment": ("Deployment", lambda ctx: deploy_container(ctx["build_id"], ctx["results"]["build"].get("image_id"))),
+}
+
+pipeline = Pipeline(
+    parse_stages(get_setting("ci_pipeline", "stages", default=list(STAGE_FUNCTIONS)), STAGE_FUNCTIONS),
+    cancel_grace=get_setting("ci_pipeline", "cancel_grace", default=10)
+)
+
+def run_build_pipeline(build_id, code, language, dependencies=None):
+    """Execute the CI/CD pipeline, running independent stages concurrently."""
+    build = registry.start(build_id)
+    build_logs.reset(build_id)
+    log = lambda text: build_logs.append(build_id, text)
     try:
-        builds[build_id] = {"status": "running", "stages": []}
-
-        # Stage 1: Static Analysis
-        builds[build_id]["stages"].append({
-            "name": "Static Analysis",
-            "status": "running",
-            "start_time": time.time()
-        })
-        
-        # Run code linting based on language
-        linting_results = run_code_linting(code, language)
-        
-        builds[build_id]["stages"][-1].update({
-            "status": "completed" if linting_results["pass"] else "failed",
-            "end_time": time.time(),
-            "results": linting_results
-        })
-        
-        if not linting_results["pass"] and linting_results.get("critical", False):
-            builds[build_id]["status"] = "failed"
-            return
-        
-        # Stage 2: Unit Testing
-        builds[build_id]["stages"].append({
-            "name": "Unit Testing",
-            "status": "running",
-            "start_time": time.time()
-        })
-        
-        # Generate and run tests
-        test_results = generate_and_run_tests(code, language)
-        
-        builds[build_id]["stages"][-1].update({
-            "status": "completed" if test_results["pass"] else "failed",
-            "end_time": time.time(),
-            "results": test_results
-        })
-        
-        if not test_results["pass"]:
-            builds[build_id]["status"] = "failed"
-            return
-        
-        # Stage 3: Build
-        builds[build_id]["stages"].append({
-            "name": "Build",
-            "status": "running",
-            "start_time": time.time()
-        })
-        
-        # Build code into container
-        build_results = build_container(code, language, build_id)
-        
-        builds[build_id]["stages"][-1].update({
-            "status": "completed" if build_results["pass"] else "failed",
-            "end_time": time.time(),
-            "results": build_results
-        })
-        
-        if not build_results["pass"]:
-            builds[build_id]["status"] = "failed"
-            return
-        
-        # Stage 4: Deployment
-        builds[build_id]["stages"].append({
-            "name": "Deployment",
-            "status": "running",
-            "start_time": time.time()
-        })
-        
-        # Deploy container
-        deploy_results = deploy_container(build_id, build_results.get("image_id"))
-        
-        builds[build_id]["stages"][-1].update({
-            "status": "completed" if deploy_results["pass"] else "failed",
-            "end_time": time.time(),
-            "results": deploy_results
-        })
-        
-        builds[build_id]["status"] = "completed" if deploy_results["pass"] else "failed"
-    
+        log(f"=== Build {build_id} started ===\n")
+        pipeline.run(
+            {"build_id": build_id, "code": code, "language": language, "dependencies": dependencies or []},
+            build,
+            on_update=lambda: registry.save(build_id),
+            log=log
+        )
     except Exception as e:
-        builds[build_id]["status"] = "failed"
-        builds[build_id]["error"] = str(e)
+        build["status"] = "failed"
+        build["error"] = str(e)
+        log(f"Pipeline error: {e}\n")
+    finally:
+        log(f"=== Build {build['status']} ===\n")
+        registry.save(build_id)
+        build_logs.notify()
+        record_build(build)
+
+def record_build(build):
+    for stage in build.get("stages", []):
+        if stage.get("end_time") is not None:
+            stage_duration.observe(stage["end_time"] - stage["start_time"], stage["name"], stage["status"])
+    wall_time = (build.get("critical_path") or {}).get("wall_time")
+    if wall_time is not None:
+        build_duration.observe(wall_time, build["status"])
+
+def run_build_job(build_id, payload):
+    """Run one queued build and return its final status."""
+    run_build_pipeline(build_id, payload["code"], payload["language"], payload.get("dependencies"))
+    return registry.get(build_id)["status"]
+
+# Builds are queued and recorded in SQLite locally, or in the compose Postgres when DATABASE_URL is set
+build_db = Database(os.getenv("DATABASE_URL") or get_setting("ci_pipeline", "scheduler", "database", default="ci_builds.db"))
+registry = BuildRegistry(build_db)
+build_logs = BuildLogStore(os.getenv("BUILD_LOG_DIR") or get_setting("ci_pipeline", "logs", "path", default="ci_build_logs"))
+# Names this instance's claims on a shared queue; a restarted container keeps its hostname
+build_queue = BuildQueue(build_db, os.getenv("CI_INSTANCE_ID") or socket.gethostname())
+scheduler = BuildScheduler(
+    build_queue,
+    run_build_job,
+    workers=get_setting("ci_pipeline", "scheduler", "workers", default=4),
+    per_user_limit=get_setting("ci_pipeline", "scheduler", "per_user_concurrency", default=2),
+    max_queued=get_setting("ci_pipeline", "scheduler", "max_queued", default=100),
+    max_attempts=get_setting("ci_pipeline", "scheduler", "max_attempts", default=3),
+    heartbeat_interval=get_setting("ci_pipeline", "scheduler", "heartbeat_interval", default=15),
+    stale_after=get_setting("ci_pipeline", "scheduler", "stale_after", default=60),
+    on_recover=registry.mark
+)
+
+def running_builds():
+    with scheduler.condition:
+        return {(): sum(scheduler.running_by_user.values())}
+
+# Read from the queue table and the scheduler when scraped
+Callback("ci_queue_depth", "Builds queued and waiting for a worker", collect=lambda: {(): build_queue.depth()})
+Callback("ci_running_builds", "Builds running in this process", collect=running_builds)
 
 # Flask API Endpoints
 @app.route('/start-build', methods=['POST'])
 def start_build():
     """API endpoint to start a build."""
-    data = request.json
-    build_id = str(int(time.time()))  # Unique build ID
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    build_id = new_build_id()
     code = data.get("code", "")
     language = data.get("language", "")
+    user_id = request.headers.get("X-User-Id") or data.get("user") or request.remote_addr
+    # Optional package specs (e.g. "requests==2.31.0", "lodash@4"), installed in a cached layer
+    dependencies = data.get("dependencies", [])
 
     if not code or not language:
         return jsonify({"error": "Missing code or language"}), 400
+    try:
+        priority = int(data.get("priority", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "priority must be an integer"}), 400
+    if not isinstance(dependencies, list) or not all(isinstance(spec, str) for spec in dependencies):
+        return jsonify({"error": "dependencies must be a list of package specs"}), 400
+    try:
+        validate_dependencies(language, dependencies)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    threading.Thread(target=run_build_pipeline, args=(build_id, code, language)).start()
+    registry.create(build_id, user_id)
+    try:
+        scheduler.submit(build_id, user_id, {"code": code, "language": language, "dependencies": dependencies}, priority)
+    except QueueFull as e:
+        registry.discard(build_id)
+        response = jsonify({"error": str(e), "retry_after": e.retry_after})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
 
-    return jsonify({"message": "Build started", "build_id": build_id}), 202
+    return jsonify({"message": "Build queued", "build_id": build_id}), 202
 
 @app.route('/build-status/<build_id>', methods=['GET'])
 def get_build_status(build_id):
     """API endpoint to fetch build status."""
-    if build_id not in builds:
+    build = registry.get(build_id)
+    if build is None:
         return jsonify({"error": "Build ID not found"}), 404
     
-    return jsonify(builds[build_id])
+    return jsonify(build)
+
+@app.route('/builds', methods=['GET'])
+def list_builds():
+    """API endpoint to page through builds, newest first."""
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    page, next_cursor = registry.list(
+        user_id=request.args.get("user"),
+        status=request.args.get("status"),
+        limit=limit,
+        cursor=request.args.get("cursor")
+    )
+    return jsonify({"builds": page, "next_cursor": next_cursor})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """API endpoint exposing service metrics in the Prometheus text format."""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+def build_finished(build_id):
+    build = registry.get(build_id)
+    return build is not None and build["status"] in FINISHED_STATUSES
+
+@app.route('/build-logs/<build_id>', methods=['GET'])
+def get_build_logs(build_id):
+    """API endpoint to read a build log from a byte offset, optionally waiting for new output."""
+    if registry.get(build_id) is None:
+        return jsonify({"error": "Build ID not found"}), 404
+    try:
+        since = max(int(request.args.get("since", 0)), 0)
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return jsonify({"error": "since must be an integer and wait a number of seconds"}), 400
+    if not math.isfinite(wait):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    wait = min(wait, 30)
+
+    # Long-poll: hold the request until there is new output or the build ends
+    deadline = time.time() + wait
+    while time.time() < deadline and build_logs.size(build_id) == since and not build_finished(build_id):
+        build_logs.wait(build_id, since, deadline - time.time())
+
+    size = build_logs.size(build_id)
+    # The log starts over when a build is retried, invalidating old offsets
+    reset = since > size
+    text, next_offset = build_logs.read(build_id, 0 if reset else since)
+    return jsonify({
+        "data": text,
+        "next_offset": next_offset,
+        "reset": reset,
+        "finished": build_finished(build_id) and next_offset >= size
+    })
+
+@app.route('/build-logs/<build_id>/stream', methods=['GET'])
+def stream_build_logs(build_id):
+    """API endpoint to follow a build log as Server-Sent Events."""
+    if registry.get(build_id) is None:
+        return jsonify({"error": "Build ID not found"}), 404
+    # EventSource resends the last event id on reconnect, so resume from there
+    try:
+        since = max(int(request.headers.get("Last-Event-ID") or request.args.get("since", 0)), 0)
+    except ValueError:
+        return jsonify({"error": "since must be an integer"}), 400
+
+    def events(offset):
+        while True:
+            finished = build_finished(build_id)
+            if offset > build_logs.size(build_id):
+                offset = 0
+            text, next_offset = build_logs.read(build_id, offset)
+            if text:
+                offset = next_offset
+                yield f"id: {offset}\nevent: log\ndata: {json.dumps({'data': text})}\n\n"
+                continue
+            if finished:
+                yield f"event: done\ndata: {json.dumps({'status': registry.get(build_id)['status']})}\n\n"
+                return
+            if not build_logs.wait(build_id, offset, 15):
+                # Comment line keeps idle connections open through proxies
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(events(since)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def compact_builds():
+    """Periodically trim old finished builds so the registry stays bounded."""
+    compact_after = get_setting("ci_pipeline", "retention", "compact_after_days", default=1) * 86400
+    retention = get_setting("ci_pipeline", "retention", "keep_days", default=30) * 86400
+    while True:
+        deleted, compacted = registry.compact(compact_after, retention)
+        build_queue.purge(time.time() - compact_after)
+        build_logs.purge(time.time() - retention)
+        if deleted or compacted:
+            print(f"Build registry: deleted {deleted}, compacted {compacted}")
+        time.sleep(3600)
 
 if __name__ == '__main__':
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves
+    # requests, so only it should run builds
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        scheduler.start()
+        threading.Thread(target=compact_builds, daemon=True).start()
     app.run(debug=True)
 
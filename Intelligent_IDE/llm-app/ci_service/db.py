@@ -0,0 +1,73 @@
+import contextlib
+import sqlite3
+import threading
+
+class Database:
+    """Thin DB-API wrapper over SQLite (local default) or Postgres (compose `db`).
+
+    Queries use `?` placeholders and are translated for psycopg2.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.postgres = url.startswith('postgres')
+        if self.postgres:
+            self.conn = self._connect()
+            self.placeholder = '%s'
+            self.begin = 'BEGIN'
+        else:
+            path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+            self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.placeholder = '?'
+            # Take the write lock up front so two processes can't both read and then deadlock upgrading
+            self.begin = 'BEGIN IMMEDIATE'
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.url)
+        conn.autocommit = True
+        return conn
+
+    def execute(self, sql, params=()):
+        # Returns all rows for queries and the affected row count otherwise
+        with self.lock:
+            return self._execute(sql, params)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run statements atomically: `with db.transaction() as execute: execute(sql, params)`."""
+        with self.lock:
+            self._execute(self.begin)
+            try:
+                yield self._execute
+            except BaseException:
+                try:
+                    self._execute('ROLLBACK')
+                except Exception:
+                    pass  # e.g. the connection is gone, which ends the transaction too
+                raise
+            self._execute('COMMIT')
+
+    def add_column(self, table, column, definition):
+        # For tables created before the column existed
+        try:
+            self.execute(f"SELECT {column} FROM {table} LIMIT 0")
+        except Exception:
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _execute(self, sql, params=()):
+        if self.postgres and self.conn.closed:
+            # The connection was lost with an earlier error; start a new one
+            self.conn = self._connect()
+        sql = sql.replace('?', self.placeholder)
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            if cur.description is not None:
+                return cur.fetchall()
+            return cur.rowcount
+        finally:
+            cur.close()
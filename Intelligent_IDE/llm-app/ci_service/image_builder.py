@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import docker
+
+from languages import csharp_project, find_java_main_class
+
+# Dependency layer: everything that only changes when the dependency list does.
+# (manifest file name, Dockerfile); the manifest is rendered by dependency_manifest
+DEPENDENCY_LAYERS = {
+    'python': ('requirements.txt', """FROM {base}
+WORKDIR /app
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+"""),
+    'javascript': ('package.json', """FROM {base}
+WORKDIR /app
+COPY package.json .
+RUN npm install --omit=dev
+"""),
+    'csharp': ('app.csproj', """FROM {base}
+WORKDIR /app
+COPY app.csproj .
+RUN dotnet restore
+"""),
+    'java': (None, """FROM {base}
+WORKDIR /app
+"""),
+    'cpp': (None, """FROM {base}
+WORKDIR /app
+"""),
+}
+
+# Application layer: built on top of the dependency image, so a code change
+# only rebuilds this part
+APP_LAYERS = {
+    'python': ('main.py', """FROM {deps}
+COPY main.py .
+CMD ["python", "main.py"]
+"""),
+    'javascript': ('main.js', """FROM {deps}
+COPY main.js .
+CMD ["node", "main.js"]
+"""),
+    'csharp': ('Program.cs', """FROM {deps}
+COPY Program.cs .
+RUN dotnet publish -c Release -o out --no-restore
+CMD ["dotnet", "out/app.dll"]
+"""),
+    'java': ('{main_class}.java', """FROM {deps}
+COPY {main_class}.java .
+RUN javac {main_class}.java
+CMD ["java", "{main_class}"]
+"""),
+    'cpp': ('main.cpp', """FROM {deps}
+COPY main.cpp .
+RUN g++ -O2 main.cpp -o main
+CMD ["./main"]
+"""),
+}
+
+# Accepted package specs. Specs end up verbatim in requirements.txt and in
+# the csproj's XML, so anything beyond a name, extras and a version
+# constraint (options, newlines, quotes, URLs) is refused
+_VERSION = r'[A-Za-z0-9.*+!_-]+'
+DEPENDENCY_SPECS = {
+    'python': re.compile(
+        rf'[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?(?:\[[A-Za-z0-9._-]+(?:,[A-Za-z0-9._-]+)*\])?'
+        rf'(?:(?:===|==|!=|~=|<=|>=|<|>){_VERSION}(?:,(?:===|==|!=|~=|<=|>=|<|>){_VERSION})*)?'
+    ),
+    # name@version, the name optionally scoped as @scope/name
+    'javascript': re.compile(r'(?:@[a-z0-9][a-z0-9._-]*/)?[a-z0-9][a-z0-9._-]*(?:@[A-Za-z0-9.^~<>=*+-]+)?'),
+    # Id@version, the version a NuGet version or range such as [1.0,2.0)
+    'csharp': re.compile(r'[A-Za-z0-9_][A-Za-z0-9._-]*(?:@[A-Za-z0-9.*+\[\](),-]+)?'),
+}
+
+class BuildCancelled(Exception):
+    pass
+
+def _split_spec(spec):
+    # "name@version"; a leading @ is part of a scoped npm name, e.g. "@types/node@20"
+    name, _, version = spec.rpartition('@')
+    if not name:
+        return spec, None
+    return name, version or None
+
+def validate_dependencies(language, dependencies):
+    pattern = DEPENDENCY_SPECS.get(language)
+    if dependencies and pattern is None:
+        raise ValueError(f"Dependencies are not supported for {language} builds")
+    for spec in dependencies:
+        if not pattern.fullmatch(spec):
+            raise ValueError(f"Invalid {language} dependency: {spec!r}")
+
+def dependency_manifest(language, dependencies):
+    # Render the language's manifest file for a list of validated package specs
+    if language == 'python':
+        return '\n'.join(dependencies) + '\n'
+    if language == 'javascript':
+        packages = dict(_split_spec(spec) for spec in dependencies)
+        return json.dumps({"name": "app", "private": True,
+                           "dependencies": {name: version or "*" for name, version in packages.items()}}, indent=2)
+    if language == 'csharp':
+        return csharp_project([(name, version or "*") for name, version in map(_split_spec, dependencies)])
+    return None
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+class ImageBuilder:
+    """Builds submission images in two cached layers: dependencies, then code.
+
+    Both images are tagged with a hash of their inputs, so an identical
+    resubmission reuses the finished image and a code-only change reuses the
+    dependency image. Every code change leaves the previous app image behind,
+    so after each new one only the `keep_images` most recently built or
+    reused app images are kept.
+    """
+
+    def __init__(self, client, environments, image_prefix='intelligent-ide', keep_images=50):
+        self.client = client
+        self.environments = environments
+        self.image_prefix = image_prefix
+        self.keep_images = keep_images
+        self.last_used = {}  # app tag -> when this process last built or reused it
+        self.prune_lock = threading.Lock()
+
+    def _image_exists(self, tag):
+        try:
+            return self.client.images.get(tag)
+        except docker.errors.ImageNotFound:
+            return None
+
+    def _build(self, tag, dockerfile, files, log, cancelled):
+        if cancelled.is_set():
+            raise BuildCancelled(f"Build of {tag} cancelled")
+        with tempfile.TemporaryDirectory(prefix='image-') as context_dir:
+            for name, content in dict(files, Dockerfile=dockerfile).items():
+                with open(os.path.join(context_dir, name), 'w') as f:
+                    f.write(content)
+            # The low-level API streams build output as it happens
+            build_log = []
+            stream = self.client.api.build(path=context_dir, tag=tag, rm=True, pull=False, decode=True)
+            try:
+                for chunk in stream:
+                    if cancelled.is_set():
+                        # Dropping the connection makes the daemon abandon the build
+                        raise BuildCancelled(f"Build of {tag} cancelled")
+                    build_log.append(chunk)
+                    if 'stream' in chunk:
+                        log(chunk['stream'])
+                    if 'error' in chunk:
+                        raise docker.errors.BuildError(chunk['error'], build_log)
+            finally:
+                stream.close()
+        return self.client.images.get(tag)
+
+    def prune(self):
+        """Remove the app images beyond the `keep_images` most recently used ones.
+
+        Images this process hasn't used rank by creation time; images still
+        in use by a container are left for a later prune.
+        """
+        repository = f"{self.image_prefix}/build"
+        with self.prune_lock:
+            ranked = []
+            # One request for the whole list; images.list() would inspect every image again
+            for image in self.client.api.images(name=repository):
+                for tag in image.get('RepoTags') or []:
+                    if tag.startswith(repository + ':'):
+                        ranked.append((max(image['Created'], self.last_used.get(tag, 0)), tag))
+            ranked.sort(reverse=True)
+            for _, tag in ranked[self.keep_images:]:
+                try:
+                    self.client.images.remove(tag)
+                except docker.errors.ImageNotFound:
+                    pass
+                except docker.errors.APIError as e:
+                    print(f"Keeping superseded image {tag}: {e}")
+                    continue
+                self.last_used.pop(tag, None)
+                print(f"Removed superseded image {tag}")
+
+    def build(self, code, language, dependencies=None, log=lambda text: None, cancelled=None):
+        """Build (or reuse) the image for a submission.
+
+        `cancelled` is a threading.Event; once it is set, the build stops at
+        the next step or line of build output and raises BuildCancelled.
+        """
+        cancelled = cancelled or threading.Event()
+        if language not in APP_LAYERS:
+            raise ValueError(f"Container builds not supported for language: {language}")
+        base = self.environments[language]['image']
+        dependencies = sorted(dependencies or [])
+        validate_dependencies(language, dependencies)
+
+        deps_tag = f"{self.image_prefix}/deps-{language}:{_digest(base, dependencies)}"
+        if not self._image_exists(deps_tag):
+            manifest_name, dockerfile = DEPENDENCY_LAYERS[language]
+            manifest = dependency_manifest(language, dependencies)
+            files = {manifest_name: manifest} if manifest_name else {}
+            log(f"Building dependency image {deps_tag}\n")
+            self._build(deps_tag, dockerfile.format(base=base), files, log, cancelled)
+        else:
+            log(f"Reusing dependency image {deps_tag}\n")
+
+        app_tag = f"{self.image_prefix}/build:{_digest(deps_tag, language, code)}"
+        image = self._image_exists(app_tag)
+        if image:
+            self.last_used[app_tag] = time.time()
+            log(f"Reusing image {app_tag}\n")
+            return {"image_id": image.id, "tag": app_tag, "cached": True}
+
+        source_name, dockerfile = APP_LAYERS[language]
+        main_class = find_java_main_class(code) if language == 'java' else None
+        image = self._build(
+            app_tag,
+            dockerfile.format(deps=deps_tag, main_class=main_class),
+            {source_name.format(main_class=main_class): code},
+            log,
+            cancelled
+        )
+        self.last_used[app_tag] = time.time()
+        try:
+            self.prune()
+        except docker.errors.APIError as e:
+            # The build itself succeeded
+            print(f"Pruning superseded images failed: {e}")
+        return {"image_id": image.id, "tag": app_tag, "cached": False}
@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+class PipelineError(Exception):
+    pass
+
+class Stage:
+    def __init__(self, name, label, func, depends_on=()):
+        self.name = name
+        self.label = label
+        self.func = func
+        self.depends_on = list(depends_on)
+
+def parse_stages(entries, stage_functions):
+    """Build Stage objects from the config.yaml `ci_pipeline.stages` list.
+
+    An entry is either a stage name, which depends on the entry before it, or a
+    mapping with `name` and an explicit `depends_on` list.
+    """
+    stages = []
+    previous = None
+    for entry in entries:
+        if isinstance(entry, str):
+            name, depends_on = entry, [previous] if previous else []
+        else:
+            name, depends_on = entry['name'], entry.get('depends_on', [])
+        if name not in stage_functions:
+            raise PipelineError(f"Unknown pipeline stage: {name}")
+        label, func = stage_functions[name]
+        stages.append(Stage(name, label, func, depends_on))
+        previous = name
+    return stages
+
+def topological_order(stages):
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in by_name:
+                raise PipelineError(f"Stage {stage.name} depends on unknown stage {dependency}")
+
+    order = []
+    remaining = {stage.name: set(stage.depends_on) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise PipelineError(f"Pipeline stages form a cycle: {', '.join(remaining)}")
+        for name in ready:
+            order.append(by_name[name])
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+def critical_path(stages, records):
+    """Longest chain of dependent stages by duration, i.e. what bounds the build time."""
+    longest = {}
+    for stage in topological_order(stages):
+        record = records.get(stage.name)
+        if record is None or "end_time" not in record:
+            continue
+        duration = record["end_time"] - record["start_time"]
+        best = max(
+            (longest[dep] for dep in stage.depends_on if dep in longest),
+            key=lambda item: item[0],
+            default=(0.0, [])
+        )
+        longest[stage.name] = (best[0] + duration, best[1] + [stage.name])
+
+    if not longest:
+        return {"stages": [], "duration": 0.0}
+    total, path = max(longest.values(), key=lambda item: item[0])
+    return {"stages": path, "duration": round(total, 3)}
+
+class Pipeline:
+    """Runs stages as a DAG: independent stages overlap, and the first blocking
+    failure cancels everything that has not finished yet."""
+
+    def __init__(self, stages, max_parallel=None, cancel_grace=10):
+        self.stages = topological_order(stages)
+        self.max_parallel = max_parallel or len(stages)
+        # Seconds a cancelled build waits for running stages to stop
+        self.cancel_grace = cancel_grace
+
+    def run(self, context, build, on_update=lambda: None, log=lambda text: None):
+        """Run every stage for one build, recording progress in `build`.
+
+        Stage functions receive `context`, which also carries the results of
+        earlier stages, a `cancelled` event that long-running stages should
+        check, and `log` for their output. A failed result blocks the build
+        unless it sets `critical` False. Stages still running `cancel_grace`
+        seconds after a cancellation are recorded as cancelled and left to
+        finish in the background.
+        """
+        cancelled = threading.Event()
+        context = dict(context, results={}, cancelled=cancelled, log=log)
+        records = {}
+        pending = list(self.stages)
+        running = {}
+        blocked = False
+        started = time.time()
+        deadline = None
+
+        executor = ThreadPoolExecutor(self.max_parallel)
+        try:
+            while pending or running:
+                if not cancelled.is_set():
+                    for stage in [s for s in pending if all(dep in context["results"] for dep in s.depends_on)]:
+                        pending.remove(stage)
+                        records[stage.name] = {"name": stage.label, "status": "running", "start_time": time.time()}
+                        build["stages"].append(records[stage.name])
+                        log(f"[{stage.label}] started\n")
+                        running[executor.submit(stage.func, context)] = stage
+                    on_update()
+
+                if not running:
+                    break
+                timeout = None if deadline is None else max(0, deadline - time.time())
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # Past the grace period: stop waiting for stages that ignore the event
+                    for future, stage in running.items():
+                        records[stage.name].update({"status": "cancelled", "end_time": time.time()})
+                        log(f"[{stage.label}] cancelled, still stopping\n")
+                    running.clear()
+                    on_update()
+                    break
+                for future in done:
+                    stage = running.pop(future)
+                    record = records[stage.name]
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = {"pass": False, "error": str(e)}
+                    record.update({
+                        "status": "cancelled" if blocked else ("completed" if results["pass"] else "failed"),
+                        "end_time": time.time(),
+                        "results": results
+                    })
+                    duration = record["end_time"] - record["start_time"]
+                    log(f"[{stage.label}] {record['status']} in {duration:.1f}s"
+                        + (f": {results['error']}" if results.get("error") else "") + "\n")
+                    if not blocked:
+                        context["results"][stage.name] = results
+                    if not results["pass"] and results.get("critical", True) and not blocked:
+                        # Fail fast: stop scheduling and tell running siblings to give up
+                        blocked = True
+                        cancelled.set()
+                        deadline = time.time() + self.cancel_grace
+                on_update()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for stage in pending:
+            build["stages"].append({"name": stage.label, "status": "skipped"})
+            log(f"[{stage.label}] skipped\n")
+        build["status"] = "failed" if blocked else "completed"
+        build["critical_path"] = critical_path(self.stages, records)
+        build["critical_path"]["wall_time"] = round(time.time() - started, 3)
@@ -0,0 +1,147 @@
+import json
+import secrets
+import threading
+import time
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+def new_build_id():
+    # Millisecond timestamp prefix keeps ids time-ordered for keyset pagination;
+    # the random suffix keeps builds submitted in the same millisecond apart
+    return f"{int(time.time() * 1000):012x}{secrets.token_hex(6)}"
+
+class BuildRegistry:
+    """Persistent record of every build, indexed by user, status and time.
+
+    Builds still in progress are also held in memory, so status polling never
+    touches the database for them; finished builds are a primary-key lookup.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.active = {}
+        self.lock = threading.Lock()
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS builds (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at DOUBLE PRECISION NOT NULL,
+                finished_at DOUBLE PRECISION,
+                compacted INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS builds_user ON builds (user_id, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS builds_status ON builds (status, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS builds_finished ON builds (finished_at)")
+
+    def create(self, build_id, user_id):
+        record = {"status": "queued", "stages": []}
+        with self.lock:
+            self.active[build_id] = record
+        self.db.execute(
+            "INSERT INTO builds (id, user_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+            (build_id, user_id, record["status"], time.time(), json.dumps(record))
+        )
+        return record
+
+    def start(self, build_id):
+        """Return a fresh in-memory record for a build that is about to run."""
+        record = {"status": "running", "stages": []}
+        with self.lock:
+            self.active[build_id] = record
+        self.save(build_id)
+        return record
+
+    def save(self, build_id):
+        # Persist the in-memory record; finished builds leave the active set
+        with self.lock:
+            record = self.active.get(build_id)
+            if record is None:
+                return
+            finished = record["status"] in FINISHED_STATUSES
+            if finished:
+                del self.active[build_id]
+        self.db.execute(
+            "UPDATE builds SET status = ?, finished_at = ?, data = ? WHERE id = ?",
+            (record["status"], time.time() if finished else None, json.dumps(record), build_id)
+        )
+
+    def mark(self, execute, build_id, status):
+        """Record a status set by the queue rather than by the build's run, e.g.
+        requeued or given up after a restart; `execute` runs the queue's transaction."""
+        rows = execute("SELECT data FROM builds WHERE id = ?", (build_id,))
+        if not rows:
+            return
+        record = json.loads(rows[0][0])
+        record["status"] = status
+        if status == 'queued':
+            record["stages"] = []
+        else:
+            record["error"] = "The build was interrupted too many times"
+        finished = status in FINISHED_STATUSES
+        execute(
+            "UPDATE builds SET status = ?, finished_at = ?, data = ? WHERE id = ?",
+            (status, time.time() if finished else None, json.dumps(record), build_id)
+        )
+        with self.lock:
+            self.active.pop(build_id, None)
+
+    def discard(self, build_id):
+        with self.lock:
+            self.active.pop(build_id, None)
+        self.db.execute("DELETE FROM builds WHERE id = ?", (build_id,))
+
+    def get(self, build_id):
+        with self.lock:
+            record = self.active.get(build_id)
+        if record is not None:
+            return record
+        rows = self.db.execute("SELECT data FROM builds WHERE id = ?", (build_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def list(self, user_id=None, status=None, limit=50, cursor=None):
+        """Newest first; pass the returned cursor back to get the next page."""
+        sql = "SELECT id, user_id, status, created_at, finished_at FROM builds WHERE 1 = 1"
+        params = []
+        if user_id:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        if cursor:
+            sql += " AND id < ?"
+            params.append(cursor)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self.db.execute(sql, params)
+        page = [
+            {"build_id": row[0], "user": row[1], "status": row[2], "created_at": row[3], "finished_at": row[4]}
+            for row in rows[:limit]
+        ]
+        next_cursor = page[-1]["build_id"] if len(rows) > limit else None
+        return page, next_cursor
+
+    def compact(self, compact_after, retention):
+        """Drop stage results from old finished builds and delete expired ones."""
+        now = time.time()
+        deleted = self.db.execute(
+            "DELETE FROM builds WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (now - retention,)
+        )
+        rows = self.db.execute(
+            "SELECT id, data FROM builds WHERE finished_at IS NOT NULL AND finished_at < ? AND compacted = 0 LIMIT 1000",
+            (now - compact_after,)
+        )
+        for build_id, data in rows:
+            record = json.loads(data)
+            for stage in record.get("stages", []):
+                stage.pop("results", None)
+            self.db.execute(
+                "UPDATE builds SET data = ?, compacted = 1 WHERE id = ?",
+                (json.dumps(record), build_id)
+            )
+        return deleted, len(rows)
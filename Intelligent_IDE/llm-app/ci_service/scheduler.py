@@ -0,0 +1,248 @@
+import json
+import threading
+import time
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Build queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+class BuildQueue:
+    """Persistent build job queue; jobs survive restarts of the CI service.
+
+    Several CI service instances can share the queue. A running job records
+    the instance that claimed it (`owner`), which keeps its heartbeat fresh;
+    only jobs of this instance or with a stale heartbeat are ever reclaimed.
+    """
+
+    def __init__(self, db, owner):
+        self.db = db
+        self.owner = owner
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS build_jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at DOUBLE PRECISION NOT NULL,
+                started_at DOUBLE PRECISION,
+                finished_at DOUBLE PRECISION,
+                owner TEXT,
+                heartbeat_at DOUBLE PRECISION
+            )
+        """)
+        self.db.add_column("build_jobs", "owner", "TEXT")
+        self.db.add_column("build_jobs", "heartbeat_at", "DOUBLE PRECISION")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS build_jobs_pending ON build_jobs (status, priority, created_at)"
+        )
+
+    def enqueue(self, job_id, user_id, priority, payload):
+        self.db.execute(
+            "INSERT INTO build_jobs (id, user_id, priority, status, payload, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, user_id, priority, json.dumps(payload), time.time())
+        )
+
+    def depth(self):
+        return self.db.execute("SELECT COUNT(*) FROM build_jobs WHERE status = 'queued'")[0][0]
+
+    def claim(self, busy_users):
+        # Highest priority first, oldest first within a priority, skipping users at their limit
+        sql = "SELECT id, user_id, payload FROM build_jobs WHERE status = 'queued'"
+        params = []
+        if busy_users:
+            sql += f" AND user_id NOT IN ({', '.join('?' for _ in busy_users)})"
+            params.extend(busy_users)
+        sql += " ORDER BY priority DESC, created_at ASC LIMIT 1"
+
+        rows = self.db.execute(sql, params)
+        if not rows:
+            return None
+        job_id, user_id, payload = rows[0]
+        now = time.time()
+        claimed = self.db.execute(
+            "UPDATE build_jobs SET status = 'running', owner = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+            "WHERE id = ? AND status = 'queued'",
+            (self.owner, now, now, job_id)
+        )
+        if not claimed:
+            return None
+        return job_id, user_id, json.loads(payload)
+
+    def finish(self, job_id, status):
+        # A job reclaimed by another instance in the meantime is theirs now
+        self.db.execute(
+            "UPDATE build_jobs SET status = ?, finished_at = ? WHERE id = ? AND status = 'running' AND owner = ?",
+            (status, time.time(), job_id, self.owner)
+        )
+
+    def heartbeat(self):
+        self.db.execute(
+            "UPDATE build_jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+            (time.time(), self.owner)
+        )
+
+    def purge(self, older_than):
+        # Finished jobs only matter for their build record, which the registry keeps
+        return self.db.execute(
+            "DELETE FROM build_jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+            (older_than,)
+        )
+
+    def recover(self, max_attempts, stale_before, own=True, on_change=None):
+        """Requeue running jobs whose instance stopped: jobs whose heartbeat is
+        older than `stale_before` and, with `own`, every job this instance owns
+        (as after a restart). Jobs that already used up their attempts are failed.
+
+        `on_change(execute, job_id, status)` runs in the same transaction, so the
+        build's record changes with its job. Returns [(job_id, new status)].
+        """
+        reclaimable = "status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?" + (" OR owner = ?)" if own else ")")
+        params = (stale_before, self.owner) if own else (stale_before,)
+        changed = []
+        with self.db.transaction() as execute:
+            for job_id, attempts in execute(f"SELECT id, attempts FROM build_jobs WHERE {reclaimable}", params):
+                if attempts >= max_attempts:
+                    status, finished_at = 'failed', time.time()
+                else:
+                    status, finished_at = 'queued', None
+                # Postgres rechecks the condition on the locked row, so two instances can't both reclaim it
+                if execute(
+                    f"UPDATE build_jobs SET status = ?, owner = NULL, finished_at = ? WHERE id = ? AND {reclaimable}",
+                    (status, finished_at, job_id) + params
+                ):
+                    if on_change:
+                        on_change(execute, job_id, status)
+                    changed.append((job_id, status))
+        return changed
+
+class BuildScheduler:
+    """Bounded pool of build workers fed from a BuildQueue.
+
+    At most `workers` builds run at once, at most `per_user_limit` of them for
+    the same user, and submissions beyond `max_queued` are refused. Running
+    jobs heartbeat every `heartbeat_interval` seconds; jobs of any instance
+    that stay silent for `stale_after` seconds are requeued.
+    """
+
+    def __init__(self, queue, run_job, workers=4, per_user_limit=2, max_queued=100, max_attempts=3,
+                 heartbeat_interval=15, stale_after=60, on_recover=None):
+        self.queue = queue
+        self.run_job = run_job
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.on_recover = on_recover
+        self.running_by_user = {}
+        self.unfinished = {}  # job id -> final status the queue has yet to record
+        self.condition = threading.Condition()
+        # Rolling average build time, used for Retry-After hints
+        self.avg_duration = 30.0
+
+    def start(self):
+        self._recover(own=True)
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"build-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="build-heartbeat", daemon=True).start()
+
+    def _recover(self, own):
+        changed = self.queue.recover(self.max_attempts, time.time() - self.stale_after, own, self.on_recover)
+        for job_id, status in changed:
+            if status == 'queued':
+                print(f"Requeued build {job_id}, interrupted before it finished")
+            else:
+                print(f"Build {job_id} failed after {self.max_attempts} interrupted attempts")
+        if changed:
+            with self.condition:
+                self.condition.notify_all()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self._record_unfinished()
+                self.queue.heartbeat()
+                self._recover(own=False)
+            except Exception as e:
+                print(f"Build queue heartbeat failed: {e}")
+
+    def _finish(self, job_id, status):
+        try:
+            self.queue.finish(job_id, status)
+        except Exception as e:
+            # Retried by the heartbeat; until then the job still counts as running here
+            print(f"Recording build {job_id} as {status} failed: {e}")
+            with self.condition:
+                self.unfinished[job_id] = status
+
+    def _record_unfinished(self):
+        with self.condition:
+            pending = list(self.unfinished.items())
+        for job_id, status in pending:
+            self.queue.finish(job_id, status)
+            with self.condition:
+                del self.unfinished[job_id]
+
+    def retry_after(self, depth):
+        # Time for the backlog ahead of a new submission to drain
+        return max(1, int(depth * self.avg_duration / self.workers))
+
+    def submit(self, job_id, user_id, payload, priority=0):
+        with self.condition:
+            depth = self.queue.depth()
+            if depth >= self.max_queued:
+                raise QueueFull(self.retry_after(depth))
+            self.queue.enqueue(job_id, user_id, priority, payload)
+            self.condition.notify()
+
+    def _claim(self):
+        busy = [user for user, count in self.running_by_user.items() if count >= self.per_user_limit]
+        job = self.queue.claim(busy)
+        if job:
+            self.running_by_user[job[1]] = self.running_by_user.get(job[1], 0) + 1
+        return job
+
+    def _next_job(self):
+        failures = 0
+        with self.condition:
+            while True:
+                try:
+                    job = self._claim()
+                    failures = 0
+                except Exception as e:
+                    job = None
+                    failures += 1
+                    print(f"Claiming a build failed: {e}")
+                if job is not None:
+                    return job
+                # Woken by new submissions and finished builds; the timeout
+                # picks up jobs enqueued by another process, and backs off
+                # while the database is failing
+                self.condition.wait(timeout=min(2 ** failures, 60) if failures else 5)
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+
+            job_id, user_id, payload = job
+            started = time.time()
+            status = 'failed'
+            try:
+                status = self.run_job(job_id, payload)
+            except Exception as e:
+                print(f"Build {job_id} crashed: {e}")
+            finally:
+                try:
+                    self._finish(job_id, status)
+                finally:
+                    with self.condition:
+                        self.running_by_user[user_id] -= 1
+                        if not self.running_by_user[user_id]:
+                            del self.running_by_user[user_id]
+                        self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.time() - started)
+                        self.condition.notify_all()
@@ -0,0 +1,45 @@
+import os
+import re
+
+import yaml
+
+# config.yaml lives next to docker-compose.yml; inside the container it is
+# mounted at the path given by CONFIG_PATH
+CONFIG_PATH = os.getenv(
+    'CONFIG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.yaml')
+)
+
+_ENV_PATTERN = re.compile(r'\$\{(\w+)\}')
+
+def _expand_env(value):
+    # Replace ${VAR} placeholders with values from the environment
+    if isinstance(value, str):
+        return _ENV_PATTERN.sub(lambda m: os.getenv(m.group(1), ''), value)
+    if isinstance(value, dict):
+        return {k: _expand_env(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand_env(v) for v in value]
+    return value
+
+# libyaml's loader parses several times faster when PyYAML was built with it
+_Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def load_config(path=CONFIG_PATH):
+    try:
+        with open(path) as f:
+            return _expand_env(yaml.load(f, Loader=_Loader) or {})
+    except FileNotFoundError:
+        print(f"Config file not found at {path}, using defaults")
+        return {}
+
+config = load_config()
+
+def get_setting(*keys, default=None):
+    # Walk nested config sections, e.g. get_setting('code_execution', 'timeout')
+    value = config
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
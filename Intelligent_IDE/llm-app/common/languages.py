@@ -0,0 +1,25 @@
+import re
+
+# Project file for a C# program; without package references it has no ItemGroup
+CSHARP_PROJECT = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup>
+    <OutputType>Exe</OutputType>
+    <TargetFramework>net6.0</TargetFramework>
+  </PropertyGroup>
+{item_group}</Project>
+"""
+
+def csharp_project(references=()):
+    # `references` are (package id, version) pairs, already validated
+    if not references:
+        return CSHARP_PROJECT.format(item_group='')
+    lines = '\n'.join(f'    <PackageReference Include="{name}" Version="{version}" />' for name, version in references)
+    return CSHARP_PROJECT.format(item_group=f"  <ItemGroup>\n{lines}\n  </ItemGroup>\n")
+
+def find_java_main_class(source):
+    # javac needs the file named after the public class; fall back to the
+    # first declared class, then to Main
+    match = re.search(r'public\s+(?:final\s+|abstract\s+)*class\s+(\w+)', source)
+    if not match:
+        match = re.search(r'\bclass\s+(\w+)', source)
+    return match.group(1) if match else 'Main'
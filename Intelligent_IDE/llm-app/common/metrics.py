@@ -0,0 +1,251 @@
+"""In-process metrics served in the Prometheus text format.
+
+Counters and histograms are plain dicts behind a lock, so recording costs a
+dict update and, for histograms, a bisect over the bucket bounds. Values
+the service already tracks elsewhere, such as queue depths, are read by
+callbacks when /metrics is scraped rather than updated on every change.
+
+With several worker processes, set METRICS_DIR to a directory they share.
+Each process then writes its samples there every few seconds and at exit,
+and /metrics, whichever worker answers it, sums every process's file.
+Counters and histograms of exited workers are kept, so totals never go
+backwards. Gauges only count live processes.
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; suits both quick API calls and LLM requests
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Route template of the request being served, for metrics recorded deeper in
+# the call stack; worker threads only see it when started in a copied context
+current_route = contextvars.ContextVar('current_route', default='none')
+
+_registry = []
+_registry_lock = threading.Lock()
+
+# Seconds between writes of this process's samples to METRICS_DIR
+SHARE_INTERVAL = 5
+_sharing = None
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+        start_sharing()
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, labels, (), value) for labels, value in self.values.items()]
+
+    def render(self):
+        return _render(self.name, self.documentation, self.kind, self.labelnames, self.samples())
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                # [count per bucket..., sum]
+                series = self.values[labels] = [0] * len(self.bounds) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(series)) for labels, series in self.values.items()]
+        samples = []
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.bounds, series):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', labels, (('le', _number(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', labels, (), series[-1]))
+            samples.append((f'{self.name}_count', labels, (), cumulative))
+        return samples
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+class Callback(Metric):
+    """A gauge or counter read from `collect()`, which returns {labels tuple: value}."""
+
+    def __init__(self, name, documentation, labelnames=(), collect=dict, kind='gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self):
+        try:
+            values = self.collect() or {}
+        except Exception as e:
+            print(f"Collecting metric {self.name} failed: {e}")
+            return []
+        return [(self.name, labels, (), value) for labels, value in values.items()]
+
+def _render(name, documentation, kind, labelnames, samples):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+    for sample, labels, extra, value in samples:
+        lines.append(f'{sample}{_labels(labelnames, labels, extra)} {_number(value)}')
+    return '\n'.join(lines)
+
+def render():
+    directory = os.getenv('METRICS_DIR')
+    if directory:
+        return _render_shared(directory)
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+def _share(directory):
+    # Write this process's samples where the other workers can read them
+    with _registry_lock:
+        metrics = list(_registry)
+    snapshot = [
+        {"name": m.name, "documentation": m.documentation, "kind": m.kind,
+         "labelnames": m.labelnames, "samples": m.samples()}
+        for m in metrics
+    ]
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(path + '.tmp', path)
+
+def _share_forever(directory):
+    while True:
+        time.sleep(SHARE_INTERVAL)
+        try:
+            _share(directory)
+        except OSError as e:
+            print(f"Writing metrics to {directory} failed: {e}")
+
+def start_sharing():
+    """Share this process's samples through METRICS_DIR, if it is set; called
+    once the process serves requests (a gunicorn worker, not the master)."""
+    global _sharing
+    directory = os.getenv('METRICS_DIR')
+    if not directory or _sharing == os.getpid():
+        return
+    _sharing = os.getpid()
+    os.makedirs(directory, exist_ok=True)
+    threading.Thread(target=_share_forever, args=(directory,), daemon=True).start()
+    atexit.register(_share, directory)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _render_shared(directory):
+    start_sharing()
+    _share(directory)
+    metrics = {}  # name -> (documentation, kind, labelnames, {(sample, labels, extra): value})
+    for entry in sorted(os.listdir(directory)):
+        pid, _, suffix = entry.partition('.')
+        if suffix != 'json' or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(int(pid))
+        for metric in snapshot:
+            if metric["kind"] == 'gauge' and not alive:
+                continue
+            documentation, kind, labelnames, values = metrics.setdefault(
+                metric["name"], (metric["documentation"], metric["kind"], metric["labelnames"], {})
+            )
+            for sample, labels, extra, value in metric["samples"]:
+                key = (sample, tuple(labels), tuple(map(tuple, extra)))
+                values[key] = values.get(key, 0) + value
+    return '\n'.join(
+        _render(name, documentation, kind, labelnames,
+                [(sample, labels, extra, value) for (sample, labels, extra), value in values.items()])
+        for name, (documentation, kind, labelnames, values) in metrics.items()
+    ) + '\n'
+
+def instrument_flask(app, histogram):
+    """Time every request to `app` into `histogram` (labels: route, method, status).
+
+    Register before any before_request hook that can answer early, so those
+    responses are timed too. A streamed response is timed up to its first byte.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        current_route.set(request.url_rule.rule if request.url_rule else 'unmatched')
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            histogram.observe(time.perf_counter() - started, current_route.get(), request.method, str(response.status_code))
+        return response
@@ -2,8 +2,13 @@
 
 import logging
 import os
+import json
+import threading
+import time
+from collections import OrderedDict
 
 import requests
+from requests.adapters import HTTPAdapter
 import streamlit as st
 from dotenv import load_dotenv
 from pathway.xpacks.llm.question_answering import RAGClient
@@ -13,6 +18,17 @@ load_dotenv()
 PATHWAY_HOST = os.environ.get("PATHWAY_HOST", "app")
 PATHWAY_PORT = os.environ.get("PATHWAY_PORT", 8000)
 
+# Seconds between checks for new or changed documents, and between full
+# listings, which are also what notices deleted documents
+DOCUMENTS_TTL = float(os.environ.get("DOCUMENTS_TTL", 30))
+DOCUMENTS_FULL_SYNC = float(os.environ.get("DOCUMENTS_FULL_SYNC", 300))
+SIDEBAR_PAGE_SIZE = int(os.environ.get("SIDEBAR_PAGE_SIZE", 50))
+
+ANSWER_CONNECT_TIMEOUT = float(os.environ.get("ANSWER_CONNECT_TIMEOUT", 5))
+ANSWER_READ_TIMEOUT = float(os.environ.get("ANSWER_READ_TIMEOUT", 120))
+ANSWER_POOL_SIZE = int(os.environ.get("ANSWER_POOL_SIZE", 20))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 500))
+
 st.set_page_config(page_title="Pathway RAG App", page_icon="favicon.ico")
 
 logging.basicConfig(
@@ -71,19 +87,78 @@ div[data-testid="stHorizontalBlock"]:has(button[data-testid="baseButton-primary"
 question = st.text_input(label="", placeholder="Ask your question?")
 
 
-def get_options_list(metadata_list: list[dict], opt_key: str) -> list:
-    """Get all available options in a specific metadata key."""
-    options = set(map(lambda x: x[opt_key], metadata_list))
-    return list(options)
-
-
-logger.info("Requesting pw_list_documents...")
-document_meta_list = conn.pw_list_documents(keys=[])
-logger.info("Received response pw_list_documents")
+class DocumentCatalog:
+    """Indexed documents, shared by every session of this Streamlit server.
 
-st.session_state["document_meta_list"] = document_meta_list
+    Streamlit reruns the script on every interaction, so the list is only
+    fetched again once it is older than DOCUMENTS_TTL, or when the user asks
+    for a refresh. A refresh asks the server only for documents modified since
+    the newest one already known; a full listing runs every
+    DOCUMENTS_FULL_SYNC seconds. `version` changes only when the set of
+    documents does.
+    """
 
-available_files = get_options_list(st.session_state["document_meta_list"], "path")
+    def __init__(self, client: RAGClient):
+        self.client = client
+        self.documents: dict[str, dict] = {}  # path -> metadata
+        self.version = 0
+        self.file_names: list[str] = []  # sorted, rebuilt when the version changes
+        self.synced_at = 0.0
+        self.full_synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> int:
+        with self.lock:
+            now = time.time()
+            if not force and now - self.synced_at < DOCUMENTS_TTL:
+                return self.version
+            full = not self.documents or now - self.full_synced_at >= DOCUMENTS_FULL_SYNC
+            try:
+                if full:
+                    logger.info("Requesting pw_list_documents...")
+                    self._apply(self.client.pw_list_documents(keys=[]), full=True)
+                    self.full_synced_at = now
+                else:
+                    since = max(doc.get("modified_at") or 0 for doc in self.documents.values())
+                    logger.info(f"Requesting pw_list_documents modified since {since}...")
+                    self._apply(
+                        self.client.pw_list_documents(filters=f"modified_at >= `{since}`", keys=[]),
+                        full=False,
+                    )
+                logger.info("Received response pw_list_documents")
+            except requests.RequestException as e:
+                if not self.documents:
+                    raise
+                logger.warning(f"Listing documents failed, showing the last list: {e}")
+            self.synced_at = now
+            return self.version
+
+    def _apply(self, documents: list[dict], full: bool) -> None:
+        incoming = {doc["path"]: doc for doc in documents if "path" in doc}
+        removed = self.documents.keys() - incoming.keys() if full else set()
+        changed = {path for path, doc in incoming.items() if self.documents.get(path) != doc}
+        if not removed and not changed:
+            return
+        if full:
+            self.documents = incoming
+        else:
+            self.documents.update(incoming)
+        self.version += 1
+        self.file_names = sorted(path.split("/")[-1] for path in self.documents)
+        logger.info(
+            f"Document list version {self.version}: "
+            f"{len(changed)} added or changed, {len(removed)} removed"
+        )
+
+
+@st.cache_resource
+def get_document_catalog() -> DocumentCatalog:
+    return DocumentCatalog(conn)
+
+
+catalog = get_document_catalog()
+# The Refresh button's state is set before the rerun its click starts
+catalog.refresh(force=st.session_state.get("refresh_documents", False))
 
 
 with st.sidebar:
@@ -92,14 +167,30 @@ with st.sidebar:
         icon=":material/code:",
     )
 
-    file_names = [i.split("/")[-1] for i in available_files]
-
-    markdown_table = "| Indexed files |\n| --- |\n"
-    for file_name in file_names:
+    file_filter = st.text_input(
+        label="Filter indexed files", placeholder="Filter indexed files", key="file_filter"
+    )
+    file_names = catalog.file_names
+    if file_filter:
+        file_names = [name for name in file_names if file_filter.lower() in name.lower()]
+
+    # Only one page of the table is rendered on each rerun
+    pages = max(1, -(-len(file_names) // SIDEBAR_PAGE_SIZE))
+    if st.session_state.get("file_page", 1) > pages:
+        st.session_state["file_page"] = pages
+    page = 1
+    if pages > 1:
+        page = st.number_input(
+            label=f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="file_page"
+        )
+    start = (page - 1) * SIDEBAR_PAGE_SIZE
+
+    markdown_table = f"| Indexed files ({len(file_names)}) |\n| --- |\n"
+    for file_name in file_names[start : start + SIDEBAR_PAGE_SIZE]:
         markdown_table += f"| {file_name} |\n"
     st.markdown(markdown_table, unsafe_allow_html=True)
 
-    st.button("⟳ Refresh", use_container_width=True)
+    st.button("⟳ Refresh", use_container_width=True, key="refresh_documents")
 
 css = """
 <style>
@@ -140,12 +231,94 @@ css = """
 st.markdown(css, unsafe_allow_html=True)
 
 
-def send_post_request(
-    url: str, data: dict, headers: dict = {}, timeout: int | None = None
-):
-    response = requests.post(url, json=data, headers=headers, timeout=timeout)
-    response.raise_for_status()
-    return response.json()
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    # Keep-alive connections to the RAG server, shared by every session
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=ANSWER_POOL_SIZE
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class AnswerCache:
+    """Answers by question and document-list version, least recently used first out.
+
+    Entries for an older version are dropped as soon as the version changes,
+    so an answer is never served from an index that has since changed.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def _check_version(self, version: int) -> None:
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key: tuple, version: int) -> str | None:
+        with self.lock:
+            self._check_version(version)
+            answer = self.entries.get(key)
+            if answer is not None:
+                self.entries.move_to_end(key)
+            return answer
+
+    def put(self, key: tuple, version: int, answer: str) -> None:
+        with self.lock:
+            self._check_version(version)
+            self.entries[key] = answer
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+@st.cache_resource
+def get_shared_answers() -> AnswerCache:
+    return AnswerCache(ANSWER_CACHE_SIZE)
+
+
+def normalize_question(question: str) -> str:
+    # Case, spacing and trailing punctuation don't change what is asked
+    return " ".join(question.casefold().split()).rstrip("?!. ")
+
+
+def answer_text(response) -> str:
+    if isinstance(response, dict):
+        return str(response.get("response", response))
+    return str(response)
+
+
+def stream_answer(url: str, data: dict):
+    """Yield the answer as the server sends it.
+
+    Plain-text and server-sent-event responses are rendered as they arrive;
+    a JSON response can only be shown once it is complete.
+    """
+    with get_http_session().post(
+        url,
+        json=data,
+        stream=True,
+        timeout=(ANSWER_CONNECT_TIMEOUT, ANSWER_READ_TIMEOUT),
+    ) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if "text/event-stream" in content_type:
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    yield line[len("data:") :].lstrip()
+        elif "json" in content_type:
+            yield answer_text(json.loads(response.content))
+        else:
+            response.encoding = response.encoding or "utf-8"
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                if chunk:
+                    yield chunk
 
 
 if question:
@@ -161,20 +334,31 @@ if question:
         "prompt": question,
         "response_type": "long",
     }
-    with st.spinner("Retrieving response..."):
-        response = send_post_request(api_url, payload)
 
-    # response = conn.pw_ai_answer(question)
+    # Answers seen in this session are kept even when the shared cache evicts them
+    version = catalog.version
+    key = (normalize_question(question), payload["response_type"])
+    session_answers = st.session_state.get("answers")
+    if session_answers is None or session_answers["version"] != version:
+        session_answers = st.session_state["answers"] = {"version": version, "entries": {}}
+    shared_answers = get_shared_answers()
+
+    response = session_answers["entries"].get(key) or shared_answers.get(key, version)
+    cached = response is not None
+
+    st.markdown(f"**Answering question:** {question}")
+    if cached:
+        st.markdown(f"""{response}""")
+    else:
+        response = st.write_stream(stream_answer(api_url, payload))
+        shared_answers.put(key, version, response)
+    session_answers["entries"][key] = response
 
     logger.info(
         {
             "_type": "search_response_event",
             "query": question,
             "response": type(response),
+            "cached": cached,
         }
     )
-
-    logger.info(type(response))
-
-    st.markdown(f"**Answering question:** {question}")
-    st.markdown(f"""{response}""")